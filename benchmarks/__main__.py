@@ -0,0 +1,195 @@
+"""
+Runs the benchmark suite, reporting the cost of each stage of a run as JSON.
+
+For every combination of corpus size, vocabulary size, number of topics and
+engine, a synthetic corpus with that many topics is written to a file, and a
+fresh interpreter loads it, runs inference and saves the outputs. The time and
+peak resident memory after each stage are reported, so that results can be
+compared between releases:
+
+    $ python3 -m benchmarks --documents 10000 100000 --num-topics 20 200 --output results.json
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numba
+import numpy as np
+
+import pdmm
+from pdmm import Corpus, GibbsSamplingDMM
+
+from .utils import generate_corpus_file, get_peak_memory_in_bytes
+
+
+def measure_run(corpus_path, number_of_topics, engine, number_of_iterations, seed):
+    """
+    Measure the time and peak memory of loading a corpus, running inference and saving the outputs.
+
+    A tiny corpus is loaded first, and a single warm-up iteration is
+    run before the timed iterations, so that compilation is included
+    in neither the load time nor the time per iteration.
+
+    Parameters
+    ----------
+    corpus_path : str
+        The location of the corpus file.
+    number_of_topics : int
+        The number of topics in the model.
+    engine : str
+        The sampling engine.
+    number_of_iterations : int
+        The number of timed iterations.
+    seed : int
+        The seed for the initial topic assignments.
+
+    Returns
+    -------
+    measurements : dict
+        The seconds taken by each stage and the peak resident memory
+        in bytes after each stage.
+    """
+    Corpus.from_iterable_of_word_lists([["warm", "up"]])
+    measurements = {"baseline_peak_bytes": get_peak_memory_in_bytes()}
+
+    t0 = time.perf_counter()
+    corpus = Corpus.from_document_file(corpus_path)
+    measurements["load_seconds"] = time.perf_counter() - t0
+    measurements["load_peak_bytes"] = get_peak_memory_in_bytes()
+    measurements["number_of_tokens"] = len(corpus.word_ids)
+    measurements["vocabulary_size"] = corpus.vocab.size
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        binary_corpus_path = os.path.join(tempdir, "corpus.bin")
+        t0 = time.perf_counter()
+        corpus.save_binary(binary_corpus_path)
+        measurements["save_binary_corpus_seconds"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        Corpus.load_binary(binary_corpus_path)
+        measurements["load_binary_corpus_seconds"] = time.perf_counter() - t0
+
+        model = GibbsSamplingDMM(corpus, number_of_topics=number_of_topics, engine=engine)
+        model.randomly_initialise_topic_assignment(seed=seed)
+        t0 = time.perf_counter()
+        model.inference(1)
+        measurements["first_iteration_seconds"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        model.inference(number_of_iterations)
+        measurements["seconds_per_iteration"] = (time.perf_counter() - t0) / number_of_iterations
+        measurements["inference_peak_bytes"] = get_peak_memory_in_bytes()
+        measurements["log_likelihood"] = model.log_likelihood()
+
+        t0 = time.perf_counter()
+        model.save_top_topical_words_to_file(os.path.join(tempdir, "topWords"))
+        measurements["save_top_words_seconds"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        model.save_topic_assignments_to_file(os.path.join(tempdir, "topicAssignments"))
+        measurements["save_topic_assignments_seconds"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        model.to_topic_model().save(os.path.join(tempdir, "model"))
+        measurements["save_model_seconds"] = time.perf_counter() - t0
+        measurements["output_peak_bytes"] = get_peak_memory_in_bytes()
+
+    return measurements
+
+
+def measure_run_in_subprocess(corpus_path, number_of_topics, engine, number_of_iterations, seed):
+    """Run `measure_run` in a fresh interpreter, so that peak memory is not shared between runs."""
+    command = [sys.executable, "-m", "benchmarks", "--child", corpus_path, str(number_of_topics), engine,
+               str(number_of_iterations), str(seed)]
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output)
+
+
+def get_environment():
+    """Get the versions and platform against which the benchmarks were run."""
+    return {
+        "pdmm": pdmm.__version__,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "numba": numba.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+
+def main(parameters):
+    """Generate a corpus for each configuration, measure every engine on it and report the results as JSON."""
+    results = []
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        corpus_path = os.path.join(tempdir, "corpus")
+        for number_of_documents, vocabulary_size, number_of_topics in itertools.product(
+                parameters.number_of_documents, parameters.vocabulary_size, parameters.number_of_topics):
+            t0 = time.perf_counter()
+            generate_corpus_file(corpus_path, number_of_documents, vocabulary_size, parameters.mean_document_length,
+                                 seed=parameters.seed, number_of_topics=number_of_topics)
+            generation_seconds = time.perf_counter() - t0
+            corpus_file_bytes = os.path.getsize(corpus_path)
+
+            for engine in parameters.engines:
+                print("Measuring {} documents, {} words, {} topics with the {} engine".format(
+                    number_of_documents, vocabulary_size, number_of_topics, engine), file=sys.stderr)
+                measurements = measure_run_in_subprocess(corpus_path, number_of_topics, engine,
+                                                         parameters.number_of_iterations, parameters.seed)
+                results.append(dict(
+                    number_of_documents=number_of_documents,
+                    maximum_vocabulary_size=vocabulary_size,
+                    mean_document_length=parameters.mean_document_length,
+                    number_of_topics=number_of_topics,
+                    engine=engine,
+                    number_of_iterations=parameters.number_of_iterations,
+                    generation_seconds=generation_seconds,
+                    corpus_file_bytes=corpus_file_bytes,
+                    **measurements
+                ))
+
+    report = json.dumps({"environment": get_environment(), "results": results}, indent=2)
+    if parameters.output_path:
+        with open(parameters.output_path, "w") as wf:
+            wf.write(report + "\n")
+    else:
+        print(report)
+
+
+def run_child(corpus_path, number_of_topics, engine, number_of_iterations, seed):
+    """Measure a single run in this process and print the measurements as JSON."""
+    print(json.dumps(measure_run(corpus_path, int(number_of_topics), engine, int(number_of_iterations), int(seed))))
+
+
+def parse_args(args=None):
+    """Parse arguments for the benchmark suite."""
+    parser = argparse.ArgumentParser(prog="benchmarks", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", dest="number_of_documents", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--vocabulary-size", dest="vocabulary_size", type=int, nargs="+", default=[20000])
+    parser.add_argument("--num-topics", dest="number_of_topics", type=int, nargs="+", default=[20])
+    parser.add_argument("--mean-document-length", dest="mean_document_length", type=float, default=10)
+    parser.add_argument("--engines", nargs="+", choices=GibbsSamplingDMM.ENGINES,
+                        default=list(GibbsSamplingDMM.ENGINES))
+    parser.add_argument("--iterations", dest="number_of_iterations", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", dest="output_path", metavar="<path>",
+                        help="Path at which to save the JSON report, which is otherwise printed")
+    parser.add_argument("--child", nargs=5, help=argparse.SUPPRESS)
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    parsed_parameters = parse_args(sys.argv[1:])
+    if parsed_parameters.child:
+        run_child(*parsed_parameters.child)
+    else:
+        main(parsed_parameters)
@@ -0,0 +1,96 @@
+"""
+Compares the peak memory of the streaming corpus loader against list-based loading.
+
+Each loader is run in a fresh interpreter so that peak resident set sizes do not
+contaminate one another:
+
+    $ python3 -m benchmarks.corpus_memory --documents 1000000
+"""
+import argparse
+from collections import Counter
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from pdmm import Corpus, Vocabulary
+
+from .utils import generate_corpus_file, get_peak_memory_in_bytes
+
+
+def load_with_python_lists(file_path):
+    """Load a corpus file into lists of Python integers, as pdmm did before streaming."""
+    vocab = Vocabulary()
+    documents = []
+    occurrence_to_index_count = []
+
+    with open(file_path, "r") as rf:
+        for line in rf.readlines():
+            document = []
+            occurrences = []
+            word_counts = Counter()
+            for word in line.split():
+                document.append(vocab.get_id_from_word(word))
+                word_counts[word] += 1
+                occurrences.append(word_counts[word])
+            documents.append(document)
+            occurrence_to_index_count.append(occurrences)
+
+    return documents, occurrence_to_index_count, vocab
+
+
+LOADERS = {
+    "streaming": Corpus.from_document_file,
+    "python-lists": load_with_python_lists,
+}
+
+
+def measure_loader_in_subprocess(loader_name, file_path):
+    """Run a single loader in a fresh interpreter and return its memory usage."""
+    command = [sys.executable, "-m", "benchmarks.corpus_memory", "--child", loader_name, file_path]
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output)
+
+
+def run_child(loader_name, file_path):
+    """Load the corpus in this process and print the memory usage as JSON."""
+    baseline_memory = get_peak_memory_in_bytes()
+    LOADERS[loader_name](file_path)
+    peak_memory = get_peak_memory_in_bytes()
+    print(json.dumps({"baseline_bytes": baseline_memory, "peak_bytes": peak_memory}))
+
+
+def main(parameters):
+    """Generate a corpus and compare the loaders."""
+    with tempfile.TemporaryDirectory() as tempdir:
+        file_path = os.path.join(tempdir, "corpus")
+        generate_corpus_file(file_path, parameters.number_of_documents, parameters.vocabulary_size,
+                             parameters.mean_document_length, seed=parameters.seed)
+        file_size = os.path.getsize(file_path)
+        print("Corpus file: {} documents, {:.1f} MB".format(parameters.number_of_documents, file_size / 1e6))
+
+        for loader_name in LOADERS:
+            memory = measure_loader_in_subprocess(loader_name, file_path)
+            loader_memory = memory["peak_bytes"] - memory["baseline_bytes"]
+            print("{:>14}: peak RSS {:8.1f} MB ({:8.1f} MB above interpreter baseline)".format(
+                loader_name, memory["peak_bytes"] / 1e6, loader_memory / 1e6))
+
+
+def parse_args(args=None):
+    """Parse arguments for the benchmark."""
+    parser = argparse.ArgumentParser(prog="benchmarks.corpus_memory", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", dest="number_of_documents", type=int, default=1000000)
+    parser.add_argument("--vocabulary-size", dest="vocabulary_size", type=int, default=50000)
+    parser.add_argument("--mean-document-length", dest="mean_document_length", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--child", nargs=2, metavar=("<loader>", "<path>"), help=argparse.SUPPRESS)
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    parsed_parameters = parse_args(sys.argv[1:])
+    if parsed_parameters.child:
+        run_child(*parsed_parameters.child)
+    else:
+        main(parsed_parameters)
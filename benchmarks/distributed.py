@@ -0,0 +1,119 @@
+"""
+Measures the scaling and convergence of approximate distributed (AD-DMM) inference.
+
+For the bundled sample data and a larger synthetic corpus, the number of iterations
+per second is reported for each worker count, along with the log-likelihood reached
+after a number of iterations compared against the serial compiled sampler:
+
+    $ python3 -m benchmarks.distributed --workers 1 2 4 8 --documents 200000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from pdmm import Corpus, GibbsSamplingDMM
+from pdmm.parallel import ApproximateDistributedSampler
+
+from .utils import generate_corpus_file
+
+
+class SerialSampler:
+    """Runs the serial compiled sampler with the same interface as the distributed sampler."""
+    def __init__(self, model):
+        self.model = model
+
+    def inference(self, number_of_iterations):
+        """Run inference for a number of iterations."""
+        self.model.inference(number_of_iterations)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+def get_sampler_factory(workers):
+    """Get a function creating a sampler for a model, which is serial if no workers are given."""
+    if workers is None:
+        return SerialSampler
+    return lambda model: ApproximateDistributedSampler(model, workers)
+
+
+def measure_run(corpus, create_sampler, number_of_topics, number_of_iterations, milestones, seed):
+    """
+    Measure the steady state iterations per second and the log-likelihood at each milestone.
+
+    A single warm-up iteration is run first, so that compilation and
+    starting processes are not included in the timing.
+    """
+    model = GibbsSamplingDMM(corpus, number_of_topics=number_of_topics, engine="numba")
+    model.randomly_initialise_topic_assignment(seed=seed)
+
+    with create_sampler(model) as sampler:
+        sampler.inference(1)
+        t0 = time.perf_counter()
+        sampler.inference(number_of_iterations)
+        iterations_per_second = number_of_iterations / (time.perf_counter() - t0)
+
+    model = GibbsSamplingDMM(corpus, number_of_topics=number_of_topics, engine="numba")
+    model.randomly_initialise_topic_assignment(seed=seed)
+    log_likelihoods = []
+
+    with create_sampler(model) as sampler:
+        for milestone in milestones:
+            sampler.inference(milestone - model.iteration)
+            log_likelihoods.append(model.log_likelihood())
+
+    return iterations_per_second, log_likelihoods
+
+
+def benchmark_corpus(name, corpus, parameters):
+    """Print the scaling and convergence for a single corpus."""
+    print("{}: {} documents, {} tokens, {} words".format(name, corpus.number_of_documents, len(corpus.word_ids),
+                                                         corpus.vocab.size))
+    milestones = sorted(set(parameters.milestones))
+    runs = [("serial", None)] + [("{} workers".format(workers), workers) for workers in parameters.workers]
+
+    print("  {:>12} {:>16}  {}".format("", "iterations/sec",
+                                        "  ".join("LL@{:<9}".format(milestone) for milestone in milestones)))
+    for run_name, workers in runs:
+        iterations_per_second, log_likelihoods = measure_run(corpus, get_sampler_factory(workers),
+                                                             parameters.number_of_topics,
+                                                             parameters.number_of_iterations, milestones,
+                                                             parameters.seed)
+        print("  {:>12} {:>16.2f}  {}".format(run_name, iterations_per_second,
+                                               "  ".join("{:<12.1f}".format(value) for value in log_likelihoods)))
+
+
+def main(parameters):
+    """Benchmark the sample data and a synthetic corpus."""
+    benchmark_corpus("sample_data", Corpus.from_document_file("tests/data/sample_data"), parameters)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        file_path = os.path.join(tempdir, "corpus")
+        generate_corpus_file(file_path, parameters.number_of_documents, parameters.vocabulary_size,
+                             parameters.mean_document_length, seed=parameters.seed)
+        synthetic_corpus = Corpus.from_document_file(file_path)
+
+    benchmark_corpus("synthetic", synthetic_corpus, parameters)
+
+
+def parse_args(args=None):
+    """Parse arguments for the benchmark."""
+    parser = argparse.ArgumentParser(prog="benchmarks.distributed", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--documents", dest="number_of_documents", type=int, default=50000)
+    parser.add_argument("--vocabulary-size", dest="vocabulary_size", type=int, default=20000)
+    parser.add_argument("--mean-document-length", dest="mean_document_length", type=float, default=10)
+    parser.add_argument("--num-topics", dest="number_of_topics", type=int, default=20)
+    parser.add_argument("--iterations", dest="number_of_iterations", type=int, default=10)
+    parser.add_argument("--milestones", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
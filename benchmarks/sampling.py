@@ -0,0 +1,86 @@
+"""
+Times the batched samplers and the generation of synthetic documents.
+
+A million values are drawn from ten thousand weights by binary search and from an
+alias table, and a batch of synthetic documents is generated from a model trained
+on a synthetic corpus:
+
+    $ python3 -m benchmarks.sampling --draws 1000000 --weights 10000 --synthetic-documents 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from pdmm import Corpus, GibbsSamplingDMM
+from pdmm.utils import build_alias_table, sample_many_from_alias_table, sample_many_from_cumulative_weights
+
+from .utils import generate_corpus_file
+
+
+def time_function(function, *args):
+    """Time a function after a first call to compile it, returning the seconds taken."""
+    function(*args)
+    t0 = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - t0
+
+
+def time_synthetic_generation(corpus, number_of_topics, number_of_documents, seed):
+    """Time the generation of a batch of synthetic documents, after generating a few to compile the kernels."""
+    model = GibbsSamplingDMM(corpus, number_of_topics=number_of_topics, engine="numba")
+    model.randomly_initialise_topic_assignment(seed=seed)
+    model.inference(5)
+    model.generate_synthetic_documents(10, seed=seed)
+
+    t0 = time.perf_counter()
+    model.generate_synthetic_documents(number_of_documents, seed=seed)
+    return time.perf_counter() - t0
+
+
+def main(parameters):
+    """Time each sampler and the generation of synthetic documents."""
+    random_state = np.random.RandomState(parameters.seed)
+    weights = random_state.random(parameters.number_of_weights)
+    random_numbers = random_state.random(parameters.number_of_draws)
+
+    seconds = time_function(sample_many_from_cumulative_weights, weights.cumsum(), random_numbers)
+    print("Binary search: {:,} draws from {:,} weights in {:.4f}s".format(len(random_numbers), len(weights),
+                                                                          seconds))
+
+    alias_probabilities = np.empty(len(weights))
+    alias_indices = np.empty(len(weights), dtype=np.int64)
+    build_alias_table(weights, alias_probabilities, alias_indices)
+    seconds = time_function(sample_many_from_alias_table, alias_probabilities, alias_indices, random_numbers)
+    print("Alias table: {:,} draws from {:,} weights in {:.4f}s".format(len(random_numbers), len(weights), seconds))
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        file_path = os.path.join(tempdir, "corpus")
+        generate_corpus_file(file_path, parameters.number_of_documents, parameters.vocabulary_size,
+                             seed=parameters.seed, number_of_topics=parameters.number_of_topics)
+        corpus = Corpus.from_document_file(file_path)
+
+    seconds = time_synthetic_generation(corpus, parameters.number_of_topics, parameters.number_of_synthetic_documents,
+                                        parameters.seed)
+    print("Synthetic generation: {:,} documents in {:.4f}s".format(parameters.number_of_synthetic_documents,
+                                                                   seconds))
+
+
+def parse_args(args=None):
+    """Parse arguments for the benchmark."""
+    parser = argparse.ArgumentParser(prog="benchmarks.sampling", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--draws", dest="number_of_draws", type=int, default=1000000)
+    parser.add_argument("--weights", dest="number_of_weights", type=int, default=10000)
+    parser.add_argument("--documents", dest="number_of_documents", type=int, default=20000)
+    parser.add_argument("--vocabulary-size", dest="vocabulary_size", type=int, default=20000)
+    parser.add_argument("--num-topics", dest="number_of_topics", type=int, default=20)
+    parser.add_argument("--synthetic-documents", dest="number_of_synthetic_documents", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
@@ -0,0 +1,84 @@
+"""
+Finds the number of topics at which the alias sampler overtakes the exact Gibbs sampler.
+
+For each number of topics, both samplers are run with the compiled engine on a
+synthetic corpus of short documents, reporting the seconds per iteration and the
+log-likelihood reached after a number of iterations:
+
+    $ python3 -m benchmarks.topics --num-topics 20 100 500 1000 5000 --documents 50000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from pdmm import Corpus, GibbsSamplingDMM
+
+from .utils import generate_corpus_file
+
+
+def measure_sampler(corpus, sampler, number_of_topics, number_of_iterations, seed):
+    """
+    Measure the mean seconds per iteration and the final log-likelihood of a sampler.
+
+    A single warm-up iteration is run first, so that compilation is
+    not included in the timing.
+    """
+    model = GibbsSamplingDMM(corpus, number_of_topics=number_of_topics, engine="numba", sampler=sampler)
+    model.randomly_initialise_topic_assignment(seed=seed)
+    model.inference(1)
+
+    t0 = time.perf_counter()
+    model.inference(number_of_iterations)
+    t1 = time.perf_counter()
+    return (t1 - t0) / number_of_iterations, model.log_likelihood()
+
+
+def main(parameters):
+    """Generate a corpus and compare the samplers for each number of topics."""
+    with tempfile.TemporaryDirectory() as tempdir:
+        file_path = os.path.join(tempdir, "corpus")
+        generate_corpus_file(file_path, parameters.number_of_documents, parameters.vocabulary_size,
+                             parameters.mean_document_length, seed=parameters.seed)
+        corpus = Corpus.from_document_file(file_path)
+
+    print("{} documents, {} tokens, {} words".format(corpus.number_of_documents, len(corpus.word_ids),
+                                                     corpus.vocab.size))
+    print("{:>8} {:>14} {:>14} {:>8} {:>16} {:>16}".format("topics", "gibbs sec/it", "alias sec/it", "speedup",
+                                                           "gibbs LL", "alias LL"))
+    crossover = None
+
+    for number_of_topics in sorted(parameters.number_of_topics):
+        gibbs_seconds, gibbs_log_likelihood = measure_sampler(corpus, "gibbs", number_of_topics,
+                                                              parameters.number_of_iterations, parameters.seed)
+        alias_seconds, alias_log_likelihood = measure_sampler(corpus, "alias", number_of_topics,
+                                                              parameters.number_of_iterations, parameters.seed)
+        if crossover is None and alias_seconds < gibbs_seconds:
+            crossover = number_of_topics
+
+        print("{:>8} {:>14.4f} {:>14.4f} {:>8.2f} {:>16.1f} {:>16.1f}".format(
+            number_of_topics, gibbs_seconds, alias_seconds, gibbs_seconds / alias_seconds, gibbs_log_likelihood,
+            alias_log_likelihood))
+
+    if crossover is None:
+        print("The alias sampler was not faster for any number of topics tried.")
+    else:
+        print("The alias sampler is faster from {} topics.".format(crossover))
+
+
+def parse_args(args=None):
+    """Parse arguments for the benchmark."""
+    parser = argparse.ArgumentParser(prog="benchmarks.topics", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--num-topics", dest="number_of_topics", type=int, nargs="+",
+                        default=[10, 20, 50, 100, 200, 500, 1000, 2000, 5000])
+    parser.add_argument("--documents", dest="number_of_documents", type=int, default=20000)
+    parser.add_argument("--vocabulary-size", dest="vocabulary_size", type=int, default=20000)
+    parser.add_argument("--mean-document-length", dest="mean_document_length", type=float, default=10)
+    parser.add_argument("--iterations", dest="number_of_iterations", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
@@ -0,0 +1,67 @@
+"""
+Utility functions for the benchmarks package.
+"""
+import resource
+import sys
+
+import numpy as np
+
+
+def generate_corpus_file(file_path, number_of_documents, vocabulary_size=50000, mean_document_length=10, seed=None,
+                         chunk_size=100000, number_of_topics=None):
+    """
+    Write a synthetic corpus with Zipf-distributed words to a file.
+
+    If a number of topics is given, each document is drawn from one
+    topic, and each topic ranks the words from a different offset, so
+    that the corpus has topics for a model to find.
+
+    Parameters
+    ----------
+    file_path : str
+        The location at which to save the file.
+    number_of_documents : int
+        The number of documents (lines) to write.
+
+    Optional Parameters
+    -------------------
+    vocabulary_size : int, defaults to 50000
+        The maximum number of distinct words.
+    mean_document_length : float, defaults to 10
+        The mean number of words in each document.
+    seed : int, defaults to None
+        The seed for the random number generator.
+    chunk_size : int, defaults to 100000
+        The number of documents to generate and write at once.
+    number_of_topics : int, defaults to None
+        The number of topics from which documents are drawn, or None
+        for a single ranking of the words shared by every document.
+    """
+    random_number_generator = np.random.default_rng(seed)
+    words = np.array(["w{}".format(word_id) for word_id in range(vocabulary_size)])
+    if number_of_topics:
+        topic_offsets = random_number_generator.integers(vocabulary_size, size=number_of_topics)
+
+    with open(file_path, "w") as wf:
+        for chunk_start in range(0, number_of_documents, chunk_size):
+            number_of_documents_in_chunk = min(chunk_size, number_of_documents - chunk_start)
+            document_lengths = random_number_generator.poisson(mean_document_length, number_of_documents_in_chunk)
+            document_lengths = np.maximum(document_lengths, 1)
+            word_ids = (random_number_generator.zipf(1.3, document_lengths.sum()) - 1) % vocabulary_size
+            if number_of_topics:
+                topic_indices = random_number_generator.integers(number_of_topics, size=number_of_documents_in_chunk)
+                word_ids = (word_ids + np.repeat(topic_offsets[topic_indices], document_lengths)) % vocabulary_size
+            chunk_words = words[word_ids]
+            document_offsets = np.concatenate([[0], document_lengths.cumsum()])
+
+            lines = [" ".join(chunk_words[start:end]) + "\n"
+                     for start, end in zip(document_offsets[:-1], document_offsets[1:])]
+            wf.writelines(lines)
+
+
+def get_peak_memory_in_bytes():
+    """Get the peak resident set size of the current process in bytes."""
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak_memory
+    return peak_memory * 1024
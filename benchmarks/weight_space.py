@@ -0,0 +1,86 @@
+"""
+Compares the speed and numerical robustness of linear and log space topic weights.
+
+A synthetic corpus of long documents is generated, on which the linear weights
+underflow, and each engine is timed in both weight spaces:
+
+    $ python3 -m benchmarks.weight_space --documents 2000 --mean-document-length 300
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from pdmm import Corpus, GibbsSamplingDMM
+
+from .utils import generate_corpus_file
+
+
+def count_underflowing_documents(corpus, number_of_topics, beta, seed):
+    """Count the documents whose linear topic weights are all zero after random initialisation."""
+    model = GibbsSamplingDMM(corpus, number_of_topics=number_of_topics, beta=beta)
+    model.randomly_initialise_topic_assignment(seed=seed)
+    number_of_underflowing_documents = 0
+
+    for document_index in range(corpus.number_of_documents):
+        topic_index = model.document_topic_assignments[document_index]
+        model.number_of_documents_in_each_topic[topic_index] -= 1
+        model._unassign_document_from_topic(document_index, topic_index)
+        model._update_topic_weights_for_document(document_index)
+        number_of_underflowing_documents += not model.topic_weights.any()
+        model.number_of_documents_in_each_topic[topic_index] += 1
+        model._assign_document_to_topic(document_index, topic_index)
+
+    return number_of_underflowing_documents
+
+
+def time_inference(corpus, number_of_topics, beta, engine, weight_space, number_of_iterations, seed):
+    """Time the inference, returning the mean number of seconds per iteration."""
+    model = GibbsSamplingDMM(corpus, number_of_topics=number_of_topics, beta=beta, engine=engine,
+                             weight_space=weight_space)
+    model.randomly_initialise_topic_assignment(seed=seed)
+    model.inference(1)
+
+    t0 = time.perf_counter()
+    model.inference(number_of_iterations)
+    t1 = time.perf_counter()
+    return (t1 - t0) / number_of_iterations
+
+
+def main(parameters):
+    """Generate a corpus and compare the weight spaces."""
+    with tempfile.TemporaryDirectory() as tempdir:
+        file_path = os.path.join(tempdir, "corpus")
+        generate_corpus_file(file_path, parameters.number_of_documents, parameters.vocabulary_size,
+                             parameters.mean_document_length, seed=parameters.seed)
+        corpus = Corpus.from_document_file(file_path)
+
+    number_of_underflowing_documents = count_underflowing_documents(corpus, parameters.number_of_topics,
+                                                                    parameters.beta, parameters.seed)
+    print("Documents with underflowing linear weights: {} of {}".format(number_of_underflowing_documents,
+                                                                         corpus.number_of_documents))
+
+    for engine in GibbsSamplingDMM.ENGINES:
+        for weight_space in GibbsSamplingDMM.WEIGHT_SPACES:
+            seconds_per_iteration = time_inference(corpus, parameters.number_of_topics, parameters.beta, engine,
+                                                   weight_space, parameters.number_of_iterations, parameters.seed)
+            print("{:>6} engine, {:>6} space: {:.5f} seconds per iteration".format(
+                engine, weight_space, seconds_per_iteration))
+
+
+def parse_args(args=None):
+    """Parse arguments for the benchmark."""
+    parser = argparse.ArgumentParser(prog="benchmarks.weight_space", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", dest="number_of_documents", type=int, default=2000)
+    parser.add_argument("--vocabulary-size", dest="vocabulary_size", type=int, default=20000)
+    parser.add_argument("--mean-document-length", dest="mean_document_length", type=float, default=300)
+    parser.add_argument("--num-topics", dest="number_of_topics", type=int, default=20)
+    parser.add_argument("--beta", type=float, default=0.001)
+    parser.add_argument("--iterations", dest="number_of_iterations", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
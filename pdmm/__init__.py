@@ -6,7 +6,9 @@ Approach for Short Text Clustering" by Jianhua Yin and Jianyong Wang, which can
 be found at https://dl.acm.org/doi/10.1145/2623330.2623715.
 """
 from .corpus import Corpus
+from .model import TopicModel
+from .parallel import run_chains
 from .sampling import GibbsSamplingDMM
-from .vocabulary import Vocabulary
+from .vocabulary import PackedVocabulary, Vocabulary
 
 __version__ = "2.0.1"
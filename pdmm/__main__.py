@@ -2,29 +2,105 @@
 Contains the main function for running inference from the command line.
 """
 import argparse
+import glob
+import importlib.util
+import logging
 import os
 import sys
 
 from .corpus import Corpus
+from .parallel import get_best_chain, run_approximate_distributed_inference, run_chains
 from .sampling import GibbsSamplingDMM
 
 
 def main(parameters, seed=None):
     """Main function."""
-    corpus = Corpus.from_document_file(parameters.corpus_path)
+    stopwords = None
+    if parameters.stopwords_path:
+        with open(parameters.stopwords_path, "r") as rf:
+            stopwords = rf.read().split()
 
-    model = GibbsSamplingDMM(
-        corpus,
-        parameters.number_of_topics,
-        parameters.alpha,
-        parameters.beta,
+    pruning_parameters = dict(
+        minimum_count=parameters.minimum_count,
+        maximum_document_frequency=parameters.maximum_document_frequency,
+        stopwords=stopwords,
+        maximum_vocabulary_size=parameters.maximum_vocabulary_size,
     )
-    model.randomly_initialise_topic_assignment(seed=seed)
-    model.inference(parameters.number_of_iterations)
+
+    corpus_paths = sorted(glob.glob(parameters.corpus_path)) or [parameters.corpus_path]
+    number_of_binary_files = sum(map(Corpus.is_binary_file, corpus_paths))
+    if 0 < number_of_binary_files < len(corpus_paths):
+        raise ValueError("The corpus files must be all text or all binary, but {} of {} are binary.".format(
+            number_of_binary_files, len(corpus_paths)))
+
+    if len(corpus_paths) == 1 and number_of_binary_files:
+        corpus = Corpus.load_binary(corpus_paths[0]).prune_vocabulary(**pruning_parameters)
+    elif number_of_binary_files:
+        corpus = Corpus.from_binary_files(corpus_paths, **pruning_parameters)
+    elif len(corpus_paths) > 1:
+        corpus = Corpus.from_document_files(corpus_paths, workers=parameters.workers, **pruning_parameters)
+    else:
+        corpus = Corpus.from_document_file(corpus_paths[0], **pruning_parameters)
+
+    if parameters.binary_corpus_path:
+        corpus.save_binary(parameters.binary_corpus_path)
+
+    model_parameters = dict(
+        number_of_topics=parameters.number_of_topics,
+        alpha=parameters.alpha,
+        beta=parameters.beta,
+        engine=parameters.engine,
+        weight_space=parameters.weight_space,
+        random_number_generator=parameters.random_number_generator,
+        sampler=parameters.sampler,
+        metropolis_hastings_steps=parameters.metropolis_hastings_steps,
+        count_dtype=parameters.count_dtype,
+        count_layout=parameters.count_layout,
+    )
+
+    convergence_parameters = dict(
+        eval_every=parameters.eval_every,
+        log_likelihood_tolerance=parameters.log_likelihood_tolerance,
+        topic_change_tolerance=parameters.topic_change_tolerance,
+    )
+
+    if parameters.number_of_chains > 1:
+        chain_results = run_chains(corpus, parameters.number_of_chains, parameters.number_of_iterations,
+                                   workers=parameters.workers, seed=seed, inference_parameters=convergence_parameters,
+                                   **model_parameters)
+        model = GibbsSamplingDMM(corpus, **model_parameters)
+        model.set_topic_assignments(get_best_chain(chain_results).document_topic_assignments)
+    else:
+        if parameters.resume and os.path.exists(parameters.checkpoint_path):
+            model = GibbsSamplingDMM.load_checkpoint(parameters.checkpoint_path, corpus)
+        else:
+            model = GibbsSamplingDMM(corpus, **model_parameters)
+            model.randomly_initialise_topic_assignment(seed=seed)
+
+        if parameters.log_stats:
+            model.logger.info("Model state holds {:,} bytes".format(model.get_memory_footprint()["total"]))
+            model.enable_stats()
+
+        number_of_remaining_iterations = max(parameters.number_of_iterations - model.iteration, 0)
+        if parameters.distributed_workers:
+            run_approximate_distributed_inference(model, number_of_remaining_iterations,
+                                                  parameters.distributed_workers,
+                                                  checkpoint_path=parameters.checkpoint_path,
+                                                  checkpoint_every=parameters.checkpoint_every,
+                                                  **convergence_parameters)
+        else:
+            model.inference(number_of_remaining_iterations, checkpoint_path=parameters.checkpoint_path,
+                            checkpoint_every=parameters.checkpoint_every, **convergence_parameters)
+
+        if parameters.log_stats:
+            model.logger.info(model.disable_stats().summary())
 
     if parameters.output_path:
-        model.save_top_topical_words_to_file(os.path.join(parameters.output_path, "topWords"))
-        model.save_topic_assignments_to_file(os.path.join(parameters.output_path, "topicAssignments"))
+        model.save_outputs(parameters.output_path, output_format=parameters.output_format,
+                           number_of_top_words=parameters.number_of_top_words)
+
+    if parameters.model_path:
+        model.to_topic_model().save(parameters.model_path)
 
 
 def parse_args(args=None):
@@ -33,8 +109,31 @@ def parse_args(args=None):
     
     parser.add_argument("-c", "--corpus-file",
                         dest="corpus_path", metavar="<path>",
-                        help="Path to corpus file",
+                        help="Path to corpus file, either text or binary, or a glob pattern matching text files",
                         required=True)
+
+    parser.add_argument("--save-binary-corpus",
+                        dest="binary_corpus_path", metavar="<path>",
+                        help="Path at which to save the corpus in binary form")
+
+    parser.add_argument("--min-count",
+                        dest="minimum_count", metavar="<integer>",
+                        type=int,
+                        help="Fewest occurrences of a word in the corpus for it to be kept")
+
+    parser.add_argument("--max-df",
+                        dest="maximum_document_frequency", metavar="<double>",
+                        type=float,
+                        help="Largest fraction of documents in which a word may occur and be kept")
+
+    parser.add_argument("--stopwords",
+                        dest="stopwords_path", metavar="<path>",
+                        help="Path to a file of words to remove from the corpus, separated by whitespace")
+
+    parser.add_argument("--max-vocab-size",
+                        dest="maximum_vocabulary_size", metavar="<integer>",
+                        type=int,
+                        help="Most words to keep, which are the most frequent")
                         
     parser.add_argument("-n", "--num-topics",
                         dest="number_of_topics", metavar="<integer>",
@@ -51,24 +150,147 @@ def parse_args(args=None):
                         default=0.001, type=float,
                         help="Beta value")
 
-    parser.add_argument("--output-path",
+    parser.add_argument("--output-path", "--output",
                         dest="output_path", metavar="<path>",
                         help="Output directory")
 
+    parser.add_argument("--output-format",
+                        dest="output_format",
+                        choices=GibbsSamplingDMM.OUTPUT_FORMATS,
+                        default="text",
+                        help="Format of the output, where npy, npz and parquet also hold topic probabilities")
+
+    parser.add_argument("--save-model",
+                        dest="model_path", metavar="<path>",
+                        help="Path at which to save the trained model for scoring new documents")
+
     parser.add_argument("--iterations",
                         dest="number_of_iterations", metavar="<integer>",
                         default=2000, type=int,
                         help="Number of iterations")
 
-    parser.add_argument("--num_words",
+    parser.add_argument("--num-words", "--num_words",
                         dest="number_of_top_words", metavar="<integer>",
-                        default=20,  type=int,
+                        default=20, type=int,
                         help="Number of most probable topical words")
 
+    parser.add_argument("--engine",
+                        choices=GibbsSamplingDMM.ENGINES,
+                        default="python",
+                        help="Sampling engine")
+
+    parser.add_argument("--weight-space",
+                        dest="weight_space",
+                        choices=GibbsSamplingDMM.WEIGHT_SPACES,
+                        default="linear",
+                        help="Space in which topic weights are computed")
+
+    parser.add_argument("--random-number-generator",
+                        dest="random_number_generator",
+                        choices=GibbsSamplingDMM.RANDOM_NUMBER_GENERATORS,
+                        default="legacy",
+                        help="Random number generator")
+
+    parser.add_argument("--sampler",
+                        choices=GibbsSamplingDMM.SAMPLERS,
+                        default="gibbs",
+                        help="Exact Gibbs sampling, or Metropolis-Hastings with alias tables for many topics")
+
+    parser.add_argument("--metropolis-hastings-steps",
+                        dest="metropolis_hastings_steps", metavar="<integer>",
+                        default=4, type=int,
+                        help="Number of Metropolis-Hastings steps for each document with the alias sampler")
+
+    parser.add_argument("--count-dtype",
+                        dest="count_dtype",
+                        choices=GibbsSamplingDMM.COUNT_DTYPES,
+                        default="int32",
+                        help="Integer dtype of the word counts, where uint16 suits corpora without very common words")
+
+    parser.add_argument("--count-layout",
+                        dest="count_layout",
+                        choices=GibbsSamplingDMM.COUNT_LAYOUTS,
+                        default="word-major",
+                        help="Whether the word counts of each topic or of each word are contiguous in memory")
+
+    parser.add_argument("--log-stats",
+                        dest="log_stats", action="store_true",
+                        help="Log the time spent in each phase of sampling and the throughput of each iteration")
+
+    parser.add_argument("--checkpoint",
+                        dest="checkpoint_path", metavar="<path>",
+                        help="Path at which to save checkpoints")
+
+    parser.add_argument("--checkpoint-every",
+                        dest="checkpoint_every", metavar="<integer>",
+                        type=int,
+                        help="Number of iterations between checkpoints")
+
+    parser.add_argument("--resume",
+                        action="store_true",
+                        help="Resume from the checkpoint if it exists")
+
+    parser.add_argument("--eval-every",
+                        dest="eval_every", metavar="<integer>",
+                        default=1, type=int,
+                        help="Number of iterations between convergence checks")
+
+    parser.add_argument("--log-likelihood-tolerance",
+                        dest="log_likelihood_tolerance", metavar="<double>",
+                        type=float,
+                        help="Stop once the relative change in log-likelihood falls below this value")
+
+    parser.add_argument("--topic-change-tolerance",
+                        dest="topic_change_tolerance", metavar="<double>",
+                        type=float,
+                        help="Stop once the fraction of documents changing topic falls below this value")
+
+    parser.add_argument("--chains",
+                        dest="number_of_chains", metavar="<integer>",
+                        default=1, type=int,
+                        help="Number of independent chains, of which the most likely is kept")
+
+    parser.add_argument("--workers",
+                        metavar="<integer>",
+                        type=int,
+                        help="Number of worker processes for running chains and reading corpus files")
+
+    parser.add_argument("--distributed-workers",
+                        dest="distributed_workers", metavar="<integer>",
+                        type=int,
+                        help="Number of worker processes for approximate distributed sampling of one chain")
+
     parameters = parser.parse_args(args)
+
+    if (parameters.resume or parameters.checkpoint_every) and not parameters.checkpoint_path:
+        parser.error("--resume and --checkpoint-every require --checkpoint")
+
+    if parameters.number_of_chains > 1 and parameters.checkpoint_path:
+        parser.error("--checkpoint cannot be used with more than one chain")
+
+    if parameters.distributed_workers and parameters.number_of_chains > 1:
+        parser.error("--distributed-workers cannot be used with --chains")
+
+    if parameters.sampler == "alias" and parameters.engine != "numba":
+        parser.error("--sampler alias requires --engine numba")
+
+    if parameters.distributed_workers and parameters.engine != "numba":
+        parser.error("--distributed-workers requires --engine numba")
+
+    if parameters.sampler == "alias" and parameters.distributed_workers:
+        parser.error("--sampler alias cannot be used with --distributed-workers")
+
+    if parameters.output_format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        parser.error("--output-format parquet requires pyarrow to be installed")
+
+    if parameters.log_stats and (parameters.number_of_chains > 1 or parameters.distributed_workers):
+        parser.error("--log-stats cannot be used with --chains or --distributed-workers")
+
     return parameters
 
 
 if __name__ == '__main__':
     parsed_parameters = parse_args(sys.argv[1:])
+    if parsed_parameters.log_stats:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s: %(message)s")
     main(parsed_parameters)
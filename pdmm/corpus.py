@@ -1,35 +1,61 @@
 """
 Contains the Corpus class.
 """
-from collections import Counter
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 import numpy as np
 
+from .kernels import count_words_in_documents
+from .storage import is_array_file, read_array_file, write_array_file
 from .vocabulary import Vocabulary
 
+CHUNK_SIZE = 1 << 20
+WORD_BATCH_SIZE = 1 << 16
+BINARY_MAGIC = b"PDMMCORP"
+BINARY_VERSION = 1
+
 
 class Corpus:
     """
     A class representing a document corpus.
 
+    The documents are stored as flat arrays in a compressed sparse
+    row (CSR) layout, so that memory grows with the number of tokens
+    rather than with the number of documents times the size of the
+    vocabulary.
+
     Attributes
     ----------
-    documents : list[list[int]]
-        A list of lists containing integers representing
-        word indices.
-    occurrence_to_index_count : list[list[int]]
-        A list of lists containing integers representing
-        relative occurrences of words within documents.
-    word_counts_in_documents : np.ndarray[int, int]
-        An array denoting the occurrences of each word
-        within each document.
+    word_ids : np.ndarray[int]
+        The word indices of every document, concatenated.
+    document_offsets : np.ndarray[int]
+        The offsets of each document within `word_ids`, such that
+        document i is `word_ids[document_offsets[i]:document_offsets[i + 1]]`.
+    occurrence_indices : np.ndarray[int]
+        The relative occurrence of each word within its document,
+        aligned with `word_ids`. These are stored as unsigned 16-bit
+        integers unless a document is longer than 65,535 words, in
+        which case they are unsigned 32-bit integers.
+    unique_word_ids : np.ndarray[int]
+        The distinct word indices of every document, concatenated.
+    unique_word_offsets : np.ndarray[int]
+        The offsets of each document within `unique_word_ids`.
+    unique_word_counts : np.ndarray[int]
+        The number of occurrences of each distinct word within
+        its document, aligned with `unique_word_ids`.
     vocabulary : pdmm.vocabulary.Vocabulary
         The vocabulary of the corpus.
     """
-    def __init__(self, documents, occurrence_to_index_count, word_counts_in_documents, vocabulary):
-        self.documents = documents
-        self.occurrence_to_index_count = occurrence_to_index_count
-        self.word_counts_in_documents = word_counts_in_documents
+    def __init__(self, word_ids, document_offsets, occurrence_indices, unique_word_ids, unique_word_offsets,
+                 unique_word_counts, vocabulary):
+        self.word_ids = word_ids
+        self.document_offsets = document_offsets
+        self.occurrence_indices = occurrence_indices
+        self.unique_word_ids = unique_word_ids
+        self.unique_word_offsets = unique_word_offsets
+        self.unique_word_counts = unique_word_counts
         self.vocab = vocabulary
 
     def __eq__(self, other):
@@ -37,59 +63,451 @@ class Corpus:
             raise TypeError("Can only compare to {} type.".format(type(self).__name__))
 
         return all([
-            self.documents == other.documents,
-            self.occurrence_to_index_count == other.occurrence_to_index_count,
-            np.all(self.word_counts_in_documents == other.word_counts_in_documents),
+            np.array_equal(self.word_ids, other.word_ids),
+            np.array_equal(self.document_offsets, other.document_offsets),
+            np.array_equal(self.occurrence_indices, other.occurrence_indices),
+            np.array_equal(self.unique_word_ids, other.unique_word_ids),
+            np.array_equal(self.unique_word_offsets, other.unique_word_offsets),
+            np.array_equal(self.unique_word_counts, other.unique_word_counts),
             self.vocab == other.vocab
         ])
 
     def __iter__(self):
-        for document in self.documents:
-            yield document
+        for document_index in range(self.number_of_documents):
+            yield self[document_index]
 
     def __getitem__(self, item):
-        return self.documents[item]
+        """
+        Get a document as an array of word ids, or a slice of documents as a corpus.
+
+        A slice with a step of one gives a corpus whose arrays are views
+        of those of this corpus, apart from its rebased offsets. Other
+        slices copy the documents. Either way the vocabulary is shared.
+        """
+        if isinstance(item, slice):
+            return self._get_documents_in_range(*item.indices(self.number_of_documents))
+        return self.word_ids[self.document_offsets[item]:self.document_offsets[item + 1]]
+
+    def _get_documents_in_range(self, start, stop, step):
+        """Get the documents of a range as a corpus sharing the vocabulary."""
+        if step == 1:
+            stop = max(start, stop)
+            token_start, token_end = self.document_offsets[start], self.document_offsets[stop]
+            unique_start, unique_end = self.unique_word_offsets[start], self.unique_word_offsets[stop]
+            return type(self)(self.word_ids[token_start:token_end],
+                              self.document_offsets[start:stop + 1] - token_start,
+                              self.occurrence_indices[token_start:token_end],
+                              self.unique_word_ids[unique_start:unique_end],
+                              self.unique_word_offsets[start:stop + 1] - unique_start,
+                              self.unique_word_counts[unique_start:unique_end], self.vocab)
+
+        document_indices = np.arange(start, stop, step)
+        token_positions, document_offsets = _get_positions_of_documents(self.document_offsets, document_indices)
+        unique_positions, unique_word_offsets = _get_positions_of_documents(self.unique_word_offsets,
+                                                                            document_indices)
+        return type(self)(self.word_ids[token_positions], document_offsets, self.occurrence_indices[token_positions],
+                          self.unique_word_ids[unique_positions], unique_word_offsets,
+                          self.unique_word_counts[unique_positions], self.vocab)
 
     @property
     def number_of_documents(self):
         """Return the number of documents in the corpus."""
-        return len(self.documents)
+        return len(self.document_offsets) - 1
+
+    @property
+    def documents(self):
+        """Return the documents as a list of lists of word indices."""
+        return [document.tolist() for document in self]
+
+    @property
+    def occurrence_to_index_count(self):
+        """Return the relative occurrences of words as a list of lists."""
+        return [self.get_occurrence_indices(document_index).tolist()
+                for document_index in range(self.number_of_documents)]
+
+    def get_occurrence_indices(self, document_index):
+        """Get the relative occurrences of the words within a document."""
+        return self.occurrence_indices[self.document_offsets[document_index]:
+                                       self.document_offsets[document_index + 1]]
+
+    def get_unique_words(self, document_index):
+        """Get the distinct words within a document and their counts."""
+        start = self.unique_word_offsets[document_index]
+        end = self.unique_word_offsets[document_index + 1]
+        return self.unique_word_ids[start:end], self.unique_word_counts[start:end]
 
     def get_mean_document_length(self):
         """Get the mean length of documents in the corpus."""
-        sum_of_lengths = sum(len(document) for document in self)
-        return sum_of_lengths / self.number_of_documents
+        return len(self.word_ids) / self.number_of_documents
+
+    def save_binary(self, file_path):
+        """
+        Save the corpus to a binary file.
+
+        The file holds the vocabulary and every array of the corpus in
+        a versioned format that `load_binary` can memory map, avoiding
+        tokenising the text again on later runs.
+
+        Parameters
+        ----------
+        file_path : str
+            The location at which to save the file.
+        """
+        word_bytes, word_offsets = self.vocab.to_packed_arrays()
+        arrays = {
+            "word_ids": self.word_ids,
+            "document_offsets": self.document_offsets,
+            "occurrence_indices": self.occurrence_indices,
+            "unique_word_ids": self.unique_word_ids,
+            "unique_word_offsets": self.unique_word_offsets,
+            "unique_word_counts": self.unique_word_counts,
+            "vocabulary_bytes": word_bytes,
+            "vocabulary_offsets": word_offsets,
+        }
+        metadata = {"vocabulary_number_of_buckets": self.vocab.number_of_buckets}
+        write_array_file(file_path, BINARY_MAGIC, BINARY_VERSION, arrays, metadata=metadata)
 
     @classmethod
-    def from_document_file(cls, file_path):
-        """Create a Corpus instance from a document file."""
-        with open(file_path, "r") as rf:
-            list_of_documents = (line.rstrip().split() for line in rf.readlines())
+    def load_binary(cls, file_path, mmap=True):
+        """
+        Load a corpus from a binary file made by `save_binary`.
+
+        Parameters
+        ----------
+        file_path : str
+            The location of the file.
 
-        return cls.from_iterable_of_word_lists(list_of_documents)
+        Optional Parameters
+        -------------------
+        mmap : bool, defaults to True
+            Whether to memory map the arrays read-only, so that
+            processes loading the same file share its pages.
+        """
+        arrays, metadata = read_array_file(file_path, BINARY_MAGIC, BINARY_VERSION, mmap=mmap)
+        vocab = Vocabulary.from_packed_arrays(arrays["vocabulary_bytes"], arrays["vocabulary_offsets"],
+                                              number_of_buckets=metadata.get("vocabulary_number_of_buckets"))
+        return cls(arrays["word_ids"], arrays["document_offsets"], arrays["occurrence_indices"],
+                   arrays["unique_word_ids"], arrays["unique_word_offsets"], arrays["unique_word_counts"], vocab)
 
     @classmethod
-    def from_iterable_of_word_lists(cls, iterable_of_word_lists):
-        """Create a Corpus instance from an iterable yielding lists of words."""
-        vocab = Vocabulary()
-        documents = []
-        occurrence_to_index_count = []
-
-        for list_of_words in iterable_of_word_lists:
-            document = []
-            word_occurrence_to_index_in_document_count = Counter()
-            word_occurrence_to_index_in_document = []
-
-            for word in list_of_words:
-                word_id = vocab.get_id_from_word(word)
-                document.append(word_id)
-                word_occurrence_to_index_in_document_count[word] += 1
-
-                word_occurrence_to_index_in_document.append(word_occurrence_to_index_in_document_count[word])
-
-            documents.append(document)
-            occurrence_to_index_count.append(word_occurrence_to_index_in_document)
-
-        word_counts_in_documents = [np.bincount(document, minlength=vocab.size) for document in documents]
-        word_counts_in_documents_as_array = np.array(word_counts_in_documents, dtype=np.int32)
-        return cls(documents, occurrence_to_index_count, word_counts_in_documents_as_array, vocab)
+    def from_binary_files(cls, file_paths, **pruning_parameters):
+        """
+        Create a Corpus instance from many binary corpus files made by `save_binary`.
+
+        The vocabularies are merged in the order of the files and the
+        word ids remapped, so the corpus is the same as that of reading
+        the text of the files one after another.
+
+        Parameters
+        ----------
+        file_paths : list[str]
+            The paths to binary corpus files, in the order in which
+            their documents are added. Their vocabularies must either
+            all be hashed into the same number of buckets, or all not
+            be hashed.
+
+        Optional Parameters
+        -------------------
+        **pruning_parameters
+            The filters of `prune_vocabulary` to apply to the corpus.
+        """
+        corpora = [cls.load_binary(file_path) for file_path in file_paths]
+        numbers_of_buckets = {corpus.vocab.number_of_buckets for corpus in corpora}
+        if len(numbers_of_buckets) > 1:
+            raise ValueError("The vocabularies of binary corpus files must all be hashed into the same number of "
+                             "buckets or all not be hashed, not {!r}.".format(sorted(numbers_of_buckets, key=str)))
+
+        # A hashed word maps back to its own bucket, so the same remapping merges hashed vocabularies.
+        vocab = Vocabulary(number_of_buckets=numbers_of_buckets.pop())
+        word_ids, document_offsets = _merge_document_file_shards(
+            ((corpus.word_ids, corpus.document_offsets, corpus.vocab.words_from_ids(range(corpus.vocab.size)))
+             for corpus in corpora), vocab)
+        return cls.from_word_id_arrays(word_ids, document_offsets, vocab).prune_vocabulary(**pruning_parameters)
+
+    @staticmethod
+    def is_binary_file(file_path):
+        """Check whether a file is a binary corpus file."""
+        return is_array_file(file_path, BINARY_MAGIC)
+
+    def append_documents(self, iterable_of_word_lists):
+        """
+        Append new documents to the end of the corpus.
+
+        Words missing from the vocabulary are added to it, so existing
+        word ids are unchanged. The arrays of the corpus are replaced
+        rather than resized in place, so a memory mapped corpus is
+        copied into memory.
+
+        Parameters
+        ----------
+        iterable_of_word_lists : iterable[list[str]]
+            The new documents, as lists of words.
+
+        Returns
+        -------
+        document_indices : range
+            The indices of the new documents.
+        """
+        first_new_document_index = self.number_of_documents
+        word_ids, document_offsets = _get_word_id_arrays(iterable_of_word_lists, self.vocab.ids_from_words)
+        occurrence_indices, unique_word_ids, unique_word_offsets, unique_word_counts = count_words_in_documents(
+            word_ids, document_offsets, self.vocab.size)
+
+        self.unique_word_offsets = np.concatenate([self.unique_word_offsets,
+                                                   unique_word_offsets[1:] + len(self.unique_word_ids)])
+        self.document_offsets = np.concatenate([self.document_offsets, document_offsets[1:] + len(self.word_ids)])
+        self.word_ids = np.concatenate([self.word_ids, word_ids])
+        self.occurrence_indices = np.concatenate([self.occurrence_indices, occurrence_indices])
+        self.unique_word_ids = np.concatenate([self.unique_word_ids, unique_word_ids])
+        self.unique_word_counts = np.concatenate([self.unique_word_counts, unique_word_counts])
+
+        return range(first_new_document_index, self.number_of_documents)
+
+    def remove_oldest_documents(self, number_of_documents):
+        """
+        Remove documents from the start of the corpus.
+
+        The vocabulary is left unchanged, so word ids remain valid.
+
+        Parameters
+        ----------
+        number_of_documents : int
+            The number of documents to remove.
+        """
+        token_start = self.document_offsets[number_of_documents]
+        unique_start = self.unique_word_offsets[number_of_documents]
+
+        self.word_ids = self.word_ids[token_start:].copy()
+        self.occurrence_indices = self.occurrence_indices[token_start:].copy()
+        self.document_offsets = self.document_offsets[number_of_documents:] - token_start
+        self.unique_word_ids = self.unique_word_ids[unique_start:].copy()
+        self.unique_word_counts = self.unique_word_counts[unique_start:].copy()
+        self.unique_word_offsets = self.unique_word_offsets[number_of_documents:] - unique_start
+
+    def prune_vocabulary(self, minimum_count=None, maximum_document_frequency=None, stopwords=None,
+                         maximum_vocabulary_size=None):
+        """
+        Get a copy of the corpus without rare, common or unwanted words.
+
+        The words kept are given compact ids in their original order,
+        so the vocabulary, and the word counts of any model built on
+        the corpus, shrink accordingly. Documents left without words
+        are kept, so document indices are unchanged.
+
+        Optional Parameters
+        -------------------
+        minimum_count : int, optional
+            The fewest occurrences in the corpus a word must have to be kept.
+        maximum_document_frequency : float, optional
+            The largest fraction of documents in which a word may occur
+            and be kept.
+        stopwords : iterable[str], optional
+            Words to remove.
+        maximum_vocabulary_size : int, optional
+            The most words to keep, which are the most frequent of those
+            passing the other filters, favouring earlier words in ties.
+
+        Returns
+        -------
+        corpus : Corpus
+            The pruned corpus, which is this corpus if no filter is given.
+        """
+        if minimum_count is None and maximum_document_frequency is None and stopwords is None and \
+                maximum_vocabulary_size is None:
+            return self
+        if self.vocab.is_hashed:
+            raise ValueError("Cannot prune a hashed vocabulary.")
+        if maximum_document_frequency is not None and not 0 < maximum_document_frequency <= 1:
+            raise ValueError("maximum_document_frequency must be in (0, 1], not {!r}.".format(
+                maximum_document_frequency))
+        if maximum_vocabulary_size is not None and maximum_vocabulary_size < 0:
+            raise ValueError("maximum_vocabulary_size must not be negative, not {!r}.".format(
+                maximum_vocabulary_size))
+
+        word_counts = np.bincount(self.word_ids, minlength=self.vocab.size)
+        is_kept = np.ones(self.vocab.size, dtype=bool)
+        if minimum_count is not None:
+            is_kept &= word_counts >= minimum_count
+        if maximum_document_frequency is not None:
+            document_frequencies = np.bincount(self.unique_word_ids, minlength=self.vocab.size)
+            is_kept &= document_frequencies <= maximum_document_frequency * self.number_of_documents
+        if stopwords is not None:
+            stopword_ids = np.array([self.vocab.get_existing_id_from_word(word) for word in stopwords],
+                                    dtype=np.int64)
+            is_kept[stopword_ids[stopword_ids >= 0]] = False
+        if maximum_vocabulary_size is not None:
+            kept_word_ids = np.flatnonzero(is_kept)
+            most_frequent_order = np.argsort(-word_counts[kept_word_ids], kind="stable")
+            is_kept[kept_word_ids[most_frequent_order[maximum_vocabulary_size:]]] = False
+
+        new_word_ids = (np.cumsum(is_kept) - 1).astype(np.int32)
+        is_token_kept = is_kept[self.word_ids]
+        word_ids = new_word_ids[self.word_ids[is_token_kept]]
+        number_of_kept_tokens = np.zeros(len(self.word_ids) + 1, dtype=np.int64)
+        np.cumsum(is_token_kept, out=number_of_kept_tokens[1:])
+        document_offsets = number_of_kept_tokens[self.document_offsets]
+        vocab = Vocabulary.from_list_of_words(self.vocab.words_from_ids(np.flatnonzero(is_kept)))
+        return self.from_word_id_arrays(word_ids, document_offsets, vocab)
+
+    @classmethod
+    def from_document_file(cls, file_path, chunk_size=CHUNK_SIZE, vocabulary=None, **pruning_parameters):
+        """
+        Create a Corpus instance from a document file.
+
+        The file is streamed in chunks of lines, so that only the
+        compact word id arrays are ever held in memory in full.
+
+        Parameters
+        ----------
+        file_path : str
+            The path to a file containing one document per line.
+
+        Optional Parameters
+        -------------------
+        chunk_size : int, defaults to CHUNK_SIZE
+            The approximate number of characters to read at once.
+        vocabulary : pdmm.vocabulary.Vocabulary, optional
+            The vocabulary to which to add the words, such as a hashed
+            vocabulary. Defaults to a new, empty vocabulary.
+        **pruning_parameters
+            The filters of `prune_vocabulary` to apply to the corpus.
+        """
+        return cls.from_iterable_of_word_lists(_read_word_lists_from_file(file_path, chunk_size),
+                                               vocabulary=vocabulary, **pruning_parameters)
+
+    @classmethod
+    def from_document_files(cls, file_paths, workers=None, chunk_size=CHUNK_SIZE, vocabulary=None,
+                            **pruning_parameters):
+        """
+        Create a Corpus instance from many document files, reading them across a process pool.
+
+        Each worker reads whole files, building a vocabulary of its own
+        for each. The vocabularies are merged in the order of the files
+        and the word ids remapped, so the corpus is the same as that of
+        reading the files one after another.
+
+        Parameters
+        ----------
+        file_paths : list[str]
+            The paths to files containing one document per line, in
+            the order in which their documents are added.
+
+        Optional Parameters
+        -------------------
+        workers : int, defaults to None
+            The number of worker processes. If not given, this is the
+            number of processors on the machine. With one worker, the
+            files are read in this process.
+        chunk_size : int, defaults to CHUNK_SIZE
+            The approximate number of characters to read at once.
+        vocabulary : pdmm.vocabulary.Vocabulary, optional
+            The vocabulary to which to add the words, such as a hashed
+            vocabulary. Defaults to a new, empty vocabulary.
+        **pruning_parameters
+            The filters of `prune_vocabulary` to apply to the corpus.
+        """
+        for file_path in file_paths:
+            if cls.is_binary_file(file_path):
+                raise ValueError("{!r} is a binary corpus file, which should be read with "
+                                 "from_binary_files.".format(file_path))
+
+        vocab = Vocabulary() if vocabulary is None else vocabulary
+        if workers == 1:
+            word_ids, document_offsets = _merge_document_file_shards(
+                map(_read_document_file_shard, file_paths, repeat(chunk_size)), vocab)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                word_ids, document_offsets = _merge_document_file_shards(
+                    executor.map(_read_document_file_shard, file_paths, repeat(chunk_size)), vocab)
+        return cls.from_word_id_arrays(word_ids, document_offsets, vocab).prune_vocabulary(**pruning_parameters)
+
+    @classmethod
+    def from_iterable_of_word_lists(cls, iterable_of_word_lists, vocabulary=None, **pruning_parameters):
+        """
+        Create a Corpus instance from an iterable yielding lists of words.
+
+        Words are counted as the corpus is built, and any filters of
+        `prune_vocabulary` given are applied once it is complete, so
+        that the text is only read once.
+
+        Optional Parameters
+        -------------------
+        vocabulary : pdmm.vocabulary.Vocabulary, optional
+            The vocabulary to which to add the words, such as a hashed
+            vocabulary. Defaults to a new, empty vocabulary.
+        **pruning_parameters
+            The filters of `prune_vocabulary` to apply to the corpus.
+        """
+        vocab = Vocabulary() if vocabulary is None else vocabulary
+        word_ids, document_offsets = _get_word_id_arrays(iterable_of_word_lists, vocab.ids_from_words)
+        return cls.from_word_id_arrays(word_ids, document_offsets, vocab).prune_vocabulary(**pruning_parameters)
+
+    @classmethod
+    def from_word_id_arrays(cls, word_ids, document_offsets, vocabulary):
+        """Create a Corpus instance from flat word indices and document offsets."""
+        occurrence_indices, unique_word_ids, unique_word_offsets, unique_word_counts = count_words_in_documents(
+            word_ids, document_offsets, vocabulary.size)
+        return cls(word_ids, document_offsets, occurrence_indices, unique_word_ids, unique_word_offsets,
+                   unique_word_counts, vocabulary)
+
+
+def _read_word_lists_from_file(file_path, chunk_size):
+    """Yield the list of words on each line of a file, reading a chunk of lines at a time."""
+    with open(file_path, "r") as rf:
+        lines = rf.readlines(chunk_size)
+        while lines:
+            for line in lines:
+                yield line.split()
+            lines = rf.readlines(chunk_size)
+
+
+def _read_document_file_shard(file_path, chunk_size):
+    """Read a document file into word ids, document offsets and the words of its own vocabulary."""
+    vocab = Vocabulary()
+    word_ids, document_offsets = _get_word_id_arrays(_read_word_lists_from_file(file_path, chunk_size),
+                                                     vocab.ids_from_words)
+    return word_ids, document_offsets, vocab.words_from_ids(range(vocab.size))
+
+
+def _merge_document_file_shards(shards, vocabulary):
+    """Concatenate document file shards in order, remapping the word ids of each into the vocabulary."""
+    list_of_word_ids = [np.empty(0, dtype=np.int32)]
+    list_of_document_lengths = [np.empty(0, dtype=np.int64)]
+
+    for shard_word_ids, shard_document_offsets, shard_words in shards:
+        word_id_map = vocabulary.ids_from_words(shard_words)
+        list_of_word_ids.append(word_id_map[shard_word_ids])
+        list_of_document_lengths.append(np.diff(shard_document_offsets))
+
+    document_lengths = np.concatenate(list_of_document_lengths)
+    document_offsets = np.zeros(len(document_lengths) + 1, dtype=np.int64)
+    np.cumsum(document_lengths, out=document_offsets[1:])
+    return np.concatenate(list_of_word_ids), document_offsets
+
+
+def _get_positions_of_documents(offsets, document_indices):
+    """Get the positions of the elements of the given documents within flat arrays, and their new offsets."""
+    lengths = offsets[document_indices + 1] - offsets[document_indices]
+    new_offsets = np.zeros(len(document_indices) + 1, dtype=offsets.dtype)
+    np.cumsum(lengths, out=new_offsets[1:])
+    positions = np.repeat(offsets[document_indices] - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    return positions, new_offsets
+
+
+def _get_word_id_arrays(iterable_of_word_lists, ids_from_words, batch_size=WORD_BATCH_SIZE):
+    """Convert lists of words into flat word ids and document offsets, looking up a batch of words at a time."""
+    list_of_word_ids = [np.empty(0, dtype=np.int32)]
+    document_lengths = array("q")
+    batch_of_words = []
+
+    for list_of_words in iterable_of_word_lists:
+        batch_of_words.extend(list_of_words)
+        document_lengths.append(len(list_of_words))
+        if len(batch_of_words) >= batch_size:
+            list_of_word_ids.append(ids_from_words(batch_of_words))
+            batch_of_words = []
+    list_of_word_ids.append(ids_from_words(batch_of_words))
+
+    document_offsets = np.zeros(len(document_lengths) + 1, dtype=np.int64)
+    np.cumsum(np.frombuffer(document_lengths, dtype=np.int64), out=document_offsets[1:])
+    return np.concatenate(list_of_word_ids), document_offsets
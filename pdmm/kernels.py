@@ -0,0 +1,952 @@
+"""
+Contains compiled kernels for running the Gibbs sampler on flat arrays.
+"""
+import math
+
+from numba import njit
+import numpy as np
+
+from .utils import build_alias_table, sample_from_alias_table, sample_from_cumulative_weights
+
+LOG_GAMMA_TABLE_SIZE = 1 << 16
+
+
+@njit
+def sample_in_single_iteration(document_offsets, unique_word_ids, unique_word_offsets, unique_word_counts,
+                               document_topic_assignments, number_of_documents_in_each_topic,
+                               number_of_each_word_in_each_topic, number_of_total_words_in_each_topic, topic_weights,
+                               alpha, beta, vocabulary_size_times_beta, log_gamma_table, log_space, random_numbers):
+    """
+    Sample new topics for every document in a single compiled sweep.
+
+    The parameters are as for `sample_documents_in_single_iteration`,
+    with every document sampled in order.
+    """
+    sample_documents_in_single_iteration(np.arange(document_offsets.shape[0] - 1), document_offsets, unique_word_ids,
+                                         unique_word_offsets, unique_word_counts, document_topic_assignments,
+                                         number_of_documents_in_each_topic, number_of_each_word_in_each_topic,
+                                         number_of_total_words_in_each_topic, topic_weights, alpha, beta,
+                                         vocabulary_size_times_beta, log_gamma_table, log_space, random_numbers)
+
+
+@njit
+def sample_documents_in_single_iteration(document_indices, document_offsets, unique_word_ids, unique_word_offsets,
+                                         unique_word_counts, document_topic_assignments,
+                                         number_of_documents_in_each_topic, number_of_each_word_in_each_topic,
+                                         number_of_total_words_in_each_topic, topic_weights, alpha, beta,
+                                         vocabulary_size_times_beta, log_gamma_table, log_space, random_numbers):
+    """
+    Sample new topics for the given documents in a single compiled sweep.
+
+    Parameters
+    ----------
+    document_indices : np.ndarray[int]
+        The indices of the documents to sample, in order.
+    document_offsets : np.ndarray[int]
+        The offsets of each document within the word ids, with
+        one more element than the number of documents.
+    unique_word_ids : np.ndarray[int]
+        The distinct word ids of every document, concatenated.
+    unique_word_offsets : np.ndarray[int]
+        The offsets of each document within `unique_word_ids`.
+    unique_word_counts : np.ndarray[int]
+        The count of each distinct word within its document.
+    document_topic_assignments : np.ndarray[int]
+        The current topic of each document, updated in place.
+    number_of_documents_in_each_topic : np.ndarray[int]
+        The number of documents in each topic, updated in place.
+    number_of_each_word_in_each_topic : np.ndarray[int, int]
+        The count of each word within each topic, updated in place.
+    number_of_total_words_in_each_topic : np.ndarray[int]
+        The number of words within each topic, updated in place.
+    topic_weights : np.ndarray[float]
+        The topic weights, left holding those of the final document.
+    alpha : float
+        The hyper-parameter alpha.
+    beta : float
+        The hyper-parameter beta.
+    vocabulary_size_times_beta : float
+        The size of the vocabulary multiplied by beta.
+    log_gamma_table : np.ndarray[float]
+        The log gamma function of n + beta for small integers n, as
+        made by `compute_log_gamma_table`.
+    log_space : bool
+        Whether to scale the topic weights so that the largest is one.
+    random_numbers : np.ndarray[float]
+        One random number in [0, 1) for each document to sample.
+
+    Notes
+    -----
+    - The weights are computed by `compute_topic_weights_for_document`,
+      exactly as in the Python engine, so both engines follow the same
+      chain for a given seed.
+    """
+    number_of_topics = topic_weights.shape[0]
+    cumulative_weights = np.empty(number_of_topics)
+
+    for position in range(document_indices.shape[0]):
+        document_index = document_indices[position]
+        document_length = document_offsets[document_index + 1] - document_offsets[document_index]
+        unique_start = unique_word_offsets[document_index]
+        unique_end = unique_word_offsets[document_index + 1]
+
+        current_topic_index = document_topic_assignments[document_index]
+        number_of_documents_in_each_topic[current_topic_index] -= 1
+        number_of_total_words_in_each_topic[current_topic_index] -= document_length
+        for unique_index in range(unique_start, unique_end):
+            number_of_each_word_in_each_topic[current_topic_index, unique_word_ids[unique_index]] -= \
+                unique_word_counts[unique_index]
+
+        compute_topic_weights_for_document(unique_word_ids[unique_start:unique_end],
+                                           unique_word_counts[unique_start:unique_end], document_length,
+                                           number_of_documents_in_each_topic, number_of_each_word_in_each_topic,
+                                           number_of_total_words_in_each_topic, topic_weights, alpha, beta,
+                                           vocabulary_size_times_beta, log_gamma_table, log_space)
+
+        running_total = 0.0
+        for topic_index in range(number_of_topics):
+            running_total += topic_weights[topic_index]
+            cumulative_weights[topic_index] = running_total
+
+        new_topic_index = sample_from_cumulative_weights(cumulative_weights, random_numbers[position])
+
+        number_of_documents_in_each_topic[new_topic_index] += 1
+        number_of_total_words_in_each_topic[new_topic_index] += document_length
+        for unique_index in range(unique_start, unique_end):
+            number_of_each_word_in_each_topic[new_topic_index, unique_word_ids[unique_index]] += \
+                unique_word_counts[unique_index]
+        document_topic_assignments[document_index] = new_topic_index
+
+
+@njit
+def compute_topic_weights_for_document(unique_word_ids, unique_word_counts, document_length,
+                                       number_of_documents_in_each_topic, number_of_each_word_in_each_topic,
+                                       number_of_total_words_in_each_topic, topic_weights, alpha, beta,
+                                       vocabulary_size_times_beta, log_gamma_table, log_space):
+    """
+    Compute the topic weights for a document from its distinct words.
+
+    The product over the tokens of a word in a topic is a rising
+    factorial, so it is computed as a difference of log gamma
+    functions, looked up in a precomputed table for small counts.
+    The cost therefore depends on the number of distinct words in
+    the document rather than on its length.
+
+    Parameters
+    ----------
+    unique_word_ids : np.ndarray[int]
+        The distinct word ids of the document.
+    unique_word_counts : np.ndarray[int]
+        The count of each distinct word within the document.
+    document_length : int
+        The number of words in the document.
+    number_of_documents_in_each_topic : np.ndarray[int]
+        The number of documents in each topic, excluding the document.
+    number_of_each_word_in_each_topic : np.ndarray[int, int]
+        The count of each word within each topic, excluding the document.
+    number_of_total_words_in_each_topic : np.ndarray[int]
+        The number of words within each topic, excluding the document.
+    topic_weights : np.ndarray[float]
+        The array in which to write the weights.
+    alpha : float
+        The hyper-parameter alpha.
+    beta : float
+        The hyper-parameter beta.
+    vocabulary_size_times_beta : float
+        The size of the vocabulary multiplied by beta.
+    log_gamma_table : np.ndarray[float]
+        The log gamma function of n + beta for small integers n, as
+        made by `compute_log_gamma_table`.
+    log_space : bool
+        Whether to scale the weights so that the largest is one. If
+        not, the weights are the unscaled products, which underflow
+        to zero for long documents.
+    """
+    number_of_topics = topic_weights.shape[0]
+    maximum_log_weight = -np.inf
+
+    for topic_index in range(number_of_topics):
+        log_weight = _compute_log_topic_weight(topic_index, unique_word_ids, unique_word_counts, document_length,
+                                               number_of_documents_in_each_topic, number_of_each_word_in_each_topic,
+                                               number_of_total_words_in_each_topic, alpha, beta,
+                                               vocabulary_size_times_beta, log_gamma_table)
+        topic_weights[topic_index] = log_weight
+        maximum_log_weight = max(maximum_log_weight, log_weight)
+
+    if not log_space:
+        maximum_log_weight = 0.0
+    for topic_index in range(number_of_topics):
+        topic_weights[topic_index] = math.exp(topic_weights[topic_index] - maximum_log_weight)
+
+
+@njit
+def _compute_log_topic_weight(topic_index, unique_word_ids, unique_word_counts, document_length,
+                              number_of_documents_in_each_topic, number_of_each_word_in_each_topic,
+                              number_of_total_words_in_each_topic, alpha, beta, vocabulary_size_times_beta,
+                              log_gamma_table):
+    """Compute the unnormalised log weight of a single topic for a document from its distinct words."""
+    log_weight = math.log(number_of_documents_in_each_topic[topic_index] + alpha)
+    for unique_index in range(unique_word_ids.shape[0]):
+        count = number_of_each_word_in_each_topic[topic_index, unique_word_ids[unique_index]]
+        log_weight += (_log_gamma_from_table(count + unique_word_counts[unique_index], beta, log_gamma_table) -
+                       _log_gamma_from_table(count, beta, log_gamma_table))
+
+    total = number_of_total_words_in_each_topic[topic_index] + vocabulary_size_times_beta
+    log_weight -= math.lgamma(total + document_length) - math.lgamma(total)
+    return log_weight
+
+
+@njit
+def compute_log_gamma_table(offset, size):
+    """Compute the log gamma function of n + offset for each integer n below size."""
+    log_gamma_table = np.empty(size)
+    for n in range(size):
+        log_gamma_table[n] = math.lgamma(n + offset)
+    return log_gamma_table
+
+
+@njit
+def _log_gamma_from_table(count, offset, log_gamma_table):
+    """Get the log gamma function of count + offset, using the table if the count is small enough."""
+    if count < log_gamma_table.shape[0]:
+        return log_gamma_table[int(count)]
+    return math.lgamma(count + offset)
+
+
+@njit
+def build_word_proposal_tables(unique_word_ids, unique_word_offsets, unique_word_counts, document_topic_assignments,
+                               vocabulary_size, number_of_topics):
+    """
+    Build an alias table for each word over the topics in which it occurs.
+
+    The tables are sparse: each word only has entries for the topics
+    holding at least one of its occurrences, so they take space and
+    time proportional to the number of distinct words in each document
+    rather than to the number of topics times the size of the vocabulary.
+
+    Parameters
+    ----------
+    unique_word_ids : np.ndarray[int]
+        The distinct word ids of every document, concatenated.
+    unique_word_offsets : np.ndarray[int]
+        The offsets of each document within `unique_word_ids`.
+    unique_word_counts : np.ndarray[int]
+        The count of each distinct word within its document.
+    document_topic_assignments : np.ndarray[int]
+        The topic of each document.
+    vocabulary_size : int
+        The size of the vocabulary.
+    number_of_topics : int
+        The number of topics.
+
+    Returns
+    -------
+    word_topic_offsets : np.ndarray[int]
+        The offsets of each word within the other arrays.
+    word_topics : np.ndarray[int]
+        The topics in which each word occurs, in ascending order.
+    word_topic_counts : np.ndarray[float]
+        The count of each word within each of its topics.
+    word_counts : np.ndarray[float]
+        The total count of each word.
+    alias_probabilities : np.ndarray[float]
+        The alias table probabilities of each word, over its topics.
+    alias_indices : np.ndarray[int]
+        The alias table indices of each word, relative to its offset.
+    """
+    number_of_entries = unique_word_ids.shape[0]
+    entry_offsets = np.zeros(vocabulary_size + 1, dtype=np.int64)
+    for unique_index in range(number_of_entries):
+        entry_offsets[unique_word_ids[unique_index] + 1] += 1
+    for word_id in range(vocabulary_size):
+        entry_offsets[word_id + 1] += entry_offsets[word_id]
+
+    # Bucket the topic and count of every distinct word of every document by word.
+    entry_topics = np.empty(number_of_entries, dtype=np.int64)
+    entry_counts = np.empty(number_of_entries)
+    next_entry = entry_offsets[:-1].copy()
+    for document_index in range(document_topic_assignments.shape[0]):
+        topic_index = document_topic_assignments[document_index]
+        for unique_index in range(unique_word_offsets[document_index], unique_word_offsets[document_index + 1]):
+            word_id = unique_word_ids[unique_index]
+            entry_topics[next_entry[word_id]] = topic_index
+            entry_counts[next_entry[word_id]] = unique_word_counts[unique_index]
+            next_entry[word_id] += 1
+
+    word_topic_offsets = np.zeros(vocabulary_size + 1, dtype=np.int64)
+    word_topics = np.empty(number_of_entries, dtype=np.int64)
+    word_topic_counts = np.empty(number_of_entries)
+    word_counts = np.zeros(vocabulary_size)
+    alias_probabilities = np.empty(number_of_entries)
+    alias_indices = np.empty(number_of_entries, dtype=np.int64)
+    position_of_topic = np.full(number_of_topics, -1, dtype=np.int64)
+
+    # Merge the entries of each word by topic.
+    number_of_word_topics = 0
+    for word_id in range(vocabulary_size):
+        start = number_of_word_topics
+        for entry_index in range(entry_offsets[word_id], entry_offsets[word_id + 1]):
+            topic_index = entry_topics[entry_index]
+            if position_of_topic[topic_index] < 0:
+                position_of_topic[topic_index] = number_of_word_topics
+                word_topics[number_of_word_topics] = topic_index
+                word_topic_counts[number_of_word_topics] = 0.0
+                number_of_word_topics += 1
+            word_topic_counts[position_of_topic[topic_index]] += entry_counts[entry_index]
+            word_counts[word_id] += entry_counts[entry_index]
+
+        end = number_of_word_topics
+        if end - start > 1:
+            order = np.argsort(word_topics[start:end])
+            word_topics[start:end] = word_topics[start:end][order]
+            word_topic_counts[start:end] = word_topic_counts[start:end][order]
+        for position in range(start, end):
+            position_of_topic[word_topics[position]] = -1
+        if end > start:
+            build_alias_table(word_topic_counts[start:end], alias_probabilities[start:end],
+                              alias_indices[start:end])
+        word_topic_offsets[word_id + 1] = end
+
+    return (word_topic_offsets, word_topics[:number_of_word_topics], word_topic_counts[:number_of_word_topics],
+            word_counts, alias_probabilities[:number_of_word_topics], alias_indices[:number_of_word_topics])
+
+
+@njit
+def sample_documents_with_metropolis_hastings(document_indices, word_ids, document_offsets, unique_word_ids,
+                                              unique_word_offsets, unique_word_counts, document_topic_assignments,
+                                              number_of_documents_in_each_topic, number_of_each_word_in_each_topic,
+                                              number_of_total_words_in_each_topic, alpha, beta,
+                                              vocabulary_size_times_beta, log_gamma_table, word_topic_offsets,
+                                              word_topics, word_topic_counts, word_counts, alias_probabilities,
+                                              alias_indices, random_numbers):
+    """
+    Sample new topics for the given documents with Metropolis-Hastings steps.
+
+    Each step proposes a topic in constant time, alternating between
+    two proposals in the style of LightLDA, and accepts it with the
+    Metropolis-Hastings probability, which needs the weight of only the
+    proposed topic. The cost for a document is therefore proportional
+    to the number of steps times its distinct words, whatever the
+    number of topics.
+
+    - The word proposal picks a token of the document at random and
+      draws a topic in proportion to the count of its word in each
+      topic plus beta, using the stale alias tables made by
+      `build_word_proposal_tables` at the start of the sweep.
+    - The document proposal draws a topic in proportion to the number
+      of other documents in each topic plus alpha, by taking the
+      current topic of another document chosen at random.
+
+    Parameters
+    ----------
+    document_indices : np.ndarray[int]
+        The indices of the documents to sample, in order.
+    word_ids, document_offsets, unique_word_ids, unique_word_offsets, unique_word_counts
+        The flat arrays of the corpus, as for `sample_documents_in_single_iteration`.
+    document_topic_assignments : np.ndarray[int]
+        The current topic of each document, updated in place.
+    number_of_documents_in_each_topic : np.ndarray[int]
+        The number of documents in each topic, updated in place.
+    number_of_each_word_in_each_topic : np.ndarray[int, int]
+        The count of each word within each topic, updated in place.
+    number_of_total_words_in_each_topic : np.ndarray[int]
+        The number of words within each topic, updated in place.
+    alpha : float
+        The hyper-parameter alpha.
+    beta : float
+        The hyper-parameter beta.
+    vocabulary_size_times_beta : float
+        The size of the vocabulary multiplied by beta.
+    log_gamma_table : np.ndarray[float]
+        The table made by `compute_log_gamma_table` for beta.
+    word_topic_offsets, word_topics, word_topic_counts, word_counts, alias_probabilities, alias_indices
+        The stale proposal tables made by `build_word_proposal_tables`.
+    random_numbers : np.ndarray[float, float, float]
+        Four random numbers in [0, 1) for each step of each document
+        to sample, with shape (documents, steps, 4).
+    """
+    number_of_documents = document_topic_assignments.shape[0]
+    number_of_topics = number_of_documents_in_each_topic.shape[0]
+    uniform_document_proposal_probability = (number_of_topics * alpha /
+                                             (number_of_documents - 1 + number_of_topics * alpha))
+
+    for position in range(document_indices.shape[0]):
+        document_index = document_indices[position]
+        start = document_offsets[document_index]
+        end = document_offsets[document_index + 1]
+        document_unique_word_ids = unique_word_ids[unique_word_offsets[document_index]:
+                                                   unique_word_offsets[document_index + 1]]
+        document_unique_word_counts = unique_word_counts[unique_word_offsets[document_index]:
+                                                         unique_word_offsets[document_index + 1]]
+
+        current_topic_index = document_topic_assignments[document_index]
+        number_of_documents_in_each_topic[current_topic_index] -= 1
+        number_of_total_words_in_each_topic[current_topic_index] -= end - start
+        for unique_index in range(document_unique_word_ids.shape[0]):
+            number_of_each_word_in_each_topic[current_topic_index, document_unique_word_ids[unique_index]] -= \
+                document_unique_word_counts[unique_index]
+
+        current_log_weight = _compute_log_topic_weight(
+            current_topic_index, document_unique_word_ids, document_unique_word_counts, end - start,
+            number_of_documents_in_each_topic, number_of_each_word_in_each_topic,
+            number_of_total_words_in_each_topic, alpha, beta, vocabulary_size_times_beta, log_gamma_table)
+
+        for step in range(random_numbers.shape[1]):
+            step_random_numbers = random_numbers[position, step]
+            use_word_proposal = step % 2 == 0 and end > start
+
+            if use_word_proposal:
+                word_id = word_ids[min(start + int(step_random_numbers[0] * (end - start)), end - 1)]
+                word_start = word_topic_offsets[word_id]
+                word_end = word_topic_offsets[word_id + 1]
+                if step_random_numbers[1] * (word_counts[word_id] + number_of_topics * beta) < word_counts[word_id]:
+                    proposed_topic_index = word_topics[word_start + sample_from_alias_table(
+                        alias_probabilities[word_start:word_end], alias_indices[word_start:word_end],
+                        step_random_numbers[2])]
+                else:
+                    proposed_topic_index = min(int(step_random_numbers[2] * number_of_topics), number_of_topics - 1)
+            elif step_random_numbers[1] < uniform_document_proposal_probability:
+                proposed_topic_index = min(int(step_random_numbers[2] * number_of_topics), number_of_topics - 1)
+            else:
+                other_document_index = min(int(step_random_numbers[2] * (number_of_documents - 1)),
+                                           number_of_documents - 2)
+                if other_document_index >= document_index:
+                    other_document_index += 1
+                proposed_topic_index = document_topic_assignments[other_document_index]
+
+            if proposed_topic_index == current_topic_index:
+                continue
+
+            proposed_log_weight = _compute_log_topic_weight(
+                proposed_topic_index, document_unique_word_ids, document_unique_word_counts, end - start,
+                number_of_documents_in_each_topic, number_of_each_word_in_each_topic,
+                number_of_total_words_in_each_topic, alpha, beta, vocabulary_size_times_beta, log_gamma_table)
+
+            log_acceptance_ratio = proposed_log_weight - current_log_weight
+            if use_word_proposal:
+                log_acceptance_ratio += (
+                    math.log(_get_word_topic_count(word_topics, word_topic_counts, word_start, word_end,
+                                                   current_topic_index) + beta) -
+                    math.log(_get_word_topic_count(word_topics, word_topic_counts, word_start, word_end,
+                                                   proposed_topic_index) + beta))
+            else:
+                log_acceptance_ratio += (math.log(number_of_documents_in_each_topic[current_topic_index] + alpha) -
+                                         math.log(number_of_documents_in_each_topic[proposed_topic_index] + alpha))
+
+            if log_acceptance_ratio >= 0.0 or step_random_numbers[3] < math.exp(log_acceptance_ratio):
+                current_topic_index = proposed_topic_index
+                current_log_weight = proposed_log_weight
+
+        number_of_documents_in_each_topic[current_topic_index] += 1
+        number_of_total_words_in_each_topic[current_topic_index] += end - start
+        for unique_index in range(document_unique_word_ids.shape[0]):
+            number_of_each_word_in_each_topic[current_topic_index, document_unique_word_ids[unique_index]] += \
+                document_unique_word_counts[unique_index]
+        document_topic_assignments[document_index] = current_topic_index
+
+
+@njit
+def _get_word_topic_count(word_topics, word_topic_counts, word_start, word_end, topic_index):
+    """Look up the count of a word in a topic within the sorted topics of the word."""
+    position = word_start + np.searchsorted(word_topics[word_start:word_end], topic_index)
+    if position < word_end and word_topics[position] == topic_index:
+        return word_topic_counts[position]
+    return 0.0
+
+
+def count_words_in_documents(word_ids, document_offsets, vocabulary_size):
+    """
+    Count the words within each document of a flat corpus.
+
+    The relative occurrences are stored as unsigned 16-bit integers
+    when no document is longer than 65,535 words, so that no count can
+    overflow, and as unsigned 32-bit integers otherwise.
+
+    Parameters
+    ----------
+    word_ids : np.ndarray[int]
+        The word ids of every document, concatenated.
+    document_offsets : np.ndarray[int]
+        The offsets of each document within `word_ids`.
+    vocabulary_size : int
+        The size of the vocabulary.
+
+    Returns
+    -------
+    occurrence_indices : np.ndarray[int]
+        The relative occurrence of each word within its document.
+    unique_word_ids : np.ndarray[int]
+        The distinct word ids of each document, in order of first
+        occurrence, concatenated.
+    unique_word_offsets : np.ndarray[int]
+        The offsets of each document within `unique_word_ids`.
+    unique_word_counts : np.ndarray[int]
+        The count of each distinct word within its document.
+    """
+    document_offsets = np.asarray(document_offsets)
+    maximum_document_length = np.diff(document_offsets).max() if len(document_offsets) > 1 else 0
+    occurrence_dtype = np.uint16 if maximum_document_length <= np.iinfo(np.uint16).max else np.uint32
+    occurrence_indices = np.empty(len(word_ids), dtype=occurrence_dtype)
+    return (occurrence_indices,) + _count_words_in_documents(word_ids, document_offsets, vocabulary_size,
+                                                             occurrence_indices)
+
+
+@njit
+def _count_words_in_documents(word_ids, document_offsets, vocabulary_size, occurrence_indices):
+    """Count the words within each document, filling in `occurrence_indices` and returning the other arrays."""
+    number_of_documents = document_offsets.shape[0] - 1
+    number_of_tokens = word_ids.shape[0]
+
+    unique_word_ids = np.empty(number_of_tokens, dtype=np.int32)
+    unique_word_offsets = np.zeros(number_of_documents + 1, dtype=np.int64)
+    unique_word_counts = np.empty(number_of_tokens, dtype=np.int32)
+    counts = np.zeros(vocabulary_size, dtype=np.int32)
+
+    number_of_unique_words = 0
+    for document_index in range(number_of_documents):
+        first_unique_word = number_of_unique_words
+        for token_index in range(document_offsets[document_index], document_offsets[document_index + 1]):
+            word_id = word_ids[token_index]
+            counts[word_id] += 1
+            occurrence_indices[token_index] = counts[word_id]
+            if counts[word_id] == 1:
+                unique_word_ids[number_of_unique_words] = word_id
+                number_of_unique_words += 1
+
+        for unique_index in range(first_unique_word, number_of_unique_words):
+            word_id = unique_word_ids[unique_index]
+            unique_word_counts[unique_index] = counts[word_id]
+            counts[word_id] = 0
+        unique_word_offsets[document_index + 1] = number_of_unique_words
+
+    return (unique_word_ids[:number_of_unique_words].copy(), unique_word_offsets,
+            unique_word_counts[:number_of_unique_words].copy())
+
+
+@njit
+def compute_log_likelihood(number_of_documents_in_each_topic, number_of_each_word_in_each_topic,
+                           number_of_total_words_in_each_topic, alpha, beta):
+    """
+    Compute the joint log-likelihood of the words and topic assignments.
+
+    Parameters
+    ----------
+    number_of_documents_in_each_topic : np.ndarray[int]
+        The number of documents in each topic.
+    number_of_each_word_in_each_topic : np.ndarray[int, int]
+        The count of each word within each topic.
+    number_of_total_words_in_each_topic : np.ndarray[int]
+        The number of words within each topic.
+    alpha : float
+        The hyper-parameter alpha.
+    beta : float
+        The hyper-parameter beta.
+
+    Returns
+    -------
+    log_likelihood : float
+        The log of p(w, z | alpha, beta), with the topic proportions
+        and topic-word distributions integrated out.
+
+    Notes
+    -----
+    - Words with a count of zero contribute nothing, so only the
+      non-zero counts are visited.
+    """
+    number_of_topics, vocabulary_size = number_of_each_word_in_each_topic.shape
+    number_of_documents = 0
+    log_likelihood = 0.0
+    log_gamma_beta = math.lgamma(beta)
+    log_gamma_alpha = math.lgamma(alpha)
+
+    for topic_index in range(number_of_topics):
+        number_of_documents += number_of_documents_in_each_topic[topic_index]
+        log_likelihood += math.lgamma(number_of_documents_in_each_topic[topic_index] + alpha) - log_gamma_alpha
+        log_likelihood += (math.lgamma(vocabulary_size * beta) -
+                           math.lgamma(number_of_total_words_in_each_topic[topic_index] + vocabulary_size * beta))
+
+        for word_index in range(vocabulary_size):
+            count = number_of_each_word_in_each_topic[topic_index, word_index]
+            if count > 0:
+                log_likelihood += math.lgamma(count + beta) - log_gamma_beta
+
+    log_likelihood += (math.lgamma(number_of_topics * alpha) -
+                       math.lgamma(number_of_documents + number_of_topics * alpha))
+    return log_likelihood
+
+
+@njit
+def add_documents_to_topics(document_offsets, unique_word_ids, unique_word_offsets, unique_word_counts,
+                            document_topic_assignments, number_of_each_word_in_each_topic,
+                            number_of_total_words_in_each_topic):
+    """
+    Add the words of every document to the counts of its assigned topic.
+
+    Parameters
+    ----------
+    document_offsets : np.ndarray[int]
+        The offsets of each document within the flat word array.
+    unique_word_ids : np.ndarray[int]
+        The distinct word ids of every document, concatenated.
+    unique_word_offsets : np.ndarray[int]
+        The offsets of each document within `unique_word_ids`.
+    unique_word_counts : np.ndarray[int]
+        The count of each distinct word within its document.
+    document_topic_assignments : np.ndarray[int]
+        The topic of each document.
+    number_of_each_word_in_each_topic : np.ndarray[int, int]
+        The count of each word within each topic, updated in place.
+    number_of_total_words_in_each_topic : np.ndarray[int]
+        The number of words within each topic, updated in place.
+    """
+    for document_index in range(document_topic_assignments.shape[0]):
+        topic_index = document_topic_assignments[document_index]
+        number_of_total_words_in_each_topic[topic_index] += (document_offsets[document_index + 1] -
+                                                             document_offsets[document_index])
+        for unique_index in range(unique_word_offsets[document_index], unique_word_offsets[document_index + 1]):
+            number_of_each_word_in_each_topic[topic_index, unique_word_ids[unique_index]] += \
+                unique_word_counts[unique_index]
+
+
+@njit
+def remove_documents_from_topics(document_offsets, unique_word_ids, unique_word_offsets, unique_word_counts,
+                                 document_topic_assignments, number_of_each_word_in_each_topic,
+                                 number_of_total_words_in_each_topic):
+    """
+    Remove the words of every document from the counts of its assigned topic.
+
+    The parameters are as for `add_documents_to_topics`.
+    """
+    for document_index in range(document_topic_assignments.shape[0]):
+        topic_index = document_topic_assignments[document_index]
+        number_of_total_words_in_each_topic[topic_index] -= (document_offsets[document_index + 1] -
+                                                             document_offsets[document_index])
+        for unique_index in range(unique_word_offsets[document_index], unique_word_offsets[document_index + 1]):
+            number_of_each_word_in_each_topic[topic_index, unique_word_ids[unique_index]] -= \
+                unique_word_counts[unique_index]
+
+
+@njit
+def move_documents_between_topics(document_indices, previous_topic_indices, new_topic_indices, document_offsets,
+                                  unique_word_ids, unique_word_offsets, unique_word_counts,
+                                  number_of_documents_in_each_topic, number_of_each_word_in_each_topic,
+                                  number_of_total_words_in_each_topic):
+    """
+    Move documents from their previous topics to their new ones in the counts.
+
+    Parameters
+    ----------
+    document_indices : np.ndarray[int]
+        The indices of the documents to move.
+    previous_topic_indices : np.ndarray[int]
+        The topic in which each document is counted, or a negative
+        value if it is not yet counted.
+    new_topic_indices : np.ndarray[int]
+        The topic to which each document is moved.
+    document_offsets : np.ndarray[int]
+        The offsets of each document within the flat word array.
+    unique_word_ids : np.ndarray[int]
+        The distinct word ids of every document, concatenated.
+    unique_word_offsets : np.ndarray[int]
+        The offsets of each document within `unique_word_ids`.
+    unique_word_counts : np.ndarray[int]
+        The count of each distinct word within its document.
+    number_of_documents_in_each_topic : np.ndarray[int]
+        The number of documents in each topic, updated in place.
+    number_of_each_word_in_each_topic : np.ndarray[int, int]
+        The count of each word within each topic, updated in place.
+    number_of_total_words_in_each_topic : np.ndarray[int]
+        The number of words within each topic, updated in place.
+    """
+    for position in range(document_indices.shape[0]):
+        document_index = document_indices[position]
+        previous_topic_index = previous_topic_indices[position]
+        new_topic_index = new_topic_indices[position]
+        document_length = document_offsets[document_index + 1] - document_offsets[document_index]
+        unique_start = unique_word_offsets[document_index]
+        unique_end = unique_word_offsets[document_index + 1]
+
+        if previous_topic_index >= 0:
+            number_of_documents_in_each_topic[previous_topic_index] -= 1
+            number_of_total_words_in_each_topic[previous_topic_index] -= document_length
+            for unique_index in range(unique_start, unique_end):
+                number_of_each_word_in_each_topic[previous_topic_index, unique_word_ids[unique_index]] -= \
+                    unique_word_counts[unique_index]
+
+        number_of_documents_in_each_topic[new_topic_index] += 1
+        number_of_total_words_in_each_topic[new_topic_index] += document_length
+        for unique_index in range(unique_start, unique_end):
+            number_of_each_word_in_each_topic[new_topic_index, unique_word_ids[unique_index]] += \
+                unique_word_counts[unique_index]
+
+
+@njit
+def score_documents(word_ids, document_offsets, log_topic_word_probabilities, log_topic_probabilities):
+    """
+    Score documents against each topic using frozen log probabilities.
+
+    Parameters
+    ----------
+    word_ids : np.ndarray[int]
+        The word ids of every document, concatenated.
+    document_offsets : np.ndarray[int]
+        The offsets of each document within `word_ids`.
+    log_topic_word_probabilities : np.ndarray[float, float]
+        The log probability of each word in each topic, with one row
+        per word so that the row for a word is contiguous.
+    log_topic_probabilities : np.ndarray[float]
+        The log prior probability of each topic.
+
+    Returns
+    -------
+    scores : np.ndarray[float, float]
+        The unnormalised log probability of each topic for each document.
+    """
+    number_of_documents = document_offsets.shape[0] - 1
+    number_of_topics = log_topic_probabilities.shape[0]
+    scores = np.empty((number_of_documents, number_of_topics))
+
+    for document_index in range(number_of_documents):
+        for topic_index in range(number_of_topics):
+            scores[document_index, topic_index] = log_topic_probabilities[topic_index]
+        for token_index in range(document_offsets[document_index], document_offsets[document_index + 1]):
+            word_id = word_ids[token_index]
+            for topic_index in range(number_of_topics):
+                scores[document_index, topic_index] += log_topic_word_probabilities[word_id, topic_index]
+
+    return scores
+
+
+@njit
+def sample_words_without_replacement(cumulative_word_weights, topic_indices, document_offsets, random_numbers, word_ids,
+                                     first_document_index):
+    """
+    Sample the words of documents so that no word occurs twice in a document.
+
+    Each word is drawn in proportion to its weight among the words not
+    yet in the document. Words are drawn with replacement and redrawn
+    if already present, which is exact and fast while the words chosen
+    hold little of the weight of the topic. Once they hold half of it,
+    the remaining words are searched directly instead.
+
+    Parameters
+    ----------
+    cumulative_word_weights : np.ndarray[float, float]
+        The cumulative weights of the words within each topic.
+    topic_indices : np.ndarray[int]
+        The topic of each document.
+    document_offsets : np.ndarray[int]
+        The offsets of each document within the words to sample. No
+        document may be longer than the number of words with positive
+        weight in its topic.
+    random_numbers : np.ndarray[float]
+        Random numbers in [0, 1), each used for at most one draw.
+    word_ids : np.ndarray[int]
+        The array in which to write the word ids of every document,
+        concatenated.
+    first_document_index : int
+        The index of the first document to sample.
+
+    Returns
+    -------
+    end_document_index : int
+        The index of the first document that was not sampled. The
+        number of draws depends on the redraws, so this is less than
+        the number of documents if the random numbers ran out, in
+        which case sampling may be resumed from it with new ones.
+    """
+    vocabulary_size = cumulative_word_weights.shape[1]
+    is_in_document = np.zeros(vocabulary_size, dtype=np.bool_)
+    number_of_random_numbers = random_numbers.shape[0]
+    random_number_index = 0
+
+    for document_index in range(first_document_index, topic_indices.shape[0]):
+        cumulative_weights = cumulative_word_weights[topic_indices[document_index]]
+        total_weight = cumulative_weights[-1]
+        weight_in_document = 0.0
+        document_start = document_offsets[document_index]
+
+        for token_index in range(document_start, document_offsets[document_index + 1]):
+            if weight_in_document < 0.5 * total_weight:
+                word_id = -1
+                while word_id == -1 or is_in_document[word_id]:
+                    if random_number_index == number_of_random_numbers:
+                        for previous_token_index in range(document_start, token_index):
+                            is_in_document[word_ids[previous_token_index]] = False
+                        return document_index
+                    word_id = sample_from_cumulative_weights(cumulative_weights, random_numbers[random_number_index])
+                    random_number_index += 1
+            else:
+                if random_number_index == number_of_random_numbers:
+                    for previous_token_index in range(document_start, token_index):
+                        is_in_document[word_ids[previous_token_index]] = False
+                    return document_index
+                remaining_weight = random_numbers[random_number_index] * (total_weight - weight_in_document)
+                random_number_index += 1
+                word_id = -1
+                for candidate_word_id in range(vocabulary_size):
+                    if not is_in_document[candidate_word_id]:
+                        remaining_weight -= _get_weight(cumulative_weights, candidate_word_id)
+                        word_id = candidate_word_id
+                        if remaining_weight < 0.0:
+                            break
+                # Rounding may leave a little weight, in which case the last candidate is kept,
+                # unless it has no weight of its own.
+                while _get_weight(cumulative_weights, word_id) == 0.0 or is_in_document[word_id]:
+                    word_id -= 1
+
+            word_ids[token_index] = word_id
+            is_in_document[word_id] = True
+            weight_in_document += _get_weight(cumulative_weights, word_id)
+
+        for token_index in range(document_start, document_offsets[document_index + 1]):
+            is_in_document[word_ids[token_index]] = False
+
+    return topic_indices.shape[0]
+
+
+@njit
+def _get_weight(cumulative_weights, index):
+    """Get a single weight from cumulative weights."""
+    if index == 0:
+        return cumulative_weights[0]
+    return cumulative_weights[index] - cumulative_weights[index - 1]
+
+
+@njit
+def encode_documents_as_text(word_ids, document_offsets, word_bytes, word_offsets):
+    """
+    Encode documents as UTF-8 text, with one document per line.
+
+    Parameters
+    ----------
+    word_ids : np.ndarray[int]
+        The word ids of every document, concatenated.
+    document_offsets : np.ndarray[int]
+        The offsets of each document within `word_ids`.
+    word_bytes : np.ndarray[np.uint8]
+        The UTF-8 encoded words of the vocabulary, concatenated.
+    word_offsets : np.ndarray[int]
+        The offsets of each word within `word_bytes`.
+
+    Returns
+    -------
+    text : np.ndarray[np.uint8]
+        The encoded text, in which the words of each document are
+        separated by spaces and each document ends with a newline.
+    """
+    number_of_documents = document_offsets.shape[0] - 1
+    text_length = number_of_documents
+    for token_index in range(document_offsets[0], document_offsets[-1]):
+        word_id = word_ids[token_index]
+        text_length += word_offsets[word_id + 1] - word_offsets[word_id] + 1
+
+    text = np.empty(text_length, dtype=np.uint8)
+    position = 0
+    for document_index in range(number_of_documents):
+        for token_index in range(document_offsets[document_index], document_offsets[document_index + 1]):
+            if token_index > document_offsets[document_index]:
+                text[position] = 32
+                position += 1
+            word_id = word_ids[token_index]
+            for byte_index in range(word_offsets[word_id], word_offsets[word_id + 1]):
+                text[position] = word_bytes[byte_index]
+                position += 1
+        text[position] = 10
+        position += 1
+
+    return text[:position]
+
+
+@njit
+def build_word_table(word_bytes, word_offsets):
+    """
+    Build an open-addressing hash table for looking up words in packed arrays.
+
+    Parameters
+    ----------
+    word_bytes : np.ndarray[np.uint8]
+        The UTF-8 encoded words of the vocabulary, concatenated.
+    word_offsets : np.ndarray[int]
+        The offsets of each word within `word_bytes`.
+
+    Returns
+    -------
+    word_table : np.ndarray[np.int32]
+        The id of the word in each slot, or -1 for an empty slot. The
+        number of slots is a power of two at least twice the number of
+        words, and each word is placed at the first free slot from its
+        FNV-1a hash. If a word is repeated, its last id is kept.
+    """
+    number_of_words = word_offsets.shape[0] - 1
+    number_of_slots = 1
+    while number_of_slots < 2 * number_of_words:
+        number_of_slots *= 2
+
+    word_table = np.full(number_of_slots, -1, dtype=np.int32)
+    for word_id in range(number_of_words):
+        slot = _find_word_slot(word_bytes, word_offsets, word_table, word_bytes, word_offsets[word_id],
+                               word_offsets[word_id + 1])
+        word_table[slot] = word_id
+    return word_table
+
+
+@njit
+def look_up_words(word_bytes, word_offsets, word_table, query_bytes, query_offsets, default):
+    """
+    Look up the ids of many words in a table made by `build_word_table`.
+
+    Parameters
+    ----------
+    word_bytes : np.ndarray[np.uint8]
+        The UTF-8 encoded words of the vocabulary, concatenated.
+    word_offsets : np.ndarray[int]
+        The offsets of each word within `word_bytes`.
+    word_table : np.ndarray[np.int32]
+        The hash table of the vocabulary.
+    query_bytes : np.ndarray[np.uint8]
+        The UTF-8 encoded words to look up, concatenated.
+    query_offsets : np.ndarray[int]
+        The offsets of each word within `query_bytes`.
+    default : int
+        The id given to words missing from the vocabulary.
+
+    Returns
+    -------
+    word_ids : np.ndarray[np.int32]
+        The id of each word looked up.
+    """
+    number_of_queries = query_offsets.shape[0] - 1
+    word_ids = np.empty(number_of_queries, dtype=np.int32)
+    for query_index in range(number_of_queries):
+        slot = _find_word_slot(word_bytes, word_offsets, word_table, query_bytes, query_offsets[query_index],
+                               query_offsets[query_index + 1])
+        word_id = word_table[slot]
+        word_ids[query_index] = word_id if word_id >= 0 else default
+    return word_ids
+
+
+@njit
+def _find_word_slot(word_bytes, word_offsets, word_table, query_bytes, query_start, query_end):
+    """Find the slot holding a word, or the empty slot at which its probe sequence ends."""
+    slot_mask = np.uint64(word_table.shape[0] - 1)
+    word_hash = np.uint64(14695981039346656037)
+    for byte_index in range(query_start, query_end):
+        word_hash = (word_hash ^ np.uint64(query_bytes[byte_index])) * np.uint64(1099511628211)
+
+    slot = word_hash & slot_mask
+    while True:
+        word_id = word_table[slot]
+        if word_id < 0:
+            return slot
+        word_start = word_offsets[word_id]
+        word_end = word_offsets[word_id + 1]
+        if word_end - word_start == query_end - query_start:
+            is_match = True
+            for position in range(word_end - word_start):
+                if word_bytes[word_start + position] != query_bytes[query_start + position]:
+                    is_match = False
+                    break
+            if is_match:
+                return slot
+        slot = (slot + np.uint64(1)) & slot_mask
@@ -0,0 +1,213 @@
+"""
+Contains the TopicModel class.
+"""
+from functools import partial
+
+import numpy as np
+
+from .corpus import _get_word_id_arrays
+from .kernels import build_word_table, score_documents
+from .storage import is_array_file, read_array_file, write_array_file
+from .vocabulary import PackedVocabulary
+
+MODEL_MAGIC = b"PDMMMODL"
+MODEL_VERSION = 1
+
+
+class TopicModel:
+    """
+    A trained model with frozen topic probabilities, for scoring new documents.
+
+    New documents are folded in against the frozen counts: the score of
+    a topic for a document is the log prior of the topic plus the sum of
+    the log probability of each of its words within the topic.
+
+    Attributes
+    ----------
+    vocabulary : pdmm.vocabulary.Vocabulary or pdmm.vocabulary.PackedVocabulary
+        The vocabulary of the training corpus, which is never grown.
+        A loaded model has a packed vocabulary.
+    log_topic_probabilities : np.ndarray[float]
+        The log prior probability of each topic.
+    log_topic_word_probabilities : np.ndarray[float, float]
+        The log probability of each word within each topic, with one
+        row per word. The final row holds the probability of a word
+        missing from the vocabulary, which has no counts in any topic.
+    alpha : float
+        The hyper-parameter alpha.
+    beta : float
+        The hyper-parameter beta.
+    """
+    def __init__(self, vocabulary, log_topic_probabilities, log_topic_word_probabilities, alpha, beta):
+        self.vocab = vocabulary
+        self.log_topic_probabilities = log_topic_probabilities
+        self.log_topic_word_probabilities = log_topic_word_probabilities
+        self.alpha = alpha
+        self.beta = beta
+
+    @property
+    def number_of_topics(self):
+        """Return the number of topics."""
+        return len(self.log_topic_probabilities)
+
+    @classmethod
+    def from_counts(cls, vocabulary, number_of_documents_in_each_topic, number_of_each_word_in_each_topic, alpha,
+                    beta):
+        """
+        Create a TopicModel from the counts of a trained sampler.
+
+        Parameters
+        ----------
+        vocabulary : pdmm.vocabulary.Vocabulary
+            The vocabulary of the training corpus.
+        number_of_documents_in_each_topic : np.ndarray[int]
+            The number of documents in each topic.
+        number_of_each_word_in_each_topic : np.ndarray[int, int]
+            The count of each word within each topic.
+        alpha : float
+            The hyper-parameter alpha.
+        beta : float
+            The hyper-parameter beta.
+        """
+        number_of_topics, vocabulary_size = number_of_each_word_in_each_topic.shape
+        number_of_total_words_in_each_topic = number_of_each_word_in_each_topic.sum(axis=1)
+        log_denominators = np.log(number_of_total_words_in_each_topic + vocabulary_size * beta)
+
+        # The probabilities are built in place as 32-bit floats, as saved, without a temporary of the same size.
+        log_topic_word_probabilities = np.empty((vocabulary_size + 1, number_of_topics), dtype=np.float32)
+        np.add(number_of_each_word_in_each_topic.T, beta, out=log_topic_word_probabilities[:-1], dtype=np.float32,
+               casting="unsafe")
+        np.log(log_topic_word_probabilities[:-1], out=log_topic_word_probabilities[:-1])
+        log_topic_word_probabilities[-1] = np.log(beta)
+        log_topic_word_probabilities -= log_denominators
+
+        topic_weights = number_of_documents_in_each_topic + alpha
+        log_topic_probabilities = np.log(topic_weights / topic_weights.sum())
+
+        return cls(vocabulary, log_topic_probabilities, log_topic_word_probabilities, alpha, beta)
+
+    def save(self, file_path):
+        """
+        Save the model to a binary file for serving.
+
+        The file is self-contained, holding the vocabulary with a hash
+        table for looking up its words, the log probabilities as 32-bit
+        floats and the hyper-parameters, so that `load` needs neither
+        the corpus nor the sampler.
+
+        Parameters
+        ----------
+        file_path : str
+            The location at which to save the file.
+        """
+        word_bytes, word_offsets = self.vocab.to_packed_arrays()
+        arrays = {
+            "log_topic_probabilities": self.log_topic_probabilities.astype(np.float32, copy=False),
+            "log_topic_word_probabilities": self.log_topic_word_probabilities.astype(np.float32, copy=False),
+            "vocabulary_bytes": word_bytes,
+            "vocabulary_offsets": word_offsets,
+        }
+        if not self.vocab.is_hashed:
+            arrays["vocabulary_table"] = build_word_table(word_bytes, word_offsets)
+        metadata = {"alpha": self.alpha, "beta": self.beta,
+                    "vocabulary_number_of_buckets": self.vocab.number_of_buckets}
+        write_array_file(file_path, MODEL_MAGIC, MODEL_VERSION, arrays, metadata=metadata)
+
+    @classmethod
+    def load(cls, file_path, mmap=True):
+        """
+        Load a model from a binary file made by `save`.
+
+        Parameters
+        ----------
+        file_path : str
+            The location of the file.
+
+        Optional Parameters
+        -------------------
+        mmap : bool, defaults to True
+            Whether to memory map the probabilities and the vocabulary
+            read-only, so that serving processes loading the same file
+            share its pages.
+        """
+        arrays, metadata = read_array_file(file_path, MODEL_MAGIC, MODEL_VERSION, mmap=mmap)
+        vocab = PackedVocabulary(arrays["vocabulary_bytes"], arrays["vocabulary_offsets"],
+                                 word_table=arrays.get("vocabulary_table"),
+                                 number_of_buckets=metadata.get("vocabulary_number_of_buckets"))
+        return cls(vocab, arrays["log_topic_probabilities"], arrays["log_topic_word_probabilities"],
+                   metadata["alpha"], metadata["beta"])
+
+    @staticmethod
+    def is_model_file(file_path):
+        """Check whether a file is a binary model file."""
+        return is_array_file(file_path, MODEL_MAGIC)
+
+    def predict(self, list_of_word_lists):
+        """
+        Predict the most probable topic of each document.
+
+        Parameters
+        ----------
+        list_of_word_lists : iterable[list[str]]
+            The documents to score, as lists of words.
+
+        Returns
+        -------
+        topic_indices : np.ndarray[int]
+            The most probable topic of each document.
+        """
+        return self._score(list_of_word_lists).argmax(axis=1)
+
+    def predict_proba(self, list_of_word_lists):
+        """
+        Predict the probability of each topic for each document.
+
+        Parameters
+        ----------
+        list_of_word_lists : iterable[list[str]]
+            The documents to score, as lists of words.
+
+        Returns
+        -------
+        topic_probabilities : np.ndarray[float, float]
+            An array in which the (i,j)th element is the probability
+            of document i belonging to topic j.
+        """
+        return self.predict_proba_from_word_ids(*self._get_word_id_arrays(list_of_word_lists))
+
+    def predict_proba_from_word_ids(self, word_ids, document_offsets):
+        """
+        Predict the probability of each topic for documents given as word ids.
+
+        Parameters
+        ----------
+        word_ids : np.ndarray[int]
+            The word ids of every document, concatenated, which must
+            be ids of the vocabulary of the model.
+        document_offsets : np.ndarray[int]
+            The offsets of each document within `word_ids`.
+
+        Returns
+        -------
+        topic_probabilities : np.ndarray[float, float]
+            An array in which the (i,j)th element is the probability
+            of document i belonging to topic j.
+        """
+        scores = score_documents(word_ids, document_offsets, self.log_topic_word_probabilities,
+                                 self.log_topic_probabilities)
+        scores -= scores.max(axis=1, keepdims=True)
+        probabilities = np.exp(scores)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        return probabilities
+
+    def _score(self, list_of_word_lists):
+        """Get the unnormalised log probability of each topic for each document."""
+        word_ids, document_offsets = self._get_word_id_arrays(list_of_word_lists)
+        return score_documents(word_ids, document_offsets, self.log_topic_word_probabilities,
+                               self.log_topic_probabilities)
+
+    def _get_word_id_arrays(self, list_of_word_lists):
+        """Convert documents to flat word ids, mapping missing words to the final row."""
+        unknown_word_id = len(self.log_topic_word_probabilities) - 1
+        return _get_word_id_arrays(list_of_word_lists,
+                                   partial(self.vocab.existing_ids_from_words, default=unknown_word_id))
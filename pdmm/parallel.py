@@ -0,0 +1,462 @@
+"""
+Contains functions for running the sampler across a process pool.
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .corpus import Corpus
+from .kernels import move_documents_between_topics, sample_documents_in_single_iteration
+from .sampling import GibbsSamplingDMM, _get_log_gamma_table
+from .vocabulary import Vocabulary
+
+ChainResult = namedtuple("ChainResult", ["seed", "document_topic_assignments", "log_likelihood"])
+ChainResult.__doc__ = """
+The outcome of a single chain.
+
+Attributes
+----------
+seed : int
+    The seed with which the chain was initialised.
+document_topic_assignments : np.ndarray[int]
+    The topic index of each document at the end of the chain.
+log_likelihood : float
+    The joint log-likelihood at the end of the chain.
+"""
+
+CORPUS_ARRAY_NAMES = ("word_ids", "document_offsets", "occurrence_indices", "unique_word_ids", "unique_word_offsets",
+                      "unique_word_counts")
+
+_worker_state = {}
+
+
+class SharedArrays:
+    """
+    A set of arrays held in a single block of shared memory.
+
+    Worker processes attach to the block by name rather than each
+    receiving a pickled copy of the arrays. Shared memory needs Python
+    3.8 or later, so it is imported only when arrays are shared, and
+    the rest of the package can be used on earlier versions.
+
+    Attributes
+    ----------
+    arrays : dict[str, np.ndarray]
+        Views of each array within the shared memory.
+    description : dict
+        The name of the shared memory block, and the dtype, shape,
+        offset and memory order of each array within it.
+    """
+    def __init__(self, arrays):
+        from multiprocessing import shared_memory
+
+        arrays = {name: array if array.flags.f_contiguous and not array.flags.c_contiguous
+                  else np.ascontiguousarray(array) for name, array in arrays.items()}
+        offsets = np.cumsum([0] + [array.nbytes for array in arrays.values()])
+        self._shared_memory = shared_memory.SharedMemory(create=True, size=max(int(offsets[-1]), 1))
+        self.description = {"name": self._shared_memory.name, "arrays": {}}
+        self.arrays = {}
+
+        for offset, (name, array) in zip(offsets, arrays.items()):
+            order = "F" if array.flags.f_contiguous and not array.flags.c_contiguous else "C"
+            self.description["arrays"][name] = (array.dtype.str, array.shape, int(offset), order)
+            self.arrays[name] = np.ndarray(array.shape, dtype=array.dtype, buffer=self._shared_memory.buf,
+                                           offset=offset, order=order)
+            self.arrays[name][...] = array
+
+    def close(self):
+        """Release the shared memory block."""
+        self.arrays = {}
+        self._shared_memory.close()
+        self._shared_memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def attach(description, writeable=False):
+        """
+        Attach to shared arrays from within a worker process.
+
+        Parameters
+        ----------
+        description : dict
+            The `description` attribute of the shared arrays.
+
+        Optional Parameters
+        -------------------
+        writeable : bool, defaults to False
+            Whether the views of the arrays may be written to.
+
+        Returns
+        -------
+        arrays : dict[str, np.ndarray]
+            Views of each array within the shared memory.
+        shared_memory_block : multiprocessing.shared_memory.SharedMemory
+            The attached block, which must outlive the views.
+        """
+        from multiprocessing import shared_memory
+
+        shared_memory_block = shared_memory.SharedMemory(name=description["name"])
+
+        arrays = {}
+        for name, (dtype, shape, offset, order) in description["arrays"].items():
+            array = np.ndarray(shape, dtype=dtype, buffer=shared_memory_block.buf, offset=offset, order=order)
+            array.flags.writeable = writeable
+            arrays[name] = array
+
+        return arrays, shared_memory_block
+
+
+class SharedCorpus(SharedArrays):
+    """
+    A read-only copy of a corpus held in shared memory.
+    """
+    def __init__(self, corpus):
+        word_bytes, word_offsets = corpus.vocab.to_packed_arrays()
+        arrays = {name: getattr(corpus, name) for name in CORPUS_ARRAY_NAMES}
+        arrays["vocabulary_bytes"] = word_bytes
+        arrays["vocabulary_offsets"] = word_offsets
+        if corpus.vocab.is_hashed:
+            arrays["vocabulary_number_of_buckets"] = np.array([corpus.vocab.number_of_buckets], dtype=np.int64)
+        super().__init__(arrays)
+
+    @staticmethod
+    def attach(description):
+        """
+        Attach to a shared corpus from within a worker process.
+
+        Returns
+        -------
+        corpus : pdmm.corpus.Corpus
+            A corpus whose arrays are read-only views of the shared memory.
+        shared_memory_block : multiprocessing.shared_memory.SharedMemory
+            The attached block, which must outlive the corpus.
+        """
+        arrays, shared_memory_block = SharedArrays.attach(description)
+        number_of_buckets = arrays.pop("vocabulary_number_of_buckets", None)
+        vocab = Vocabulary.from_packed_arrays(arrays.pop("vocabulary_bytes"), arrays.pop("vocabulary_offsets"),
+                                              number_of_buckets=None if number_of_buckets is None
+                                              else int(number_of_buckets[0]))
+        corpus = Corpus(*(arrays[name] for name in CORPUS_ARRAY_NAMES), vocab)
+        return corpus, shared_memory_block
+
+
+def run_chains(corpus, number_of_chains, number_of_iterations, workers=None, seed=None, inference_parameters=None,
+               **model_parameters):
+    """
+    Run independent chains on the same corpus across a process pool.
+
+    Parameters
+    ----------
+    corpus : pdmm.corpus.Corpus
+        The corpus to be analysed, which is shared with the workers
+        through shared memory.
+    number_of_chains : int
+        The number of chains to run.
+    number_of_iterations : int
+        The number of iterations to run in each chain.
+
+    Optional Parameters
+    -------------------
+    workers : int, defaults to None
+        The number of worker processes. If not given, this is the
+        number of processors on the machine.
+    seed : int, defaults to None
+        The seed from which the seed of each chain is derived.
+    inference_parameters : dict, defaults to None
+        Keyword arguments passed to `GibbsSamplingDMM.inference` in
+        each chain, such as `eval_every` and `log_likelihood_tolerance`,
+        which must be picklable.
+    **model_parameters
+        Keyword arguments passed to `GibbsSamplingDMM`, such as
+        `number_of_topics`, `alpha`, `beta` and `engine`.
+
+    Returns
+    -------
+    chain_results : list[ChainResult]
+        The outcome of each chain, in order of chain.
+    """
+    seeds = [int(chain_seed) for chain_seed in np.random.SeedSequence(seed).generate_state(number_of_chains)]
+
+    with SharedCorpus(corpus) as shared_corpus:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_run_chain, shared_corpus.description, chain_seed, number_of_iterations,
+                                       model_parameters, inference_parameters or {})
+                       for chain_seed in seeds]
+            chain_results = [future.result() for future in futures]
+
+    return chain_results
+
+
+def get_best_chain(chain_results):
+    """Get the chain with the highest log-likelihood."""
+    return max(chain_results, key=lambda chain_result: chain_result.log_likelihood)
+
+
+class ApproximateDistributedSampler:
+    """
+    Approximate distributed (AD-DMM) Gibbs sampling across a process pool.
+
+    In the spirit of AD-LDA, the documents are split into one shard per
+    worker. In each iteration, every worker sweeps its shard against
+    its own copy of the topic counts as they stood at the start of the
+    iteration, after which the changes are merged. Workers do not see
+    each other's changes until the next iteration, so the chain only
+    approximates the serial sampler, but each iteration is spread
+    across all of the workers.
+
+    While the sampler is open, the topic assignments of the model are
+    a view of shared memory, while the counts remain its own, so that
+    `model.log_likelihood()` may be called between iterations. Closing
+    the sampler gives the model its own copy of the assignments again.
+
+    Attributes
+    ----------
+    model : pdmm.sampling.GibbsSamplingDMM
+        The initialised model, which is updated in place.
+    workers : int
+        The number of worker processes, and so of shards.
+    shard_offsets : np.ndarray[int]
+        The index of the first document of each shard, with one more
+        element than the number of shards. Shards hold similar numbers
+        of tokens rather than of documents.
+
+    Notes
+    -----
+    - Each worker process keeps a private copy of the counts, which it
+      brings up to date at the start of every task by moving only the
+      documents whose assignment differs from the merged one. A worker
+      sends back only the documents of its shard that changed topic,
+      which are moved in the counts of the model when every shard has
+      been swept. Apart from comparing the assignments, an iteration
+      therefore costs time proportional to the tokens of each shard
+      times the number of topics, plus the tokens of the documents
+      that changed topic, rather than to the size of the count matrix.
+      Each worker holds its own count matrix in memory.
+    - Only the compiled engine is supported, and sampling statistics
+      are not recorded.
+    - With a single worker, the chain is identical to that of the
+      serial sampler.
+    """
+    def __init__(self, model, workers):
+        if model.sampler != "gibbs":
+            raise ValueError("Approximate distributed sampling only supports the gibbs sampler.")
+        if model.engine != "numba":
+            raise ValueError("Approximate distributed sampling only supports the numba engine.")
+        if model.stats is not None:
+            raise ValueError("Approximate distributed sampling does not record sampling statistics.")
+
+        corpus = model.corpus
+        self.model = model
+        self.workers = workers
+        self.shard_offsets = np.searchsorted(corpus.document_offsets,
+                                             np.linspace(0, corpus.document_offsets[-1], workers + 1))
+        self.shard_offsets[0], self.shard_offsets[-1] = 0, corpus.number_of_documents
+
+        model_arrays = {
+            "document_topic_assignments": model.document_topic_assignments,
+            "random_numbers": np.zeros(corpus.number_of_documents),
+        }
+        word_counts = model.number_of_each_word_in_each_topic
+        model_parameters = {
+            "alpha": model.alpha,
+            "beta": model.beta,
+            "vocabulary_size_times_beta": corpus.vocab.size * model.beta,
+            "log_space": model.weight_space == "log",
+            "document_count_dtype": model.number_of_documents_in_each_topic.dtype.str,
+            "word_count_dtype": word_counts.dtype.str,
+            "word_count_shape": word_counts.shape,
+            "word_count_order": "F" if word_counts.flags.f_contiguous and not word_counts.flags.c_contiguous else "C",
+            "total_word_count_dtype": model.number_of_total_words_in_each_topic.dtype.str,
+        }
+
+        self._shared_corpus = SharedCorpus(corpus)
+        self._shared_model = SharedArrays(model_arrays)
+        model.document_topic_assignments = self._shared_model.arrays["document_topic_assignments"]
+
+        self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_initialise_distributed_worker,
+                                             initargs=(self._shared_corpus.description,
+                                                       self._shared_model.description, model_parameters))
+
+    def inference(self, number_of_iterations, checkpoint_path=None, checkpoint_every=None, callback=None,
+                  eval_every=1, log_likelihood_tolerance=None, topic_change_tolerance=None):
+        """
+        Run inference for a number of iterations.
+
+        Parameters
+        ----------
+        number_of_iterations : int
+            The maximum number of iterations to run.
+
+        Optional Parameters
+        -------------------
+        checkpoint_path : str, defaults to None
+            The location at which to save checkpoints.
+        checkpoint_every : int, defaults to None
+            The number of iterations between checkpoints. If not given,
+            a checkpoint is only saved after the final iteration.
+        callback : callable, defaults to None
+            A function called as `callback(model, progress)` whenever
+            the progress is evaluated. Inference stops early if it
+            returns True.
+        eval_every : int, defaults to 1
+            The number of iterations between evaluations of progress.
+        log_likelihood_tolerance : float, defaults to None
+            Stop early once the relative change in log-likelihood
+            between evaluations is below this value.
+        topic_change_tolerance : float, defaults to None
+            Stop early once the fraction of documents changing topic
+            in an iteration is below this value.
+        """
+        self.model._run_iterations(self._sample_in_single_iteration, number_of_iterations,
+                                   checkpoint_path=checkpoint_path, checkpoint_every=checkpoint_every,
+                                   callback=callback, eval_every=eval_every,
+                                   log_likelihood_tolerance=log_likelihood_tolerance,
+                                   topic_change_tolerance=topic_change_tolerance)
+
+    def _sample_in_single_iteration(self):
+        """Sweep every shard across the workers, and then move the documents that changed topic."""
+        model = self.model
+        corpus = model.corpus
+        shared = self._shared_model.arrays
+        shared["random_numbers"][...] = model.random_state.random(corpus.number_of_documents)
+
+        futures = [self._executor.submit(_sample_shard_in_single_iteration, self.shard_offsets[shard_index],
+                                         self.shard_offsets[shard_index + 1])
+                   for shard_index in range(self.workers)]
+        # Workers compare their copies with the merged assignments, so none may change until every shard is swept.
+        shard_changes = [future.result() for future in futures]
+
+        document_topic_assignments = shared["document_topic_assignments"]
+        for changed_document_indices, new_topic_indices, topic_weights in shard_changes:
+            move_documents_between_topics(changed_document_indices,
+                                          document_topic_assignments[changed_document_indices],
+                                          new_topic_indices, corpus.document_offsets, corpus.unique_word_ids,
+                                          corpus.unique_word_offsets, corpus.unique_word_counts,
+                                          model.number_of_documents_in_each_topic,
+                                          model.number_of_each_word_in_each_topic,
+                                          model.number_of_total_words_in_each_topic)
+            document_topic_assignments[changed_document_indices] = new_topic_indices
+        model.topic_weights = topic_weights
+
+    def close(self):
+        """Stop the workers and give the model its own copy of the assignments."""
+        self._executor.shutdown()
+        self.model.document_topic_assignments = self._shared_model.arrays["document_topic_assignments"].copy()
+        self._shared_model.close()
+        self._shared_corpus.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def run_approximate_distributed_inference(model, number_of_iterations, workers, **inference_parameters):
+    """
+    Run approximate distributed inference on a model in place.
+
+    Parameters
+    ----------
+    model : pdmm.sampling.GibbsSamplingDMM
+        An initialised model, which is updated in place.
+    number_of_iterations : int
+        The number of iterations to run.
+    workers : int
+        The number of worker processes, and so of shards.
+
+    Optional Parameters
+    -------------------
+    **inference_parameters
+        Keyword arguments passed to `ApproximateDistributedSampler.inference`,
+        such as `checkpoint_path` and `log_likelihood_tolerance`.
+    """
+    with ApproximateDistributedSampler(model, workers) as sampler:
+        sampler.inference(number_of_iterations, **inference_parameters)
+
+
+def _run_chain(shared_corpus_description, seed, number_of_iterations, model_parameters, inference_parameters):
+    """Run a single chain within a worker process."""
+    corpus, shared_memory_block = SharedCorpus.attach(shared_corpus_description)
+
+    model = GibbsSamplingDMM(corpus, **model_parameters)
+    model.randomly_initialise_topic_assignment(seed=seed)
+    model.inference(number_of_iterations, **inference_parameters)
+    chain_result = ChainResult(seed, model.document_topic_assignments, model.log_likelihood())
+
+    # The views of the shared memory must be released before it can be closed.
+    del corpus, model
+    shared_memory_block.close()
+    return chain_result
+
+
+def _initialise_distributed_worker(shared_corpus_description, shared_model_description, model_parameters):
+    """
+    Attach a worker process to the shared corpus and model for distributed inference.
+
+    The worker starts with empty counts, in which no document is counted,
+    so that its first task counts every document.
+    """
+    corpus, corpus_block = SharedCorpus.attach(shared_corpus_description)
+    model_arrays, model_block = SharedArrays.attach(shared_model_description)
+    number_of_topics = model_parameters["word_count_shape"][0]
+    _worker_state.update(
+        corpus=corpus, model_arrays=model_arrays, model_parameters=model_parameters,
+        shared_memory_blocks=(corpus_block, model_block),
+        document_topic_assignments=np.full(corpus.number_of_documents, -1,
+                                           dtype=model_arrays["document_topic_assignments"].dtype),
+        number_of_documents_in_each_topic=np.zeros(number_of_topics, dtype=model_parameters["document_count_dtype"]),
+        number_of_each_word_in_each_topic=np.zeros(model_parameters["word_count_shape"],
+                                                   dtype=model_parameters["word_count_dtype"],
+                                                   order=model_parameters["word_count_order"]),
+        number_of_total_words_in_each_topic=np.zeros(number_of_topics,
+                                                     dtype=model_parameters["total_word_count_dtype"]),
+        topic_weights=np.zeros(number_of_topics))
+
+
+def _sample_shard_in_single_iteration(first_document_index, end_document_index):
+    """
+    Sweep a shard of documents against the counts of the merged assignments from the start of the iteration.
+
+    Returns
+    -------
+    changed_document_indices : np.ndarray[int]
+        The documents of the shard that changed topic.
+    new_topic_indices : np.ndarray[int]
+        The new topic of each of those documents.
+    topic_weights : np.ndarray[float]
+        The topic weights of the final document of the shard.
+    """
+    corpus = _worker_state["corpus"]
+    merged_document_topic_assignments = _worker_state["model_arrays"]["document_topic_assignments"]
+    model_parameters = _worker_state["model_parameters"]
+    document_topic_assignments = _worker_state["document_topic_assignments"]
+    count_arrays = (_worker_state["number_of_documents_in_each_topic"],
+                    _worker_state["number_of_each_word_in_each_topic"],
+                    _worker_state["number_of_total_words_in_each_topic"])
+
+    stale_document_indices = np.flatnonzero(document_topic_assignments != merged_document_topic_assignments)
+    move_documents_between_topics(stale_document_indices, document_topic_assignments[stale_document_indices],
+                                  merged_document_topic_assignments[stale_document_indices], corpus.document_offsets,
+                                  corpus.unique_word_ids, corpus.unique_word_offsets, corpus.unique_word_counts,
+                                  *count_arrays)
+    document_topic_assignments[stale_document_indices] = merged_document_topic_assignments[stale_document_indices]
+
+    shard = slice(first_document_index, end_document_index)
+    sample_documents_in_single_iteration(
+        np.arange(first_document_index, end_document_index), corpus.document_offsets, corpus.unique_word_ids,
+        corpus.unique_word_offsets, corpus.unique_word_counts, document_topic_assignments, *count_arrays,
+        _worker_state["topic_weights"], model_parameters["alpha"], model_parameters["beta"],
+        model_parameters["vocabulary_size_times_beta"], _get_log_gamma_table(model_parameters["beta"]),
+        model_parameters["log_space"], _worker_state["model_arrays"]["random_numbers"][shard])
+
+    changed_document_indices = first_document_index + np.flatnonzero(
+        document_topic_assignments[shard] != merged_document_topic_assignments[shard])
+    return (changed_document_indices, document_topic_assignments[changed_document_indices],
+            _worker_state["topic_weights"].copy())
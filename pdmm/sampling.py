@@ -1,12 +1,41 @@
 """
 Contains the GibbsSamplingDMM class.
 """
-from collections import Counter
+from collections import namedtuple
+from functools import lru_cache
+import json
 import logging
+import os
+import time
 
 import numpy as np
 
-from .utils import sample_from_cumulative_weights, sample_many_from_cumulative_weights
+from .corpus import Corpus
+from .kernels import (LOG_GAMMA_TABLE_SIZE, add_documents_to_topics, build_word_proposal_tables,
+                      compute_log_gamma_table, compute_log_likelihood, compute_topic_weights_for_document,
+                      encode_documents_as_text, remove_documents_from_topics, sample_documents_in_single_iteration,
+                      sample_documents_with_metropolis_hastings, sample_words_without_replacement)
+from .model import TopicModel
+from .stats import SamplerStats
+from .utils import (sample_from_cumulative_weights, sample_many_from_cumulative_weights,
+                    sample_many_from_rows_of_cumulative_weights)
+from .vocabulary import Vocabulary
+
+TOP_WORDS_BLOCK_SIZE = 1 << 23
+
+InferenceProgress = namedtuple("InferenceProgress", ["iteration", "log_likelihood", "topic_change_rate"])
+InferenceProgress.__doc__ = """
+The progress of inference at an iteration.
+
+Attributes
+----------
+iteration : int
+    The number of iterations run so far.
+log_likelihood : float
+    The joint log-likelihood of the corpus and the assignments.
+topic_change_rate : float
+    The fraction of documents whose topic changed in the iteration.
+"""
 
 
 class GibbsSamplingDMM:
@@ -35,15 +64,53 @@ class GibbsSamplingDMM:
         The number of documents in each topic.
     number_of_each_word_in_each_topic : np.ndarray[int, int]
         An array in which the (i,j)th element is the count
-        of word j within topic i.
+        of word j within topic i, with the dtype and memory
+        layout given by `count_dtype` and `count_layout`.
     number_of_total_words_in_each_topic : np.ndarray[int]
         The number of words total within each topic.
     topic_weights : np.ndarray[float]
         The weights for each of the topics.
+    count_dtype : str
+        The integer dtype of the word counts.
+    count_layout : str
+        Whether the word counts of each topic ("topic-major") or
+        of each word ("word-major") are contiguous in memory.
+    engine : str
+        The engine used to run each iteration of sampling.
+    weight_space : str
+        Whether topic weights are computed in "linear" or "log" space.
+    iteration : int
+        The number of iterations of inference run so far.
+    random_number_generator : str
+        The kind of random number generator owned by the model.
+    sampler : str
+        Whether each document is resampled exactly ("gibbs") or with
+        Metropolis-Hastings steps using alias tables ("alias").
+    metropolis_hastings_steps : int
+        The number of Metropolis-Hastings steps for each document
+        when using the "alias" sampler.
+    random_state : np.random.RandomState or np.random.Generator
+        The random number generator owned by the model.
+    stats : pdmm.stats.SamplerStats or None
+        The statistics of sampling, if enabled with `enable_stats`.
     logger : logging.Logger
         The logger for the class.
     """
-    def __init__(self, corpus, number_of_topics=20, alpha=0.1, beta=0.001):
+    ENGINES = ("python", "numba")
+    WEIGHT_SPACES = ("linear", "log")
+    RANDOM_NUMBER_GENERATORS = ("legacy", "pcg64")
+    SAMPLERS = ("gibbs", "alias")
+    COUNT_DTYPES = ("int32", "uint16", "int64")
+    COUNT_LAYOUTS = ("topic-major", "word-major")
+    CHECKPOINT_VERSION = 2
+    ALIAS_SAMPLER_CHUNK_SIZE = 1 << 16
+    SYNTHETIC_CHUNK_SIZE = 1 << 17
+    OUTPUT_CHUNK_SIZE = 1 << 16
+    OUTPUT_FORMATS = ("text", "npy", "npz", "parquet")
+
+    def __init__(self, corpus, number_of_topics=20, alpha=0.1, beta=0.001, engine="python", weight_space="linear",
+                 random_number_generator="legacy", sampler="gibbs", metropolis_hastings_steps=4, count_dtype="int32",
+                 count_layout="word-major"):
         """
         Initialise self.
 
@@ -65,76 +132,819 @@ class GibbsSamplingDMM:
             topic containing similar documents. Smaller
             values reduce the variance of a document in
             individual topics.
+        engine : str, defaults to "python"
+            The engine used to run each iteration of sampling. The
+            "python" engine samples one document at a time,
+            computing its weights from its distinct words, whereas
+            the "numba" engine runs each whole iteration inside a
+            single compiled function. Both engines compute the
+            weights with the same compiled routine, so they produce
+            exactly the same assignments for a given seed.
+        weight_space : str, defaults to "linear"
+            Whether the topic weights for a document are computed as
+            a product of fractions ("linear") or as a sum of their
+            logarithms normalised by the largest ("log"). The product
+            underflows to zero for long documents and small beta, so
+            the log space should be used for longer texts.
+        random_number_generator : str, defaults to "legacy"
+            The kind of random number generator owned by the model.
+            The "legacy" generator is a Mersenne Twister which draws
+            the same numbers as seeding NumPy's global random state,
+            whereas "pcg64" uses NumPy's default `Generator`.
+        sampler : str, defaults to "gibbs"
+            How the topic of each document is resampled. The "gibbs"
+            sampler computes the weight of every topic, costing time
+            proportional to the number of topics. The "alias" sampler
+            instead runs a few Metropolis-Hastings steps with proposals
+            drawn in constant time from alias tables, as in LightLDA,
+            so that its cost does not grow with the number of topics.
+            It needs the "numba" engine, and always works in log space.
+        metropolis_hastings_steps : int, defaults to 4
+            The number of Metropolis-Hastings steps for each document
+            when using the "alias" sampler, alternating between word
+            and document proposals.
+        count_dtype : str, defaults to "int32"
+            The integer dtype of the word counts. A count can be no
+            larger than the number of times its word occurs in the
+            corpus, so "uint16" halves the memory of the counts for
+            corpora in which no word occurs more than 65,535 times.
+        count_layout : str, defaults to "word-major"
+            The memory layout of the word counts. With "word-major",
+            the counts of each word across every topic are contiguous,
+            which suits gathering the counts of the words of a
+            document, as every sampler does. With "topic-major", the
+            counts of each topic are contiguous.
         """
+        if engine not in self.ENGINES:
+            raise ValueError("Engine must be one of {}, not {!r}.".format(", ".join(self.ENGINES), engine))
+        if weight_space not in self.WEIGHT_SPACES:
+            raise ValueError("Weight space must be one of {}, not {!r}.".format(
+                ", ".join(self.WEIGHT_SPACES), weight_space))
+        if random_number_generator not in self.RANDOM_NUMBER_GENERATORS:
+            raise ValueError("Random number generator must be one of {}, not {!r}.".format(
+                ", ".join(self.RANDOM_NUMBER_GENERATORS), random_number_generator))
+        if sampler not in self.SAMPLERS:
+            raise ValueError("Sampler must be one of {}, not {!r}.".format(", ".join(self.SAMPLERS), sampler))
+        if sampler == "alias" and engine != "numba":
+            raise ValueError("The alias sampler needs the numba engine.")
+        if count_dtype not in self.COUNT_DTYPES:
+            raise ValueError("Count dtype must be one of {}, not {!r}.".format(", ".join(self.COUNT_DTYPES),
+                                                                              count_dtype))
+        if count_layout not in self.COUNT_LAYOUTS:
+            raise ValueError("Count layout must be one of {}, not {!r}.".format(", ".join(self.COUNT_LAYOUTS),
+                                                                               count_layout))
+        if not _can_hold_word_counts(corpus, count_dtype):
+            raise ValueError("A word occurs too often in the corpus for its counts to fit in {}.".format(count_dtype))
+
         self.corpus = corpus
         self.number_of_topics = number_of_topics
         self.alpha = alpha
         self.beta = beta
 
-        self.document_topic_assignments = np.zeros((self.corpus.number_of_documents,))
-        self.number_of_documents_in_each_topic = np.zeros((self.number_of_topics,))
+        self.count_dtype = count_dtype
+        self.count_layout = count_layout
 
-        self.number_of_each_word_in_each_topic = np.zeros((self.number_of_topics, self.corpus.vocab.size))
-        self.number_of_total_words_in_each_topic = np.zeros((self.number_of_topics,))
+        self.document_topic_assignments = np.zeros((self.corpus.number_of_documents,), dtype=np.int32)
+        self.number_of_documents_in_each_topic = np.zeros((self.number_of_topics,), dtype=np.int64)
+
+        self.number_of_each_word_in_each_topic = self._create_word_counts(self.corpus.vocab.size)
+        self.number_of_total_words_in_each_topic = np.zeros((self.number_of_topics,), dtype=np.int64)
         self.topic_weights = np.ones((self.number_of_topics,))
+        self.engine = engine
+        self.weight_space = weight_space
+        self.iteration = 0
+        self.random_number_generator = random_number_generator
+        self.random_state = self._create_random_state()
+        self.sampler = sampler
+        self.metropolis_hastings_steps = metropolis_hastings_steps
+        self._word_count_buffer = None
+        self._topic_model = None
+        self.stats = None
 
         self.logger = logging.getLogger(__name__)
 
     def randomly_initialise_topic_assignment(self, seed=None):
         """Randomly assign topics to each of the documents."""
-        np.random.seed(seed)
-        self.document_topic_assignments = np.random.randint(0, self.number_of_topics, self.corpus.number_of_documents)
+        self.random_state = self._create_random_state(seed)
+        self.iteration = 0
+
+        self.set_topic_assignments(self._draw_random_topics(self.corpus.number_of_documents))
+
+    def set_topic_assignments(self, document_topic_assignments):
+        """
+        Assign each document to a given topic, rebuilding the counts.
+
+        Parameters
+        ----------
+        document_topic_assignments : np.ndarray[int]
+            The topic index of each document.
+        """
+        self._topic_model = None
+        self.document_topic_assignments = np.array(document_topic_assignments, dtype=np.int32)
         self.number_of_documents_in_each_topic = np.bincount(self.document_topic_assignments,
-                                                             minlength=self.number_of_topics)
+                                                             minlength=self.number_of_topics).astype(np.int64)
+        self.number_of_each_word_in_each_topic = np.zeros_like(self.number_of_each_word_in_each_topic)
+        self.number_of_total_words_in_each_topic = np.zeros_like(self.number_of_total_words_in_each_topic)
+
+        add_documents_to_topics(self.corpus.document_offsets, self.corpus.unique_word_ids,
+                                self.corpus.unique_word_offsets, self.corpus.unique_word_counts,
+                                self.document_topic_assignments, self.number_of_each_word_in_each_topic,
+                                self.number_of_total_words_in_each_topic)
 
-        for document_index, new_topic in enumerate(self.document_topic_assignments):
-            self._assign_document_to_topic(document_index, new_topic)
+    def log_likelihood(self):
+        """
+        Compute the joint log-likelihood of the corpus and the current assignments.
 
-    def inference(self, number_of_iterations):
+        Returns
+        -------
+        log_likelihood : float
+            The log of p(w, z | alpha, beta), which is higher for
+            better clusterings of the same corpus.
+        """
+        return compute_log_likelihood(self.number_of_documents_in_each_topic, self.number_of_each_word_in_each_topic,
+                                      self.number_of_total_words_in_each_topic, self.alpha, self.beta)
+
+    def enable_stats(self):
+        """
+        Start recording the time spent in each phase of sampling.
+
+        Every later sweep, whether from `inference` or
+        `online_inference`, adds to the statistics and is logged. When
+        disabled, which is the default, sampling runs without any
+        timing at all.
+
+        Returns
+        -------
+        stats : pdmm.stats.SamplerStats
+            The statistics, which are reset.
+        """
+        self.stats = SamplerStats()
+        return self.stats
+
+    def disable_stats(self):
+        """Stop recording statistics, returning those recorded so far."""
+        stats, self.stats = self.stats, None
+        return stats
+
+    def get_memory_footprint(self):
+        """
+        Get the memory held by the state of the model.
+
+        The corpus is not included, as it may be shared between models.
+
+        Returns
+        -------
+        footprint : dict[str, int]
+            The number of bytes held by each array of the state, and
+            their total under "total". The word counts include any
+            spare capacity kept for a growing vocabulary.
+        """
+        number_of_each_word_in_each_topic = self.number_of_each_word_in_each_topic
+        if self._word_count_buffer is not None and number_of_each_word_in_each_topic.base is self._word_count_buffer:
+            number_of_each_word_in_each_topic = self._word_count_buffer
+
+        footprint = {
+            "document_topic_assignments": self.document_topic_assignments.nbytes,
+            "number_of_documents_in_each_topic": self.number_of_documents_in_each_topic.nbytes,
+            "number_of_each_word_in_each_topic": number_of_each_word_in_each_topic.nbytes,
+            "number_of_total_words_in_each_topic": self.number_of_total_words_in_each_topic.nbytes,
+            "topic_weights": self.topic_weights.nbytes,
+        }
+        footprint["total"] = sum(footprint.values())
+        return footprint
+
+    def inference(self, number_of_iterations, checkpoint_path=None, checkpoint_every=None, callback=None,
+                  eval_every=1, log_likelihood_tolerance=None, topic_change_tolerance=None):
         """
         Run inference for a number of iterations.
 
         Parameters
         ----------
         number_of_iterations : int
-            The number of iterations to run.
+            The maximum number of iterations to run.
+
+        Optional Parameters
+        -------------------
+        checkpoint_path : str, defaults to None
+            The location at which to save checkpoints.
+        checkpoint_every : int, defaults to None
+            The number of iterations between checkpoints. If not given,
+            a checkpoint is only saved after the final iteration.
+        callback : callable, defaults to None
+            A function called as `callback(model, progress)` whenever
+            the progress is evaluated, where `progress` is an
+            `InferenceProgress`. Inference stops early if it returns True.
+        eval_every : int, defaults to 1
+            The number of iterations between evaluations of progress.
+        log_likelihood_tolerance : float, defaults to None
+            Stop early once the relative change in log-likelihood
+            between evaluations is below this value.
+        topic_change_tolerance : float, defaults to None
+            Stop early once the fraction of documents changing topic
+            in an iteration is below this value.
 
         Notes
         -----
         - This implements the second 'for' loop from the algorithm
           in Yin's paper [1].
+        - Progress is only evaluated if a callback or a tolerance is
+          given, so plain inference pays nothing for it.
         """
+        self._run_iterations(self._sample_documents, number_of_iterations, checkpoint_path=checkpoint_path,
+                             checkpoint_every=checkpoint_every, callback=callback, eval_every=eval_every,
+                             log_likelihood_tolerance=log_likelihood_tolerance,
+                             topic_change_tolerance=topic_change_tolerance)
+
+    def _run_iterations(self, sample_documents, number_of_iterations, checkpoint_path=None, checkpoint_every=None,
+                        callback=None, eval_every=1, log_likelihood_tolerance=None, topic_change_tolerance=None):
+        """
+        Run iterations of a sampling function, with checkpoints and early stopping as for `inference`.
+
+        This lets other samplers, such as approximate distributed
+        sampling, share the handling of checkpoints and progress. The
+        optional parameters are as for `inference`.
+
+        Parameters
+        ----------
+        sample_documents : callable
+            A function taking no arguments which resamples the topic
+            of every document once.
+        number_of_iterations : int
+            The maximum number of iterations to run.
+        """
+        evaluate_progress = (callback is not None or log_likelihood_tolerance is not None or
+                             topic_change_tolerance is not None)
+        previous_log_likelihood = None
+        last_checkpoint_iteration = None
+        iteration = 0
+
         for iteration in range(1, number_of_iterations + 1):
             self.logger.debug("Sampling in iteration {} of {}".format(iteration, number_of_iterations))
-            self._sample_in_single_iteration()
+            evaluate_progress_in_iteration = evaluate_progress and iteration % eval_every == 0
+            if evaluate_progress_in_iteration:
+                previous_document_topic_assignments = self.document_topic_assignments.copy()
+
+            sample_documents()
+            self._topic_model = None
+            self.iteration += 1
+
+            if checkpoint_path and checkpoint_every and iteration % checkpoint_every == 0:
+                self.save_checkpoint(checkpoint_path)
+                last_checkpoint_iteration = iteration
+
+            if evaluate_progress_in_iteration:
+                progress = InferenceProgress(
+                    self.iteration,
+                    self.log_likelihood(),
+                    np.mean(previous_document_topic_assignments != self.document_topic_assignments)
+                )
+                self.logger.info("Iteration {}: log-likelihood {:.4f}, {:.2%} of documents changed topic".format(
+                    *progress))
+
+                stop = callback is not None and callback(self, progress)
+                if log_likelihood_tolerance is not None and previous_log_likelihood is not None:
+                    relative_change = abs(progress.log_likelihood - previous_log_likelihood) / abs(
+                        previous_log_likelihood)
+                    stop = stop or relative_change < log_likelihood_tolerance
+                if topic_change_tolerance is not None:
+                    stop = stop or progress.topic_change_rate < topic_change_tolerance
+                previous_log_likelihood = progress.log_likelihood
+
+                if stop:
+                    self.logger.info("Stopping early after iteration {}".format(self.iteration))
+                    break
+
+        if checkpoint_path and last_checkpoint_iteration != iteration:
+            self.save_checkpoint(checkpoint_path)
+
+    def online_inference(self, list_of_word_lists, number_of_sweeps=5, number_of_old_documents=0,
+                         maximum_number_of_documents=None):
+        """
+        Update the model with a new batch of documents.
+
+        The new documents are appended to the corpus and randomly
+        assigned to topics, and then a few sweeps are run over them
+        together with a random sample of the older documents, so that
+        the model follows a stream of documents without retraining.
+
+        Parameters
+        ----------
+        list_of_word_lists : iterable[list[str]]
+            The new documents, as lists of words.
+
+        Optional Parameters
+        -------------------
+        number_of_sweeps : int, defaults to 5
+            The number of sweeps to run over the documents.
+        number_of_old_documents : int, defaults to 0
+            The number of older documents to sample alongside the new
+            ones in each sweep, drawn afresh for every sweep.
+        maximum_number_of_documents : int, defaults to None
+            If given, the oldest documents are forgotten after the
+            sweeps, so that at most this many are kept.
+
+        Returns
+        -------
+        document_topic_assignments : np.ndarray[int]
+            The topics of the new documents after the sweeps, or of
+            those that were kept if some were forgotten.
+        """
+        new_document_indices = self.add_documents(list_of_word_lists)
+        number_of_existing_documents = new_document_indices.start
+
+        for _ in range(number_of_sweeps):
+            document_indices = np.arange(new_document_indices.start, new_document_indices.stop)
+            if number_of_old_documents and number_of_existing_documents:
+                old_document_indices = self.random_state.choice(
+                    number_of_existing_documents, min(number_of_old_documents, number_of_existing_documents),
+                    replace=False)
+                document_indices = np.concatenate([np.sort(old_document_indices), document_indices])
+            self._sample_documents(document_indices)
+
+        number_of_new_documents = len(new_document_indices)
+        if maximum_number_of_documents is not None:
+            number_of_documents_to_forget = self.corpus.number_of_documents - maximum_number_of_documents
+            if number_of_documents_to_forget > 0:
+                self.forget_oldest_documents(number_of_documents_to_forget)
+                number_of_new_documents = min(number_of_new_documents, maximum_number_of_documents)
+
+        return self.document_topic_assignments[self.corpus.number_of_documents - number_of_new_documents:]
+
+    def add_documents(self, list_of_word_lists):
+        """
+        Append new documents to the corpus and randomly assign them to topics.
+
+        Words missing from the vocabulary are added to it. The columns
+        of `number_of_each_word_in_each_topic` are grown with doubling
+        capacity, so that adding many small batches costs amortised
+        constant time per new word.
+
+        Parameters
+        ----------
+        list_of_word_lists : iterable[list[str]]
+            The new documents, as lists of words.
+
+        Returns
+        -------
+        document_indices : range
+            The indices of the new documents within the corpus.
+
+        Notes
+        -----
+        - The corpus is changed in place, so it should not be shared
+          with other models.
+        """
+        self._topic_model = None
+        new_document_indices = self.corpus.append_documents(list_of_word_lists)
+        self._grow_word_counts(self.corpus.vocab.size)
+        if not _can_hold_word_counts(self.corpus, self.count_dtype):
+            self.logger.warning("Widening the word counts from {} to int64 to hold the new documents".format(
+                self.count_dtype))
+            self._set_count_dtype("int64")
+
+        new_document_topic_assignments = self._draw_random_topics(len(new_document_indices)).astype(np.int32)
+        self.document_topic_assignments = np.concatenate([self.document_topic_assignments,
+                                                          new_document_topic_assignments])
+        self.number_of_documents_in_each_topic = self.number_of_documents_in_each_topic + np.bincount(
+            new_document_topic_assignments, minlength=self.number_of_topics)
+
+        new_documents = slice(new_document_indices.start, new_document_indices.stop + 1)
+        add_documents_to_topics(self.corpus.document_offsets[new_documents], self.corpus.unique_word_ids,
+                                self.corpus.unique_word_offsets[new_documents], self.corpus.unique_word_counts,
+                                new_document_topic_assignments, self.number_of_each_word_in_each_topic,
+                                self.number_of_total_words_in_each_topic)
+        return new_document_indices
+
+    def forget_oldest_documents(self, number_of_documents):
+        """
+        Remove the oldest documents from the corpus and from the counts.
+
+        The vocabulary is left unchanged, so words that no longer
+        occur in any document keep their ids with counts of zero.
+
+        Parameters
+        ----------
+        number_of_documents : int
+            The number of documents to forget.
+        """
+        self._topic_model = None
+        forgotten_documents = slice(0, number_of_documents + 1)
+        forgotten_document_topic_assignments = self.document_topic_assignments[:number_of_documents]
+        remove_documents_from_topics(self.corpus.document_offsets[forgotten_documents], self.corpus.unique_word_ids,
+                                     self.corpus.unique_word_offsets[forgotten_documents],
+                                     self.corpus.unique_word_counts, forgotten_document_topic_assignments,
+                                     self.number_of_each_word_in_each_topic, self.number_of_total_words_in_each_topic)
+        self.number_of_documents_in_each_topic = self.number_of_documents_in_each_topic - np.bincount(
+            forgotten_document_topic_assignments, minlength=self.number_of_topics)
+
+        self.document_topic_assignments = self.document_topic_assignments[number_of_documents:].copy()
+        self.corpus.remove_oldest_documents(number_of_documents)
+
+    def save_checkpoint(self, file_path):
+        """
+        Save the state of the sampler to a compressed npz file.
+
+        The checkpoint holds the assignments, count matrices,
+        hyper-parameters, iteration number and random state, so that
+        resuming with `load_checkpoint` continues exactly as if the run
+        had not been interrupted. The corpus itself is not saved.
+
+        Parameters
+        ----------
+        file_path : str
+            The location at which to save the file. The file is
+            replaced atomically, so an interrupted save leaves any
+            previous checkpoint intact.
+        """
+        temporary_file_path = file_path + ".tmp"
+        with open(temporary_file_path, "wb") as wf:
+            np.savez_compressed(
+                wf,
+                version=self.CHECKPOINT_VERSION,
+                number_of_documents=self.corpus.number_of_documents,
+                vocabulary_size=self.corpus.vocab.size,
+                number_of_topics=self.number_of_topics,
+                alpha=self.alpha,
+                beta=self.beta,
+                engine=self.engine,
+                weight_space=self.weight_space,
+                random_number_generator=self.random_number_generator,
+                sampler=self.sampler,
+                metropolis_hastings_steps=self.metropolis_hastings_steps,
+                count_dtype=self.count_dtype,
+                count_layout=self.count_layout,
+                random_state=self._get_random_state_as_json(),
+                iteration=self.iteration,
+                document_topic_assignments=self.document_topic_assignments,
+                number_of_documents_in_each_topic=self.number_of_documents_in_each_topic,
+                number_of_each_word_in_each_topic=self.number_of_each_word_in_each_topic,
+                number_of_total_words_in_each_topic=self.number_of_total_words_in_each_topic,
+                topic_weights=self.topic_weights,
+            )
+        os.replace(temporary_file_path, file_path)
+
+    @classmethod
+    def load_checkpoint(cls, file_path, corpus):
+        """
+        Load a sampler from a checkpoint made by `save_checkpoint`.
+
+        Parameters
+        ----------
+        file_path : str
+            The location of the checkpoint.
+        corpus : pdmm.corpus.Corpus
+            The corpus on which the checkpointed sampler was run.
+
+        Returns
+        -------
+        model : GibbsSamplingDMM
+            The sampler, with the random state restored.
+        """
+        with np.load(file_path) as checkpoint:
+            if checkpoint["version"] != cls.CHECKPOINT_VERSION:
+                raise ValueError("Checkpoint has version {}, but only version {} is supported.".format(
+                    checkpoint["version"], cls.CHECKPOINT_VERSION))
+            if (checkpoint["number_of_documents"] != corpus.number_of_documents or
+                    checkpoint["vocabulary_size"] != corpus.vocab.size):
+                raise ValueError("Checkpoint was not made with the given corpus.")
+
+            model = cls(corpus, int(checkpoint["number_of_topics"]), float(checkpoint["alpha"]),
+                        float(checkpoint["beta"]), engine=str(checkpoint["engine"]),
+                        weight_space=str(checkpoint["weight_space"]),
+                        random_number_generator=str(checkpoint["random_number_generator"]),
+                        **cls._get_optional_parameters_from_checkpoint(checkpoint))
+            model.iteration = int(checkpoint["iteration"])
+            model.document_topic_assignments = checkpoint["document_topic_assignments"].astype(np.int32)
+            model.number_of_documents_in_each_topic = checkpoint["number_of_documents_in_each_topic"].astype(np.int64)
+            model.number_of_each_word_in_each_topic = model._create_word_counts(corpus.vocab.size)
+            model.number_of_each_word_in_each_topic[...] = checkpoint["number_of_each_word_in_each_topic"]
+            model.number_of_total_words_in_each_topic = checkpoint["number_of_total_words_in_each_topic"].astype(
+                np.int64)
+            model.topic_weights = checkpoint["topic_weights"]
+            model._set_random_state_from_json(str(checkpoint["random_state"]))
+
+        return model
+
+    @staticmethod
+    def _get_optional_parameters_from_checkpoint(checkpoint):
+        """Get the parameters which checkpoints from earlier releases may lack."""
+        optional_parameters = {}
+        if "sampler" in checkpoint:
+            optional_parameters["sampler"] = str(checkpoint["sampler"])
+            optional_parameters["metropolis_hastings_steps"] = int(checkpoint["metropolis_hastings_steps"])
+        if "count_dtype" in checkpoint:
+            optional_parameters["count_dtype"] = str(checkpoint["count_dtype"])
+            optional_parameters["count_layout"] = str(checkpoint["count_layout"])
+        return optional_parameters
+
+    def to_topic_model(self):
+        """
+        Freeze the current counts into a TopicModel for scoring new documents.
+
+        The model is cached until sampling or a change of documents
+        alters the counts, so that repeated scoring does not rebuild
+        its log probabilities.
+
+        Returns
+        -------
+        topic_model : pdmm.model.TopicModel
+            A model holding the log probabilities of the topics and of
+            the words within them, which no longer needs the corpus.
+        """
+        topic_model = self._topic_model
+        if topic_model is None or topic_model.alpha != self.alpha or topic_model.beta != self.beta:
+            topic_model = TopicModel.from_counts(self.corpus.vocab, self.number_of_documents_in_each_topic,
+                                                 self.number_of_each_word_in_each_topic, self.alpha, self.beta)
+            self._topic_model = topic_model
+        return topic_model
+
+    def predict(self, list_of_word_lists):
+        """
+        Predict the most probable topic of each new document.
+
+        The current counts are frozen by `to_topic_model`, which is
+        cached between calls until the counts change.
+
+        Parameters
+        ----------
+        list_of_word_lists : iterable[list[str]]
+            The documents to score, as lists of words. Words missing
+            from the vocabulary are scored as unseen words, and the
+            vocabulary is not grown.
+
+        Returns
+        -------
+        topic_indices : np.ndarray[int]
+            The most probable topic of each document.
+        """
+        return self.to_topic_model().predict(list_of_word_lists)
+
+    def predict_proba(self, list_of_word_lists):
+        """
+        Predict the probability of each topic for each new document.
+
+        The current counts are frozen by `to_topic_model`, which is
+        cached between calls until the counts change.
+
+        Parameters
+        ----------
+        list_of_word_lists : iterable[list[str]]
+            The documents to score, as lists of words.
+
+        Returns
+        -------
+        topic_probabilities : np.ndarray[float, float]
+            An array in which the (i,j)th element is the probability
+            of document i belonging to topic j.
+        """
+        return self.to_topic_model().predict_proba(list_of_word_lists)
 
     def generate_synthetic_documents(self, number_of_documents, replacement=True, seed=None):
-        """Generate new synthetic documents according to the model."""
-        np.random.seed(seed)
+        """
+        Generate new synthetic documents according to the model.
+
+        The documents are drawn with a random number generator seeded
+        for this call only, leaving the random state of the model
+        untouched. The words of every document are drawn in a single
+        batch, using the same random numbers as drawing them one
+        document at a time.
+
+        Parameters
+        ----------
+        number_of_documents : int
+            The number of documents to generate.
+
+        Optional Parameters
+        -------------------
+        replacement : bool, defaults to True
+            Whether words may be repeated within a document. Without
+            replacement, documents are no longer than the number of
+            words in their topic.
+        seed : int, optional
+            The seed for the random number generator.
+
+        Returns
+        -------
+        documents : list[list[str]]
+            The words of each document.
+        chosen_topics : np.ndarray[int]
+            The topic from which each document was drawn.
+        """
+        word_ids, document_offsets, chosen_topics = self._generate_synthetic_document_arrays(
+            number_of_documents, replacement, self._create_random_state(seed),
+            self._get_synthetic_document_weights(replacement))
+
+        all_words = self.corpus.vocab.words_from_ids(word_ids)
+        document_offsets = document_offsets.tolist()
+        documents = [all_words[document_start:document_end]
+                     for document_start, document_end in zip(document_offsets[:-1], document_offsets[1:])]
+        return documents, chosen_topics
+
+    def generate_synthetic_document_arrays(self, number_of_documents, chunk_size=SYNTHETIC_CHUNK_SIZE,
+                                           replacement=True, seed=None):
+        """
+        Generate synthetic documents as arrays of word ids, a chunk at a time.
+
+        Documents are never converted to strings, so that very many can
+        be generated in bounded memory. A single chunk holds the same
+        documents as `generate_synthetic_documents` with the same seed.
+
+        Parameters
+        ----------
+        number_of_documents : int
+            The number of documents to generate.
+
+        Optional Parameters
+        -------------------
+        chunk_size : int
+            The number of documents in each chunk.
+        replacement : bool, defaults to True
+            Whether words may be repeated within a document.
+        seed : int, optional
+            The seed for the random number generator, which is created
+            for this call only.
+
+        Yields
+        ------
+        word_ids : np.ndarray[np.int32]
+            The word ids of every document in the chunk, concatenated.
+        document_offsets : np.ndarray[np.int64]
+            The offsets of each document within `word_ids`.
+        topic_indices : np.ndarray[int]
+            The topic from which each document was drawn.
+        """
+        random_state = self._create_random_state(seed)
+        synthetic_document_weights = self._get_synthetic_document_weights(replacement)
+        for chunk_start in range(0, number_of_documents, chunk_size):
+            yield self._generate_synthetic_document_arrays(min(chunk_size, number_of_documents - chunk_start),
+                                                           replacement, random_state, synthetic_document_weights)
+
+    def generate_synthetic_corpus(self, number_of_documents, chunk_size=SYNTHETIC_CHUNK_SIZE, replacement=True,
+                                  seed=None):
+        """
+        Generate a corpus of synthetic documents, sharing the vocabulary of the model.
 
+        The corpus can be saved with `Corpus.save_binary` for loading
+        without parsing. Its vocabulary is a copy, so that growing it
+        leaves the model untouched.
+
+        Parameters
+        ----------
+        number_of_documents : int
+            The number of documents to generate.
+
+        Optional Parameters
+        -------------------
+        chunk_size : int
+            The number of documents to generate at a time.
+        replacement : bool, defaults to True
+            Whether words may be repeated within a document.
+        seed : int, optional
+            The seed for the random number generator.
+
+        Returns
+        -------
+        corpus : pdmm.corpus.Corpus
+            The synthetic corpus.
+        chosen_topics : np.ndarray[int]
+            The topic from which each document was drawn.
+        """
+        list_of_word_ids = [np.empty(0, dtype=np.int32)]
+        list_of_document_lengths = [np.empty(0, dtype=np.int64)]
+        list_of_topic_indices = [np.empty(0, dtype=np.int64)]
+        for word_ids, document_offsets, topic_indices in self.generate_synthetic_document_arrays(
+                number_of_documents, chunk_size=chunk_size, replacement=replacement, seed=seed):
+            list_of_word_ids.append(word_ids)
+            list_of_document_lengths.append(np.diff(document_offsets))
+            list_of_topic_indices.append(topic_indices)
+
+        document_offsets = np.zeros(number_of_documents + 1, dtype=np.int64)
+        np.cumsum(np.concatenate(list_of_document_lengths), out=document_offsets[1:])
+        vocab = Vocabulary.from_packed_arrays(*self.corpus.vocab.to_packed_arrays(),
+                                              number_of_buckets=self.corpus.vocab.number_of_buckets)
+        corpus = Corpus.from_word_id_arrays(np.concatenate(list_of_word_ids), document_offsets, vocab)
+        return corpus, np.concatenate(list_of_topic_indices)
+
+    def save_synthetic_documents_to_file(self, file_path, number_of_documents, chunk_size=SYNTHETIC_CHUNK_SIZE,
+                                         replacement=True, seed=None):
+        """
+        Generate synthetic documents and save them to a corpus file.
+
+        The file has one document per line, with words separated by
+        spaces, so can be read by `Corpus.from_document_file`. Each
+        chunk is encoded and written as a single block of bytes.
+
+        Parameters
+        ----------
+        file_path : str
+            The location at which to save the file.
+        number_of_documents : int
+            The number of documents to generate.
+
+        Optional Parameters
+        -------------------
+        chunk_size : int
+            The number of documents to generate at a time.
+        replacement : bool, defaults to True
+            Whether words may be repeated within a document.
+        seed : int, optional
+            The seed for the random number generator.
+
+        Returns
+        -------
+        chosen_topics : np.ndarray[int]
+            The topic from which each document was drawn.
+        """
+        word_bytes, word_offsets = self.corpus.vocab.to_packed_arrays()
+        list_of_topic_indices = [np.empty(0, dtype=np.int64)]
+        with open(file_path, "wb") as wf:
+            for word_ids, document_offsets, topic_indices in self.generate_synthetic_document_arrays(
+                    number_of_documents, chunk_size=chunk_size, replacement=replacement, seed=seed):
+                wf.write(encode_documents_as_text(word_ids, document_offsets, word_bytes, word_offsets).tobytes())
+                list_of_topic_indices.append(topic_indices)
+        return np.concatenate(list_of_topic_indices)
+
+    def _get_synthetic_document_weights(self, replacement):
+        """
+        Get the weights from which synthetic documents are drawn, which are shared by every chunk.
+
+        Returns
+        -------
+        cumulative_topic_weights : np.ndarray[float]
+            The cumulative weights of the topics.
+        cumulative_word_weights_for_all_topics : np.ndarray[float, float]
+            The cumulative weights of the words within each topic.
+        number_of_distinct_words_in_each_topic : np.ndarray[int] or None
+            The number of words with a non-zero count in each topic,
+            which is only needed without replacement.
+        """
+        number_of_distinct_words_in_each_topic = None
         if not replacement:
-            raise NotImplementedError("Not yet possible to sample without replacement.")
+            number_of_distinct_words_in_each_topic = np.count_nonzero(self.number_of_each_word_in_each_topic, axis=1)
+        return (self.topic_weights.cumsum(), self.number_of_each_word_in_each_topic.cumsum(axis=1, dtype=np.float64),
+                number_of_distinct_words_in_each_topic)
 
+    def _generate_synthetic_document_arrays(self, number_of_documents, replacement, random_state,
+                                            synthetic_document_weights):
+        """Draw the word ids, document offsets and topics of synthetic documents with a random state."""
         mean_document_length_in_corpus = self.corpus.get_mean_document_length()
-        document_lengths = np.random.poisson(mean_document_length_in_corpus, size=number_of_documents)
-        documents = []
+        document_lengths = random_state.poisson(mean_document_length_in_corpus, size=number_of_documents)
 
-        cumulative_topic_weights = self.topic_weights.cumsum()
-        cumulative_word_weights_for_all_topics = self.number_of_each_word_in_each_topic.cumsum(axis=1)
+        (cumulative_topic_weights, cumulative_word_weights_for_all_topics,
+         number_of_distinct_words_in_each_topic) = synthetic_document_weights
 
-        random_numbers_for_topics = np.random.random(number_of_documents)
+        random_numbers_for_topics = random_state.random(number_of_documents)
         topic_indices = sample_many_from_cumulative_weights(cumulative_topic_weights, random_numbers_for_topics)
-        chosen_topics = topic_indices
-
-        for i in range(number_of_documents):
-            document_length = document_lengths[i]
-            topic_index = topic_indices[i]
-            cumulative_word_weights = cumulative_word_weights_for_all_topics[topic_index]
-            random_numbers_for_words = np.random.random(document_length)
-            word_indices = sample_many_from_cumulative_weights(cumulative_word_weights, random_numbers_for_words)
-            words = [self.corpus.vocab.get_word_from_id(word_index) for word_index in word_indices]
-            documents.append(words)
-        return documents, chosen_topics
+
+        if not replacement:
+            document_lengths = np.minimum(document_lengths, number_of_distinct_words_in_each_topic[topic_indices])
+
+        document_offsets = np.zeros(number_of_documents + 1, dtype=np.int64)
+        np.cumsum(document_lengths, out=document_offsets[1:])
+
+        if replacement:
+            random_numbers_for_words = random_state.random(document_offsets[-1])
+            word_ids = sample_many_from_rows_of_cumulative_weights(cumulative_word_weights_for_all_topics,
+                                                                   np.repeat(topic_indices, document_lengths),
+                                                                   random_numbers_for_words)
+        else:
+            word_ids = _sample_words_without_replacement(cumulative_word_weights_for_all_topics, topic_indices,
+                                                         document_offsets, random_state)
+
+        return word_ids, document_offsets, topic_indices
+
+    def get_top_words(self, number_of_top_words=20):
+        """
+        Get the most common words of every topic, with their probabilities.
+
+        The counts of every topic are partitioned at once rather than
+        sorted, so the cost grows with the size of the vocabulary but
+        not with its logarithm. Words with equal counts are ordered by
+        id, as `collections.Counter.most_common` orders them.
+
+        Optional Parameters
+        -------------------
+        number_of_top_words : int, defaults to 20
+            The number of top words to return for each topic, which is
+            capped at the size of the vocabulary.
+
+        Returns
+        -------
+        top_word_ids : np.ndarray[int, int]
+            An array in which the (i,j)th element is the id of the
+            jth most common word in topic i.
+        top_word_probabilities : np.ndarray[float, float]
+            An array in which the (i,j)th element is the probability
+            of that word within topic i.
+        """
+        number_of_each_word_in_each_topic = self.number_of_each_word_in_each_topic
+        top_word_ids = _get_indices_of_largest_in_each_row(number_of_each_word_in_each_topic, number_of_top_words)
+        top_word_counts = np.take_along_axis(number_of_each_word_in_each_topic, top_word_ids, axis=1)
+
+        vocabulary_size = number_of_each_word_in_each_topic.shape[1]
+        top_word_probabilities = (top_word_counts + self.beta) / (
+            self.number_of_total_words_in_each_topic[:, np.newaxis] + vocabulary_size * self.beta)
+        return top_word_ids, top_word_probabilities
 
     def get_top_words_for_topic(self, topic_index, number_of_top_words=20):
         """
@@ -155,10 +965,9 @@ class GibbsSamplingDMM:
         top_words : list[str]
             A list of the most common words as strings.
         """
-        number_of_each_word_in_topic = self.number_of_each_word_in_each_topic[topic_index]
-        word_counts = Counter(dict(enumerate(number_of_each_word_in_topic)))
-        most_common_elements = word_counts.most_common(number_of_top_words)
-        top_words = [self.corpus.vocab.get_word_from_id(word_id) for word_id, count in most_common_elements]
+        number_of_each_word_in_topic = self.number_of_each_word_in_each_topic[topic_index:topic_index + 1]
+        top_word_ids = _get_indices_of_largest_in_each_row(number_of_each_word_in_topic, number_of_top_words)[0]
+        top_words = self.corpus.vocab.words_from_ids(top_word_ids)
 
         return top_words
 
@@ -166,6 +975,9 @@ class GibbsSamplingDMM:
         """
         Save the top words in the topics to a file.
 
+        The top words of every topic are found at once with
+        `get_top_words`, and the lines are written in large blocks.
+
         Parameters
         ----------
         file_path : str
@@ -176,76 +988,591 @@ class GibbsSamplingDMM:
         number_of_top_words : int
             The number of top words from each topic to save.
         """
-        with open(file_path, "w") as wf:
-            for topic_index in range(self.number_of_topics):
-                top_words = self.get_top_words_for_topic(topic_index, number_of_top_words=number_of_top_words)
+        top_word_ids, _ = self.get_top_words(number_of_top_words)
+        get_word_from_id = self.corpus.vocab.get_word_from_id
 
-                line = "Topic {}: {} \n".format(topic_index, " ".join(top_words))
-                wf.write(line)
+        with open(file_path, "w") as wf:
+            for chunk_start in range(0, self.number_of_topics, self.OUTPUT_CHUNK_SIZE):
+                chunk_of_top_word_ids = top_word_ids[chunk_start:chunk_start + self.OUTPUT_CHUNK_SIZE].tolist()
+                wf.write("".join(
+                    "Topic {}: {} \n".format(topic_index, " ".join(map(get_word_from_id, word_ids)))
+                    for topic_index, word_ids in enumerate(chunk_of_top_word_ids, start=chunk_start)))
 
     def save_topic_assignments_to_file(self, file_path):
         """
         Save the topic assignments to a file.
 
+        The assignments are formatted and written in large blocks
+        rather than one line at a time.
+
         Parameters
         ----------
         file_path : str
             The location at which to save the file.
         """
         with open(file_path, "w") as wf:
-            for document_index in range(self.corpus.number_of_documents):
-                line = str(self.document_topic_assignments[document_index]) + "\n"
-                wf.write(line)
+            for chunk_start in range(0, self.corpus.number_of_documents, self.OUTPUT_CHUNK_SIZE):
+                chunk_of_assignments = self.document_topic_assignments[chunk_start:chunk_start + self.OUTPUT_CHUNK_SIZE]
+                wf.write("\n".join(map(str, chunk_of_assignments.tolist())) + "\n")
+
+    def get_topic_word_probabilities(self):
+        """
+        Get the probability of each word within each topic.
+
+        Returns
+        -------
+        topic_word_probabilities : np.ndarray[np.float32, np.float32]
+            An array in which the (i,j)th element is the probability
+            of word j within topic i, with the memory layout of the
+            word counts.
+        """
+        vocabulary_size = self.number_of_each_word_in_each_topic.shape[1]
+        topic_word_probabilities = self.number_of_each_word_in_each_topic.astype(np.float32)
+        topic_word_probabilities += np.float32(self.beta)
+        topic_word_probabilities /= (self.number_of_total_words_in_each_topic[:, np.newaxis] +
+                                     vocabulary_size * self.beta).astype(np.float32)
+        return topic_word_probabilities
+
+    def get_document_topic_probabilities(self):
+        """
+        Get the probability of each topic for each document in the corpus.
+
+        Each document is scored against the current counts, as by
+        `predict_proba`, a chunk of documents at a time.
+
+        Returns
+        -------
+        document_topic_probabilities : np.ndarray[np.float32, np.float32]
+            An array in which the (i,j)th element is the probability
+            of document i belonging to topic j.
+        """
+        topic_model = self.to_topic_model()
+        document_offsets = self.corpus.document_offsets
+        number_of_documents = self.corpus.number_of_documents
+        document_topic_probabilities = np.empty((number_of_documents, self.number_of_topics), dtype=np.float32)
+
+        for chunk_start in range(0, number_of_documents, self.OUTPUT_CHUNK_SIZE):
+            chunk_end = min(chunk_start + self.OUTPUT_CHUNK_SIZE, number_of_documents)
+            document_topic_probabilities[chunk_start:chunk_end] = topic_model.predict_proba_from_word_ids(
+                self.corpus.word_ids, document_offsets[chunk_start:chunk_end + 1])
+        return document_topic_probabilities
+
+    def save_outputs(self, directory_path, output_format="text", number_of_top_words=20):
+        """
+        Save the results of inference to a directory.
+
+        With "text", the files `topWords` and `topicAssignments` are
+        saved as by `save_top_topical_words_to_file` and
+        `save_topic_assignments_to_file`. The other formats save the
+        assignments, the topic probabilities of each document, the
+        word probabilities of each topic and the top words of each
+        topic, so that they can be loaded without parsing:
+
+        - "npy" saves one `.npy` file for each array, which
+          `np.load(..., mmap_mode="r")` maps without copying.
+        - "npz" saves the arrays in a single file, `outputs.npz`.
+        - "parquet" saves the tables `topicAssignments.parquet`,
+          `topicWordProbabilities.parquet` and `topWords.parquet`, and
+          needs pyarrow.
+
+        With "npy" and "npz", the words of the ids are saved to the
+        file `vocabulary`, one per line.
 
-    def _sample_in_single_iteration(self):
+        Parameters
+        ----------
+        directory_path : str
+            The directory in which to save the files, which must exist.
+
+        Optional Parameters
+        -------------------
+        output_format : str, defaults to "text"
+            One of `OUTPUT_FORMATS`.
+        number_of_top_words : int, defaults to 20
+            The number of top words from each topic to save.
+        """
+        if output_format not in self.OUTPUT_FORMATS:
+            raise ValueError("Output format must be one of {}, not {!r}.".format(", ".join(self.OUTPUT_FORMATS),
+                                                                                output_format))
+
+        if output_format == "text":
+            self.save_top_topical_words_to_file(os.path.join(directory_path, "topWords"),
+                                                number_of_top_words=number_of_top_words)
+            self.save_topic_assignments_to_file(os.path.join(directory_path, "topicAssignments"))
+        elif output_format == "parquet":
+            self._save_outputs_as_parquet(directory_path, number_of_top_words)
+        else:
+            self._save_outputs_as_arrays(directory_path, number_of_top_words, single_file=output_format == "npz")
+
+    def _save_outputs_as_arrays(self, directory_path, number_of_top_words, single_file):
+        """Save the outputs as NumPy arrays, either one file for each or all in one file."""
+        top_word_ids, top_word_probabilities = self.get_top_words(number_of_top_words)
+        arrays = {
+            "topicAssignments": self.document_topic_assignments,
+            "documentTopicProbabilities": self.get_document_topic_probabilities(),
+            "topicWordProbabilities": self.get_topic_word_probabilities(),
+            "topWordIds": top_word_ids,
+            "topWordProbabilities": top_word_probabilities,
+        }
+
+        if single_file:
+            np.savez(os.path.join(directory_path, "outputs.npz"), **arrays)
+        else:
+            for name, array in arrays.items():
+                np.save(os.path.join(directory_path, name + ".npy"), array)
+        self.corpus.vocab.save_to_file(os.path.join(directory_path, "vocabulary"))
+
+    def _save_outputs_as_parquet(self, directory_path, number_of_top_words):
+        """Save the outputs as Parquet tables, with words rather than ids where useful."""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as error:
+            raise ImportError("Saving outputs as Parquet needs pyarrow, which is not installed.") from error
+
+        number_of_documents = self.corpus.number_of_documents
+        vocabulary_size = self.corpus.vocab.size
+        words = pa.array(self.corpus.vocab.words_from_ids(range(vocabulary_size)))
+
+        document_topic_probabilities = self.get_document_topic_probabilities()
+        pq.write_table(pa.table({
+            "document_id": pa.array(np.arange(number_of_documents)),
+            "topic": pa.array(self.document_topic_assignments),
+            "topic_probabilities": pa.FixedSizeListArray.from_arrays(
+                pa.array(document_topic_probabilities.ravel()), self.number_of_topics),
+        }), os.path.join(directory_path, "topicAssignments.parquet"))
+
+        word_topic_probabilities = np.ascontiguousarray(self.get_topic_word_probabilities().T)
+        pq.write_table(pa.table({
+            "word_id": pa.array(np.arange(vocabulary_size)),
+            "word": words,
+            "topic_probabilities": pa.FixedSizeListArray.from_arrays(
+                pa.array(word_topic_probabilities.ravel()), self.number_of_topics),
+        }), os.path.join(directory_path, "topicWordProbabilities.parquet"))
+
+        top_word_ids, top_word_probabilities = self.get_top_words(number_of_top_words)
+        number_of_top_words = top_word_ids.shape[1]
+        pq.write_table(pa.table({
+            "topic": pa.array(np.repeat(np.arange(self.number_of_topics), number_of_top_words)),
+            "rank": pa.array(np.tile(np.arange(number_of_top_words), self.number_of_topics)),
+            "word_id": pa.array(top_word_ids.ravel()),
+            "word": words.take(pa.array(top_word_ids.ravel())),
+            "probability": pa.array(top_word_probabilities.ravel()),
+        }), os.path.join(directory_path, "topWords.parquet"))
+
+    def _sample_documents(self, document_indices=None):
+        """Sample new topics for the given documents, or for every document, with the sampler and engine."""
+        self._topic_model = None
+        if self.stats is not None:
+            self._sample_documents_with_stats(document_indices)
+        elif self.sampler == "alias":
+            self._sample_in_single_alias_iteration(document_indices)
+        elif self.engine == "numba":
+            self._sample_in_single_compiled_iteration(document_indices)
+        else:
+            self._sample_in_single_iteration(document_indices)
+
+    def _sample_documents_with_stats(self, document_indices=None):
+        """Sample documents as `_sample_documents` does, recording and logging the statistics of the sweep."""
+        document_offsets = self.corpus.document_offsets
+        if document_indices is None:
+            previous_document_topic_assignments = self.document_topic_assignments.copy()
+            number_of_documents = self.corpus.number_of_documents
+            number_of_tokens = document_offsets[-1] - document_offsets[0]
+        else:
+            previous_document_topic_assignments = self.document_topic_assignments[document_indices]
+            number_of_documents = len(document_indices)
+            number_of_tokens = (document_offsets[document_indices + 1] - document_offsets[document_indices]).sum()
+
+        t0 = time.perf_counter()
+        if self.sampler == "alias":
+            self._sample_in_single_alias_iteration(document_indices)
+        elif self.engine == "numba":
+            self._sample_in_single_compiled_iteration(document_indices)
+            self.stats.add_phase_time("compiled_sweep", time.perf_counter() - t0)
+        else:
+            self._sample_in_single_iteration_with_stats(document_indices)
+        seconds = time.perf_counter() - t0
+
+        document_topic_assignments = self.document_topic_assignments
+        if document_indices is not None:
+            document_topic_assignments = document_topic_assignments[document_indices]
+        sweep_stats = self.stats.add_sweep(seconds, number_of_documents, int(number_of_tokens),
+                                           np.count_nonzero(previous_document_topic_assignments !=
+                                                            document_topic_assignments))
+        self.logger.info("Sweep {}: {:.4f}s, {:.0f} documents/s, {:.0f} tokens/s, {:.2%} of documents changed "
+                         "topic".format(sweep_stats.sweep, sweep_stats.seconds, sweep_stats.documents_per_second,
+                                        sweep_stats.tokens_per_second, sweep_stats.topic_change_rate))
+
+    def _sample_in_single_iteration(self, document_indices=None):
         """
         Sample in a single iteration.
 
+        Optional Parameters
+        -------------------
+        document_indices : np.ndarray[int], defaults to None
+            The documents to sample, in order. If not given, every
+            document in the corpus is sampled.
+
         Notes
         -----
         - This implements the second 'for' loop from the algorithm
          in Yin's paper [1].
         - These steps MUST be done in series.
+        - The random numbers for every document are drawn in a single
+          block at the start of the iteration.
+        """
+        if self.weight_space == "log":
+            update_topic_weights_for_document = self._update_topic_weights_for_document_in_log_space
+        else:
+            update_topic_weights_for_document = self._update_topic_weights_for_document
+
+        if document_indices is None:
+            document_indices = range(self.corpus.number_of_documents)
+        random_numbers = self.random_state.random(len(document_indices))
+
+        for document_index, random_number in zip(document_indices, random_numbers):
+            current_topic_index = self.document_topic_assignments[document_index]
+            self.number_of_documents_in_each_topic[current_topic_index] -= 1
+            self._unassign_document_from_topic(document_index, current_topic_index)
+
+            update_topic_weights_for_document(document_index)
+
+            cumulative_weights = self.topic_weights.cumsum()
+            new_topic_index = sample_from_cumulative_weights(cumulative_weights, random_number)
+
+            self.number_of_documents_in_each_topic[new_topic_index] += 1
+            self._assign_document_to_topic(document_index, new_topic_index)
+            self.document_topic_assignments[document_index] = new_topic_index
+
+    def _sample_in_single_iteration_with_stats(self, document_indices=None):
         """
-        for document_index, document in enumerate(self.corpus):
+        Sample in a single iteration as `_sample_in_single_iteration` does, timing each phase.
+
+        This is kept separate so that sampling without statistics pays
+        nothing for them.
+        """
+        if self.weight_space == "log":
+            update_topic_weights_for_document = self._update_topic_weights_for_document_in_log_space
+        else:
+            update_topic_weights_for_document = self._update_topic_weights_for_document
+
+        if document_indices is None:
+            document_indices = range(self.corpus.number_of_documents)
+        t0 = time.perf_counter()
+        random_numbers = self.random_state.random(len(document_indices))
+        t1 = time.perf_counter()
+        self.stats.add_phase_time("random_numbers", t1 - t0)
+
+        unassign_seconds = weights_seconds = sample_seconds = assign_seconds = 0.0
+        for document_index, random_number in zip(document_indices, random_numbers):
+            t0 = time.perf_counter()
             current_topic_index = self.document_topic_assignments[document_index]
             self.number_of_documents_in_each_topic[current_topic_index] -= 1
             self._unassign_document_from_topic(document_index, current_topic_index)
 
-            self._update_topic_weights_for_document(document_index)
+            t1 = time.perf_counter()
+            update_topic_weights_for_document(document_index)
 
-            random_number = np.random.random()
+            t2 = time.perf_counter()
             cumulative_weights = self.topic_weights.cumsum()
             new_topic_index = sample_from_cumulative_weights(cumulative_weights, random_number)
 
+            t3 = time.perf_counter()
             self.number_of_documents_in_each_topic[new_topic_index] += 1
             self._assign_document_to_topic(document_index, new_topic_index)
             self.document_topic_assignments[document_index] = new_topic_index
+            t4 = time.perf_counter()
+
+            unassign_seconds += t1 - t0
+            weights_seconds += t2 - t1
+            sample_seconds += t3 - t2
+            assign_seconds += t4 - t3
+
+        number_of_documents = len(document_indices)
+        self.stats.add_phase_time("unassign", unassign_seconds, number_of_documents)
+        self.stats.add_phase_time("weights", weights_seconds, number_of_documents)
+        self.stats.add_phase_time("sample", sample_seconds, number_of_documents)
+        self.stats.add_phase_time("assign", assign_seconds, number_of_documents)
+
+    def _sample_in_single_compiled_iteration(self, document_indices=None):
+        """
+        Sample in a single iteration using the compiled kernel.
+
+        Optional Parameters
+        -------------------
+        document_indices : np.ndarray[int], defaults to None
+            The documents to sample, in order. If not given, every
+            document in the corpus is sampled.
+
+        Notes
+        -----
+        - One random number is drawn for every document up front, and
+          the weights are computed by the same routine as in the
+          Python engine, so both engines follow the same chain.
+        """
+        if document_indices is None:
+            document_indices = np.arange(self.corpus.number_of_documents)
+        random_numbers = self.random_state.random(len(document_indices))
+
+        sample_documents_in_single_iteration(
+            document_indices, self.corpus.document_offsets,
+            self.corpus.unique_word_ids, self.corpus.unique_word_offsets, self.corpus.unique_word_counts,
+            self.document_topic_assignments,
+            self.number_of_documents_in_each_topic,
+            self.number_of_each_word_in_each_topic,
+            self.number_of_total_words_in_each_topic,
+            self.topic_weights,
+            self.alpha, self.beta, self.corpus.vocab.size * self.beta,
+            _get_log_gamma_table(self.beta),
+            self.weight_space == "log",
+            random_numbers
+        )
+
+    def _sample_in_single_alias_iteration(self, document_indices=None):
+        """
+        Sample in a single iteration with Metropolis-Hastings steps.
+
+        Optional Parameters
+        -------------------
+        document_indices : np.ndarray[int], defaults to None
+            The documents to sample, in order. If not given, every
+            document in the corpus is sampled.
+
+        Notes
+        -----
+        - The word proposal tables are rebuilt from the assignments at
+          the start of each iteration, and are stale within it.
+        - Random numbers are drawn in blocks of documents, so that the
+          block stays small however many documents there are.
+        """
+        if document_indices is None:
+            document_indices = np.arange(self.corpus.number_of_documents)
+
+        t0 = time.perf_counter()
+        word_proposal_tables = build_word_proposal_tables(
+            self.corpus.unique_word_ids, self.corpus.unique_word_offsets, self.corpus.unique_word_counts,
+            self.document_topic_assignments, self.corpus.vocab.size, self.number_of_topics)
+        t1 = time.perf_counter()
+
+        for chunk_start in range(0, len(document_indices), self.ALIAS_SAMPLER_CHUNK_SIZE):
+            chunk_of_document_indices = document_indices[chunk_start:chunk_start + self.ALIAS_SAMPLER_CHUNK_SIZE]
+            random_numbers = self.random_state.random((len(chunk_of_document_indices),
+                                                       self.metropolis_hastings_steps, 4))
+            sample_documents_with_metropolis_hastings(
+                chunk_of_document_indices, self.corpus.word_ids, self.corpus.document_offsets,
+                self.corpus.unique_word_ids, self.corpus.unique_word_offsets, self.corpus.unique_word_counts,
+                self.document_topic_assignments,
+                self.number_of_documents_in_each_topic,
+                self.number_of_each_word_in_each_topic,
+                self.number_of_total_words_in_each_topic,
+                self.alpha, self.beta, self.corpus.vocab.size * self.beta,
+                _get_log_gamma_table(self.beta),
+                *word_proposal_tables,
+                random_numbers
+            )
+
+        if self.stats is not None:
+            self.stats.add_phase_time("proposal_tables", t1 - t0)
+            self.stats.add_phase_time("compiled_sweep", time.perf_counter() - t1)
+
+    def _draw_random_topics(self, number_of_documents):
+        """Draw a topic uniformly at random for each of a number of documents."""
+        if self.random_number_generator == "legacy":
+            return self.random_state.randint(0, self.number_of_topics, number_of_documents)
+        return self.random_state.integers(0, self.number_of_topics, number_of_documents)
+
+    def _grow_word_counts(self, vocabulary_size):
+        """
+        Widen the word counts to cover a larger vocabulary.
+
+        The counts are a view of the leading columns of a buffer whose
+        capacity is at least doubled whenever it runs out, so the new
+        columns are usually already allocated and zero.
+        """
+        number_of_each_word_in_each_topic = self.number_of_each_word_in_each_topic
+        current_vocabulary_size = number_of_each_word_in_each_topic.shape[1]
+        if vocabulary_size <= current_vocabulary_size:
+            return
+
+        buffer = self._word_count_buffer
+        if (buffer is None or number_of_each_word_in_each_topic.base is not buffer or
+                buffer.shape[1] < vocabulary_size):
+            capacity = max(vocabulary_size, 2 * current_vocabulary_size)
+            buffer = self._create_word_counts(capacity)
+            buffer[:, :current_vocabulary_size] = number_of_each_word_in_each_topic
+            self._word_count_buffer = buffer
+
+        self.number_of_each_word_in_each_topic = buffer[:, :vocabulary_size]
+
+    def _create_word_counts(self, vocabulary_size):
+        """Create zeroed word counts for a number of words, with the dtype and layout of the model."""
+        order = "C" if self.count_layout == "topic-major" else "F"
+        return np.zeros((self.number_of_topics, vocabulary_size), dtype=self.count_dtype, order=order)
+
+    def _set_count_dtype(self, count_dtype):
+        """Convert the word counts to another dtype, keeping their layout and dropping any spare capacity."""
+        self.count_dtype = count_dtype
+        word_counts = self._create_word_counts(self.number_of_each_word_in_each_topic.shape[1])
+        word_counts[...] = self.number_of_each_word_in_each_topic
+        self.number_of_each_word_in_each_topic = word_counts
+        self._word_count_buffer = None
+
+    def _create_random_state(self, seed=None):
+        """Create a random number generator of the kind owned by the model."""
+        if self.random_number_generator == "legacy":
+            return np.random.RandomState(seed)
+        return np.random.default_rng(seed)
+
+    def _get_random_state_as_json(self):
+        """Get the state of the random number generator as a JSON string."""
+        if self.random_number_generator == "legacy":
+            state = self.random_state.get_state(legacy=False)
+        else:
+            state = self.random_state.bit_generator.state
+
+        return json.dumps(state, default=lambda array: array.tolist())
+
+    def _set_random_state_from_json(self, json_state):
+        """Set the state of the random number generator from a JSON string."""
+        state = json.loads(json_state)
+        if self.random_number_generator == "legacy":
+            state["state"]["key"] = np.array(state["state"]["key"], dtype=np.uint32)
+            self.random_state.set_state(state)
+        else:
+            self.random_state.bit_generator.state = state
 
     def _update_topic_weights_for_document(self, document_index):
-        """Update the topic weights for a particular document."""
-        document = self.corpus[document_index]
-        self.topic_weights = self.number_of_documents_in_each_topic + self.alpha
-        occurrence_to_index_count_for_document = self.corpus.occurrence_to_index_count[document_index]
+        """
+        Update the topic weights for a particular document.
 
-        numerators = (self.number_of_each_word_in_each_topic.take(document, axis=1) + self.beta +
-                      occurrence_to_index_count_for_document - 1)
+        Notes
+        -----
+        - The weights are computed from the distinct words of the
+          document and their counts, using rising factorials rather
+          than a product over every token.
+        """
+        self._compute_topic_weights_for_document(document_index, log_space=False)
+
+    def _update_topic_weights_for_document_in_log_space(self, document_index):
+        """
+        Update the topic weights for a particular document in log space.
+
+        Notes
+        -----
+        - The weights are scaled so that the largest is one, which
+          does not change the distribution they represent.
+        """
+        self._compute_topic_weights_for_document(document_index, log_space=True)
 
-        range_mask = np.arange(len(document)).repeat(self.number_of_topics).reshape(
-            len(document), self.number_of_topics)
-        denominators = range_mask + self.number_of_total_words_in_each_topic + self.corpus.vocab.size * self.beta
+    def _compute_topic_weights_for_document(self, document_index, log_space):
+        """Compute the topic weights for a document in place, from its distinct words."""
+        unique_word_ids, unique_word_counts = self.corpus.get_unique_words(document_index)
+        document_length = len(self.corpus[document_index])
 
-        fractions = numerators / denominators.T
-        self.topic_weights *= fractions.prod(axis=1)
+        compute_topic_weights_for_document(
+            unique_word_ids, unique_word_counts, document_length,
+            self.number_of_documents_in_each_topic,
+            self.number_of_each_word_in_each_topic,
+            self.number_of_total_words_in_each_topic,
+            self.topic_weights,
+            self.alpha, self.beta, self.corpus.vocab.size * self.beta,
+            _get_log_gamma_table(self.beta),
+            log_space
+        )
 
     def _assign_document_to_topic(self, document_index, topic_index):
         """Assign a document to a topic."""
         document = self.corpus[document_index]
+        unique_word_ids, unique_word_counts = self.corpus.get_unique_words(document_index)
         self.number_of_total_words_in_each_topic[topic_index] += len(document)
-        self.number_of_each_word_in_each_topic[topic_index] += self.corpus.word_counts_in_documents[document_index]
+        # Assigning rather than adding in place casts the sum back to narrower counts.
+        number_of_each_word_in_topic = self.number_of_each_word_in_each_topic[topic_index]
+        number_of_each_word_in_topic[unique_word_ids] = (number_of_each_word_in_topic[unique_word_ids] +
+                                                         unique_word_counts)
 
     def _unassign_document_from_topic(self, document_index, topic_index):
         """Un-assign a document from a topic."""
         document = self.corpus[document_index]
+        unique_word_ids, unique_word_counts = self.corpus.get_unique_words(document_index)
         self.number_of_total_words_in_each_topic[topic_index] -= len(document)
-        self.number_of_each_word_in_each_topic[topic_index] -= self.corpus.word_counts_in_documents[document_index]
+        number_of_each_word_in_topic = self.number_of_each_word_in_each_topic[topic_index]
+        number_of_each_word_in_topic[unique_word_ids] = (number_of_each_word_in_topic[unique_word_ids] -
+                                                         unique_word_counts)
+
+
+def _get_indices_of_largest_in_each_row(array, number_of_indices):
+    """
+    Get the indices of the largest values in each row of an integer array, in descending order.
+
+    Ties are broken by the smaller index. The values and their indices
+    are combined into a single key, so that partitioning and sorting
+    by the key orders both at once. Rows are processed in blocks to
+    bound the memory of the keys.
+    """
+    number_of_rows, number_of_columns = array.shape
+    number_of_indices = min(number_of_indices, number_of_columns)
+    indices = np.empty((number_of_rows, number_of_indices), dtype=np.int64)
+    if number_of_indices == 0:
+        return indices
+
+    reversed_column_indices = np.arange(number_of_columns - 1, -1, -1, dtype=np.int64)
+    rows_in_block = max(1, TOP_WORDS_BLOCK_SIZE // number_of_columns)
+    for block_start in range(0, number_of_rows, rows_in_block):
+        keys = array[block_start:block_start + rows_in_block].astype(np.int64, order="C")
+        keys *= number_of_columns
+        keys += reversed_column_indices
+
+        if number_of_indices < number_of_columns:
+            block_indices = np.argpartition(keys, number_of_columns - number_of_indices, axis=1)[:, -number_of_indices:]
+        else:
+            block_indices = np.broadcast_to(np.arange(number_of_columns), keys.shape)
+        block_keys = np.take_along_axis(keys, block_indices, axis=1)
+        order = np.argsort(block_keys, axis=1)[:, ::-1]
+        indices[block_start:block_start + rows_in_block] = np.take_along_axis(block_indices, order, axis=1)
+
+    return indices
+
+
+def _sample_words_without_replacement(cumulative_word_weights, topic_indices, document_offsets, random_state):
+    """
+    Sample the words of documents without replacement, with random numbers drawn from a random state.
+
+    The compiled kernel redraws words already in a document, so the
+    number of random numbers it needs is not known in advance. Each
+    word takes fewer than two draws on average, so blocks of twice
+    the remaining words are drawn, resuming from the first document
+    that a block could not finish and doubling the block whenever it
+    could not finish even one.
+    """
+    word_ids = np.empty(document_offsets[-1], dtype=np.int32)
+    number_of_documents = len(topic_indices)
+    number_of_random_numbers = 2 * document_offsets[-1]
+    document_index = 0
+    while document_index < number_of_documents:
+        random_numbers = random_state.random(number_of_random_numbers)
+        end_document_index = sample_words_without_replacement(cumulative_word_weights, topic_indices,
+                                                              document_offsets, random_numbers, word_ids,
+                                                              document_index)
+        if end_document_index == document_index:
+            number_of_random_numbers *= 2
+        else:
+            number_of_random_numbers = 2 * (document_offsets[-1] - document_offsets[end_document_index])
+        document_index = end_document_index
+
+    return word_ids
+
+
+def _can_hold_word_counts(corpus, count_dtype):
+    """Check whether no word occurs in a corpus more often than a count dtype can hold."""
+    maximum_count = np.iinfo(count_dtype).max
+    if len(corpus.word_ids) <= maximum_count:
+        return True
+    return np.bincount(corpus.word_ids).max() <= maximum_count
+
+
+@lru_cache(maxsize=16)
+def _get_log_gamma_table(beta):
+    """Get a read-only table of the log gamma function of n + beta, shared by every model."""
+    log_gamma_table = compute_log_gamma_table(beta, LOG_GAMMA_TABLE_SIZE)
+    log_gamma_table.flags.writeable = False
+    return log_gamma_table
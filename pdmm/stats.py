@@ -0,0 +1,161 @@
+"""
+Contains the SamplerStats class.
+"""
+from collections import namedtuple
+
+SweepStats = namedtuple("SweepStats", ["sweep", "seconds", "number_of_documents", "number_of_tokens",
+                                       "documents_per_second", "tokens_per_second", "topic_change_rate"])
+SweepStats.__doc__ = """
+The statistics of a single sweep over some or all of the documents.
+
+Attributes
+----------
+sweep : int
+    The number of sweeps recorded so far, including this one.
+seconds : float
+    The time taken by the sweep.
+number_of_documents : int
+    The number of documents sampled.
+number_of_tokens : int
+    The number of tokens in the documents sampled.
+documents_per_second : float
+    The number of documents sampled per second.
+tokens_per_second : float
+    The number of tokens sampled per second.
+topic_change_rate : float
+    The fraction of the documents sampled whose topic changed.
+"""
+
+
+class SamplerStats:
+    """
+    Counters and cumulative timers for the phases of sampling.
+
+    The phases timed depend on the engine. The "python" engine times
+    each step of sampling a document separately, whereas the compiled
+    engines run a whole sweep in one call, which is timed as a single
+    phase.
+
+    Attributes
+    ----------
+    phase_seconds : dict[str, float]
+        The cumulative time spent in each phase.
+    phase_calls : dict[str, int]
+        The number of times each phase has been run.
+    sweeps : list[SweepStats]
+        The statistics of every sweep recorded.
+    """
+    PHASES = ("random_numbers", "unassign", "weights", "sample", "assign", "proposal_tables", "compiled_sweep")
+
+    def __init__(self):
+        self.phase_seconds = dict.fromkeys(self.PHASES, 0.0)
+        self.phase_calls = dict.fromkeys(self.PHASES, 0)
+        self.sweeps = []
+
+    @property
+    def number_of_sweeps(self):
+        """Return the number of sweeps recorded."""
+        return len(self.sweeps)
+
+    @property
+    def seconds(self):
+        """Return the total time spent sampling."""
+        return sum(sweep.seconds for sweep in self.sweeps)
+
+    @property
+    def number_of_documents(self):
+        """Return the total number of documents sampled."""
+        return sum(sweep.number_of_documents for sweep in self.sweeps)
+
+    @property
+    def number_of_tokens(self):
+        """Return the total number of tokens sampled."""
+        return sum(sweep.number_of_tokens for sweep in self.sweeps)
+
+    @property
+    def documents_per_second(self):
+        """Return the mean number of documents sampled per second."""
+        return _get_rate(self.number_of_documents, self.seconds)
+
+    @property
+    def tokens_per_second(self):
+        """Return the mean number of tokens sampled per second."""
+        return _get_rate(self.number_of_tokens, self.seconds)
+
+    def add_phase_time(self, phase, seconds, calls=1):
+        """
+        Add time spent in a phase.
+
+        Parameters
+        ----------
+        phase : str
+            The phase, which must be one of `PHASES`.
+        seconds : float
+            The time spent in the phase.
+
+        Optional Parameters
+        -------------------
+        calls : int, defaults to 1
+            The number of times the phase was run in that time.
+        """
+        self.phase_seconds[phase] += seconds
+        self.phase_calls[phase] += calls
+
+    def add_sweep(self, seconds, number_of_documents, number_of_tokens, number_of_topic_changes):
+        """
+        Record a sweep over some or all of the documents.
+
+        Parameters
+        ----------
+        seconds : float
+            The time taken by the sweep.
+        number_of_documents : int
+            The number of documents sampled.
+        number_of_tokens : int
+            The number of tokens in the documents sampled.
+        number_of_topic_changes : int
+            The number of documents whose topic changed.
+
+        Returns
+        -------
+        sweep_stats : SweepStats
+            The statistics of the sweep.
+        """
+        sweep_stats = SweepStats(
+            self.number_of_sweeps + 1,
+            seconds,
+            number_of_documents,
+            number_of_tokens,
+            _get_rate(number_of_documents, seconds),
+            _get_rate(number_of_tokens, seconds),
+            number_of_topic_changes / number_of_documents if number_of_documents else 0.0
+        )
+        self.sweeps.append(sweep_stats)
+        return sweep_stats
+
+    def to_dict(self):
+        """Get the totals and the time spent in each phase that has been run, for reporting."""
+        return {
+            "number_of_sweeps": self.number_of_sweeps,
+            "seconds": self.seconds,
+            "number_of_documents": self.number_of_documents,
+            "number_of_tokens": self.number_of_tokens,
+            "documents_per_second": self.documents_per_second,
+            "tokens_per_second": self.tokens_per_second,
+            "phase_seconds": {phase: seconds for phase, seconds in self.phase_seconds.items()
+                              if self.phase_calls[phase]},
+            "phase_calls": {phase: calls for phase, calls in self.phase_calls.items() if calls},
+        }
+
+    def summary(self):
+        """Get a one-line summary of the totals and the share of time spent in each phase."""
+        seconds = self.seconds
+        phases = ", ".join("{} {:.1%}".format(phase, phase_seconds / seconds if seconds else 0.0)
+                           for phase, phase_seconds in self.to_dict()["phase_seconds"].items())
+        return "{} sweeps in {:.3f}s: {:.0f} documents/s, {:.0f} tokens/s ({})".format(
+            self.number_of_sweeps, seconds, self.documents_per_second, self.tokens_per_second, phases)
+
+
+def _get_rate(count, seconds):
+    """Get a count per second, which is zero if no time has passed."""
+    return count / seconds if seconds > 0 else 0.0
@@ -0,0 +1,127 @@
+"""
+Contains functions for saving and loading versioned binary array files.
+
+Each file starts with an eight byte magic string, a format version and a JSON
+header describing every array, followed by the raw array data. The data of each
+array is aligned so that it can be memory mapped directly with `np.memmap`,
+allowing many processes to share a single page-cached copy.
+"""
+import json
+import struct
+
+import numpy as np
+
+ALIGNMENT = 64
+PREAMBLE = struct.Struct("<8sII")
+
+
+class UnsupportedFormatError(ValueError):
+    """Raised when a file is not of the expected type or version."""
+
+
+def is_array_file(file_path, magic):
+    """Check whether a file starts with the given magic string."""
+    try:
+        with open(file_path, "rb") as rf:
+            return rf.read(len(magic)) == magic
+    except OSError:
+        return False
+
+
+def write_array_file(file_path, magic, version, arrays, metadata=None):
+    """
+    Save arrays and metadata to a binary array file.
+
+    Parameters
+    ----------
+    file_path : str
+        The location at which to save the file.
+    magic : bytes
+        The eight byte string identifying the type of file.
+    version : int
+        The version of the format.
+    arrays : dict[str, np.ndarray]
+        The arrays to save, by name.
+
+    Optional Parameters
+    -------------------
+    metadata : dict, defaults to None
+        Any JSON-serialisable metadata to save alongside the arrays.
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    header = {"metadata": metadata or {}, "arrays": {}}
+
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _align(offset + array.nbytes)
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(PREAMBLE.size + len(header_bytes))
+
+    with open(file_path, "wb") as wf:
+        wf.write(PREAMBLE.pack(magic, version, len(header_bytes)))
+        wf.write(header_bytes)
+        for name, array in arrays.items():
+            wf.seek(data_start + header["arrays"][name]["offset"])
+            wf.write(array.tobytes())
+        wf.truncate(data_start + offset)
+
+
+def read_array_file(file_path, magic, version, mmap=True):
+    """
+    Load arrays and metadata from a binary array file.
+
+    Parameters
+    ----------
+    file_path : str
+        The location of the file.
+    magic : bytes
+        The eight byte string identifying the type of file.
+    version : int
+        The version of the format that can be read.
+
+    Optional Parameters
+    -------------------
+    mmap : bool, defaults to True
+        Whether to memory map the arrays read-only rather than
+        reading them into memory.
+
+    Returns
+    -------
+    arrays : dict[str, np.ndarray]
+        The saved arrays, by name.
+    metadata : dict
+        The saved metadata.
+    """
+    with open(file_path, "rb") as rf:
+        file_magic, file_version, header_length = PREAMBLE.unpack(rf.read(PREAMBLE.size))
+        if file_magic != magic:
+            raise UnsupportedFormatError("{} is not a {} file.".format(file_path, magic.decode("ascii")))
+        if file_version != version:
+            raise UnsupportedFormatError("{} has format version {}, but only version {} is supported.".format(
+                file_path, file_version, version))
+        header = json.loads(rf.read(header_length).decode("utf-8"))
+
+    data_start = _align(PREAMBLE.size + header_length)
+    arrays = {}
+
+    for name, description in header["arrays"].items():
+        dtype = np.dtype(description["dtype"])
+        shape = tuple(description["shape"])
+        offset = data_start + description["offset"]
+
+        if not np.prod(shape, dtype=np.int64):
+            arrays[name] = np.empty(shape, dtype=dtype)
+        elif mmap:
+            arrays[name] = np.memmap(file_path, dtype=dtype, mode="r", offset=offset, shape=shape)
+        else:
+            count = int(np.prod(shape, dtype=np.int64))
+            arrays[name] = np.fromfile(file_path, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+    return arrays, header["metadata"]
+
+
+def _align(offset):
+    """Round an offset up to the next multiple of the alignment."""
+    return -(-offset // ALIGNMENT) * ALIGNMENT
@@ -42,7 +42,10 @@ def sample_from_cumulative_weights(cumulative_weights, random_number):
 @njit(fastmath=True)
 def sample_many_from_cumulative_weights(cumulative_weights, random_numbers):
     """
-    Sample from a multinomial using linear search method.
+    Sample many values from a multinomial using binary search.
+
+    Each search stops after a number of steps logarithmic in the
+    number of weights, and no temporary arrays are allocated.
 
     Parameters
     ----------
@@ -56,18 +59,148 @@ def sample_many_from_cumulative_weights(cumulative_weights, random_numbers):
     sampled_values : np.array[int]
         The sampled values.
     """
-    number_of_weights = cumulative_weights.shape[0]
-    scaled_random_numbers = random_numbers * cumulative_weights[-1]
+    sampled_values = np.empty(random_numbers.shape[0], dtype=np.int32)
+    for index in range(random_numbers.shape[0]):
+        sampled_values[index] = sample_from_cumulative_weights(cumulative_weights, random_numbers[index])
+    return sampled_values
 
-    counters = np.zeros_like(random_numbers, dtype=np.int32)
-    maximum_counter_value = number_of_weights - 1
-    upper_bounds = number_of_weights - np.ones_like(random_numbers, dtype=np.int32)
 
-    for _ in range(maximum_counter_value):
-        mid_values = (counters + ((upper_bounds - counters) // 2)).astype(np.int32)
-        indicators = scaled_random_numbers > cumulative_weights[mid_values]
-        counters = (indicators * mid_values) + ((np.int32(1) - indicators) * counters) + indicators
-        upper_bounds = (indicators * upper_bounds) + ((np.int32(1) - indicators) * mid_values)
+@njit(fastmath=True)
+def sample_many_from_rows_of_cumulative_weights(cumulative_weights, row_indices, random_numbers):
+    """
+    Sample many values, each from its own row of a matrix of multinomials.
+
+    Parameters
+    ----------
+    cumulative_weights : np.ndarray[float, float]
+        The cumulative weights for each multinomial, one per row.
+    row_indices : np.ndarray[int]
+        The row from which to sample each value.
+    random_numbers : np.ndarray[float]
+        The random numbers to be used, one for each value.
+
+    Returns
+    -------
+    sampled_values : np.array[int]
+        The sampled values.
+    """
+    sampled_values = np.empty(random_numbers.shape[0], dtype=np.int32)
+    for index in range(random_numbers.shape[0]):
+        sampled_values[index] = sample_from_cumulative_weights(cumulative_weights[row_indices[index]],
+                                                               random_numbers[index])
+    return sampled_values
+
+
+@njit
+def build_alias_table(weights, alias_probabilities, alias_indices):
+    """
+    Build an alias table for sampling from a multinomial in constant time.
+
+    This uses Vose's method, filling the given arrays in place.
+
+    Parameters
+    ----------
+    weights : np.ndarray[float]
+        The non-negative weights for the multinomial, of which at
+        least one must be positive.
+    alias_probabilities : np.ndarray[float]
+        The array in which to write the probability of keeping each
+        index rather than taking its alias.
+    alias_indices : np.ndarray[int]
+        The array in which to write the alias of each index.
+    """
+    number_of_weights = weights.shape[0]
+    scaled_weights = weights * (number_of_weights / weights.sum())
+    small_indices = np.empty(number_of_weights, dtype=np.int64)
+    large_indices = np.empty(number_of_weights, dtype=np.int64)
+    number_of_small_indices = 0
+    number_of_large_indices = 0
+
+    for index in range(number_of_weights):
+        if scaled_weights[index] < 1.0:
+            small_indices[number_of_small_indices] = index
+            number_of_small_indices += 1
+        else:
+            large_indices[number_of_large_indices] = index
+            number_of_large_indices += 1
+
+    while number_of_small_indices and number_of_large_indices:
+        number_of_small_indices -= 1
+        number_of_large_indices -= 1
+        small_index = small_indices[number_of_small_indices]
+        large_index = large_indices[number_of_large_indices]
+
+        alias_probabilities[small_index] = scaled_weights[small_index]
+        alias_indices[small_index] = large_index
+        scaled_weights[large_index] += scaled_weights[small_index] - 1.0
 
-    sampled_values = counters
+        if scaled_weights[large_index] < 1.0:
+            small_indices[number_of_small_indices] = large_index
+            number_of_small_indices += 1
+        else:
+            large_indices[number_of_large_indices] = large_index
+            number_of_large_indices += 1
+
+    # Whatever remains is one up to rounding.
+    for position in range(number_of_large_indices):
+        alias_probabilities[large_indices[position]] = 1.0
+        alias_indices[large_indices[position]] = large_indices[position]
+    for position in range(number_of_small_indices):
+        alias_probabilities[small_indices[position]] = 1.0
+        alias_indices[small_indices[position]] = small_indices[position]
+
+
+@njit
+def sample_from_alias_table(alias_probabilities, alias_indices, random_number):
+    """
+    Sample from a multinomial using an alias table.
+
+    Parameters
+    ----------
+    alias_probabilities : np.ndarray[float]
+        The probability of keeping each index, from `build_alias_table`.
+    alias_indices : np.ndarray[int]
+        The alias of each index, from `build_alias_table`.
+    random_number : float
+        The random number in [0, 1) to be used.
+
+    Returns
+    -------
+    sampled_value : int
+        The sampled value.
+    """
+    scaled_random_number = random_number * alias_probabilities.shape[0]
+    index = min(int(scaled_random_number), alias_probabilities.shape[0] - 1)
+    if scaled_random_number - index < alias_probabilities[index]:
+        return index
+    return alias_indices[index]
+
+
+@njit
+def sample_many_from_alias_table(alias_probabilities, alias_indices, random_numbers):
+    """
+    Sample many values from a multinomial using an alias table.
+
+    This takes constant time for each value, so is preferable to
+    binary search when drawing many values from one large multinomial.
+    The values differ from those of `sample_many_from_cumulative_weights`
+    for the same random numbers.
+
+    Parameters
+    ----------
+    alias_probabilities : np.ndarray[float]
+        The probability of keeping each index, from `build_alias_table`.
+    alias_indices : np.ndarray[int]
+        The alias of each index, from `build_alias_table`.
+    random_numbers : np.ndarray[float]
+        The random numbers in [0, 1) to be used.
+
+    Returns
+    -------
+    sampled_values : np.array[int]
+        The sampled values.
+    """
+    sampled_values = np.empty(random_numbers.shape[0], dtype=np.int32)
+    for index in range(random_numbers.shape[0]):
+        sampled_values[index] = sample_from_alias_table(alias_probabilities, alias_indices, random_numbers[index])
     return sampled_values
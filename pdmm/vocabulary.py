@@ -1,80 +1,366 @@
 """
-Contains the Vocabulary class.
+Contains the Vocabulary and PackedVocabulary classes.
 """
+import zlib
+
+import numpy as np
+
+from .kernels import build_word_table, look_up_words
 
 
 class Vocabulary:
     """
     Represents a corpus vocabulary.
+
+    By default each new word is given the next id, so the vocabulary
+    grows with the corpus. Alternatively, words can be hashed into a
+    fixed number of buckets, which bounds the size of the vocabulary,
+    and so of every model built on it, however many distinct words a
+    stream contains. Words sharing a bucket share an id, and each
+    bucket is named by the first word seen in it.
+
+    Optional Parameters
+    -------------------
+    number_of_buckets : int, optional
+        The number of buckets into which to hash words. The default of
+        None gives each distinct word its own id.
     """
-    def __init__(self):
-        self._word_to_id = {}
-        self._id_to_word = {}
-        self._count = 0
+    def __init__(self, number_of_buckets=None):
+        if number_of_buckets is not None and number_of_buckets < 1:
+            raise ValueError("number_of_buckets must be positive, not {!r}.".format(number_of_buckets))
+
+        self.number_of_buckets = number_of_buckets
+        self._id_to_word = [] if number_of_buckets is None else [""] * number_of_buckets
+        self._word_to_id = _WordIds(self._id_to_word)
 
     def __eq__(self, other):
+        if isinstance(other, PackedVocabulary):
+            return other == self
         if not type(other) == type(self):
             raise TypeError("Can only compare to {} type.".format(type(self).__name__))
 
-        if self.size != other.size:
-            return False
-
-        for index in range(self._count):
-            if self.get_word_from_id(index) != other.get_word_from_id(index):
-                return False
-        else:
-            return True
+        return self.number_of_buckets == other.number_of_buckets and self._id_to_word == other._id_to_word
 
     @property
     def size(self):
         """Get the size of the vocabulary."""
-        return self._count
+        return len(self._id_to_word)
+
+    @property
+    def is_hashed(self):
+        """Return whether words are hashed into a fixed number of buckets."""
+        return self.number_of_buckets is not None
 
     def get_id_from_word(self, word):
-        """Get a vocabulary id from a word."""
-        try:
-            word_id = self._word_to_id[word]
-        except KeyError:
-            word_id = self._add_new_word_and_return_id(word)
-        return word_id
+        """Get a vocabulary id from a word, adding the word if it is missing."""
+        if self.is_hashed:
+            word_id = _hash_word(word) % self.number_of_buckets
+            if not self._id_to_word[word_id]:
+                self._id_to_word[word_id] = word
+            return word_id
+        return self._word_to_id[word]
+
+    def get_existing_id_from_word(self, word, default=-1):
+        """Get a vocabulary id from a word, without adding words that are missing."""
+        if self.is_hashed:
+            return _hash_word(word) % self.number_of_buckets
+        return self._word_to_id.get(word, default)
 
     def get_word_from_id(self, word_id):
         """Get a word from its vocabulary id."""
         return self._id_to_word[word_id]
 
+    def existing_ids_from_words(self, list_of_words, default=-1):
+        """
+        Get the vocabulary ids of many words at once, without adding words that are missing.
+
+        Parameters
+        ----------
+        list_of_words : list[str]
+            The words, in any order and with repeats.
+
+        Optional Parameters
+        -------------------
+        default : int, defaults to -1
+            The id given to words missing from the vocabulary.
+
+        Returns
+        -------
+        word_ids : np.ndarray[np.int32]
+            The id of each word.
+        """
+        if self.is_hashed:
+            hashes = np.fromiter(map(_hash_word, list_of_words), dtype=np.int64, count=len(list_of_words))
+            return (hashes % self.number_of_buckets).astype(np.int32)
+        get_id = self._word_to_id.get
+        return np.fromiter((get_id(word, default) for word in list_of_words), dtype=np.int32,
+                           count=len(list_of_words))
+
+    def ids_from_words(self, list_of_words):
+        """
+        Get the vocabulary ids of many words at once, adding those that are missing.
+
+        This is much faster than calling `get_id_from_word` for each
+        word, as the words are looked up without a Python call each.
+
+        Parameters
+        ----------
+        list_of_words : list[str]
+            The words, in any order and with repeats.
+
+        Returns
+        -------
+        word_ids : np.ndarray[np.int32]
+            The id of each word.
+        """
+        if not self.is_hashed:
+            return np.fromiter(map(self._word_to_id.__getitem__, list_of_words), dtype=np.int32,
+                               count=len(list_of_words))
+
+        hashes = np.fromiter(map(_hash_word, list_of_words), dtype=np.int64, count=len(list_of_words))
+        word_ids = (hashes % self.number_of_buckets).astype(np.int32)
+        buckets, first_indices = np.unique(word_ids, return_index=True)
+        for bucket, first_index in zip(buckets.tolist(), first_indices.tolist()):
+            if not self._id_to_word[bucket]:
+                self._id_to_word[bucket] = list_of_words[first_index]
+        return word_ids
+
+    def words_from_ids(self, word_ids):
+        """
+        Get the words of many vocabulary ids at once.
+
+        Parameters
+        ----------
+        word_ids : iterable[int]
+            The vocabulary ids.
+
+        Returns
+        -------
+        list_of_words : list[str]
+            The word of each id.
+        """
+        return list(map(self._id_to_word.__getitem__, np.asarray(word_ids, dtype=np.int64).tolist()))
+
     def save_to_file(self, file_path):
         """Save the vocabulary to a file."""
         with open(file_path, "w") as wf:
-            for index in range(self._count):
-                word = self._id_to_word[index]
-                line = word + "\n"
-                wf.write(line)
+            wf.writelines(word + "\n" for word in self._id_to_word)
+
+    def to_packed_arrays(self):
+        """
+        Pack the words into a flat array of UTF-8 bytes.
+
+        Returns
+        -------
+        word_bytes : np.ndarray[np.uint8]
+            The UTF-8 encoded words, concatenated in id order.
+        word_offsets : np.ndarray[np.int64]
+            The offsets of each word within `word_bytes`.
+        """
+        encoded_words = [word.encode("utf-8") for word in self._id_to_word]
+        word_offsets = np.zeros(len(encoded_words) + 1, dtype=np.int64)
+        np.cumsum([len(encoded_word) for encoded_word in encoded_words], out=word_offsets[1:])
+        word_bytes = np.frombuffer(b"".join(encoded_words), dtype=np.uint8)
+        return word_bytes, word_offsets
 
     @classmethod
-    def from_list_of_words(cls, list_of_words):
-        """Create a vocabulary from a list of words."""
-        vocab = cls()
-        for word in list_of_words:
-            vocab._add_new_word_and_return_id(word)
+    def from_packed_arrays(cls, word_bytes, word_offsets, number_of_buckets=None):
+        """
+        Create a vocabulary from the arrays made by `to_packed_arrays`.
+
+        Optional Parameters
+        -------------------
+        number_of_buckets : int, optional
+            The number of buckets of a hashed vocabulary, which must
+            equal the number of words packed.
+        """
+        packed_words = np.asarray(word_bytes).tobytes()
+        offsets = np.asarray(word_offsets).tolist()
+        list_of_words = [packed_words[start:end].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])]
+        return cls.from_list_of_words(list_of_words, number_of_buckets=number_of_buckets)
+
+    @classmethod
+    def from_list_of_words(cls, list_of_words, number_of_buckets=None):
+        """
+        Create a vocabulary from a list of words, in id order.
+
+        Optional Parameters
+        -------------------
+        number_of_buckets : int, optional
+            The number of buckets of a hashed vocabulary, in which case
+            the list holds the word naming each bucket.
+        """
+        vocab = cls(number_of_buckets=number_of_buckets)
+        if vocab.is_hashed:
+            if len(list_of_words) != number_of_buckets:
+                raise ValueError("A hashed vocabulary needs a word for each of its {} buckets, not {}.".format(
+                    number_of_buckets, len(list_of_words)))
+            vocab._id_to_word[:] = list_of_words
+        else:
+            vocab._id_to_word.extend(list_of_words)
+            vocab._word_to_id.update(zip(list_of_words, range(len(list_of_words))))
 
         return vocab
 
     @classmethod
     def load_from_file(cls, file_path):
         """Load an instance from a vocabulary file."""
-        vocab = cls()
-
         with open(file_path, "r") as rf:
-            for line in rf.readlines():
-                word = line.rstrip()
-                vocab._add_new_word_and_return_id(word)
+            list_of_words = [line.rstrip() for line in rf]
 
-        return vocab
+        return cls.from_list_of_words(list_of_words)
 
     def _add_new_word_and_return_id(self, word):
         """Add a new word to the vocabulary, and return the id."""
-        new_word_id = self._count
+        new_word_id = len(self._id_to_word)
         self._word_to_id[word] = new_word_id
-        self._id_to_word[new_word_id] = word
-        self._count += 1
+        self._id_to_word.append(word)
         return new_word_id
+
+
+class PackedVocabulary:
+    """
+    A read-only vocabulary held in flat arrays, which may be memory mapped.
+
+    The words are kept as packed UTF-8 bytes alongside an open-addressing
+    hash table of their ids, so words are looked up and decoded straight
+    from the arrays. Nothing is built per process, so a vocabulary
+    loaded from a memory mapped file is ready at once, and processes
+    loading the same file share one copy.
+
+    Parameters
+    ----------
+    word_bytes : np.ndarray[np.uint8]
+        The UTF-8 encoded words, concatenated in id order.
+    word_offsets : np.ndarray[np.int64]
+        The offsets of each word within `word_bytes`.
+
+    Optional Parameters
+    -------------------
+    word_table : np.ndarray[np.int32], optional
+        The hash table from `pdmm.kernels.build_word_table`, which is
+        built if not given. It is not needed by a hashed vocabulary.
+    number_of_buckets : int, optional
+        The number of buckets of a hashed vocabulary, into which missing
+        words are hashed as by `Vocabulary`.
+    """
+    def __init__(self, word_bytes, word_offsets, word_table=None, number_of_buckets=None):
+        self.word_bytes = word_bytes
+        self.word_offsets = word_offsets
+        self.number_of_buckets = number_of_buckets
+        if word_table is None and number_of_buckets is None:
+            word_table = build_word_table(word_bytes, word_offsets)
+        self.word_table = word_table
+
+    def __eq__(self, other):
+        if not isinstance(other, (Vocabulary, PackedVocabulary)):
+            raise TypeError("Can only compare to {} type.".format(type(self).__name__))
+
+        other_word_bytes, other_word_offsets = other.to_packed_arrays()
+        return (self.number_of_buckets == other.number_of_buckets and
+                np.array_equal(self.word_offsets, other_word_offsets) and
+                np.array_equal(self.word_bytes, other_word_bytes))
+
+    @classmethod
+    def from_vocabulary(cls, vocabulary):
+        """Pack a vocabulary."""
+        return cls(*vocabulary.to_packed_arrays(), number_of_buckets=vocabulary.number_of_buckets)
+
+    @property
+    def size(self):
+        """Get the size of the vocabulary."""
+        return len(self.word_offsets) - 1
+
+    @property
+    def is_hashed(self):
+        """Return whether words are hashed into a fixed number of buckets."""
+        return self.number_of_buckets is not None
+
+    def get_existing_id_from_word(self, word, default=-1):
+        """Get a vocabulary id from a word."""
+        return int(self.existing_ids_from_words([word], default=default)[0])
+
+    def existing_ids_from_words(self, list_of_words, default=-1):
+        """
+        Get the vocabulary ids of many words at once.
+
+        Parameters
+        ----------
+        list_of_words : list[str]
+            The words, in any order and with repeats.
+
+        Optional Parameters
+        -------------------
+        default : int, defaults to -1
+            The id given to words missing from the vocabulary.
+
+        Returns
+        -------
+        word_ids : np.ndarray[np.int32]
+            The id of each word.
+        """
+        if self.is_hashed:
+            hashes = np.fromiter(map(_hash_word, list_of_words), dtype=np.int64, count=len(list_of_words))
+            return (hashes % self.number_of_buckets).astype(np.int32)
+
+        encoded_words = [word.encode("utf-8") for word in list_of_words]
+        query_offsets = np.zeros(len(encoded_words) + 1, dtype=np.int64)
+        np.cumsum([len(encoded_word) for encoded_word in encoded_words], out=query_offsets[1:])
+        query_bytes = np.frombuffer(b"".join(encoded_words), dtype=np.uint8)
+        return look_up_words(self.word_bytes, self.word_offsets, self.word_table, query_bytes, query_offsets,
+                             default)
+
+    def get_word_from_id(self, word_id):
+        """Get a word from its vocabulary id."""
+        return self.word_bytes[self.word_offsets[word_id]:self.word_offsets[word_id + 1]].tobytes().decode("utf-8")
+
+    def words_from_ids(self, word_ids):
+        """
+        Get the words of many vocabulary ids at once.
+
+        Parameters
+        ----------
+        word_ids : iterable[int]
+            The vocabulary ids.
+
+        Returns
+        -------
+        list_of_words : list[str]
+            The word of each id.
+        """
+        return list(map(self.get_word_from_id, np.asarray(word_ids, dtype=np.int64).tolist()))
+
+    def save_to_file(self, file_path):
+        """Save the vocabulary to a file."""
+        with open(file_path, "w") as wf:
+            wf.writelines(word + "\n" for word in self.words_from_ids(range(self.size)))
+
+    def to_packed_arrays(self):
+        """
+        Get the packed words.
+
+        Returns
+        -------
+        word_bytes : np.ndarray[np.uint8]
+            The UTF-8 encoded words, concatenated in id order.
+        word_offsets : np.ndarray[np.int64]
+            The offsets of each word within `word_bytes`.
+        """
+        return self.word_bytes, self.word_offsets
+
+
+class _WordIds(dict):
+    """A mapping from words to ids, which gives each missing word looked up the next id."""
+    def __init__(self, id_to_word):
+        super().__init__()
+        self.id_to_word = id_to_word
+
+    def __missing__(self, word):
+        word_id = self[word] = len(self.id_to_word)
+        self.id_to_word.append(word)
+        return word_id
+
+
+def _hash_word(word):
+    """Hash a word to an unsigned 32-bit integer which is the same in every process."""
+    return zlib.crc32(word.encode("utf-8"))
@@ -19,6 +19,7 @@ setuptools.setup(
     url="https://github.com/gchqdev227/pDMM",
     packages=[pdmm.__name__],
     install_requires=["coverage", "numba", "numpy"],
+    extras_require={"parquet": ["pyarrow"]},
     python_requires=">=3.4",
     classifiers=[
         "Development Status :: 4 - Beta",
@@ -7,7 +7,8 @@ import unittest
 
 import numpy as np
 
-from pdmm import Corpus
+import pdmm
+from pdmm import Corpus, Vocabulary
 
 
 class CreationTests(unittest.TestCase):
@@ -37,13 +38,58 @@ class CreationTests(unittest.TestCase):
         self.assertListEqual(expected_occurrence_to_index_count, self.corpus.occurrence_to_index_count)
 
     def test_correct_word_counts(self):
-        """Test that the correct word count matrix has been created."""
-        expected_word_counts_in_documents = np.array([
-            [1, 1, 1, 1, 0, 0, 0, 0],
-            [0, 0, 0, 0, 1, 1, 0, 0],
-            [1, 0, 0, 0, 0, 0, 2, 1]
-        ])
-        self.assertTrue(np.alltrue(expected_word_counts_in_documents == self.corpus.word_counts_in_documents))
+        """Test that the correct distinct words and counts have been created."""
+        expected_unique_words = [[0, 1, 2, 3], [4, 5], [0, 6, 7]]
+        expected_unique_counts = [[1, 1, 1, 1], [1, 1], [1, 2, 1]]
+
+        for document_index in range(self.corpus.number_of_documents):
+            unique_word_ids, unique_word_counts = self.corpus.get_unique_words(document_index)
+            self.assertListEqual(expected_unique_words[document_index], list(unique_word_ids))
+            self.assertListEqual(expected_unique_counts[document_index], list(unique_word_counts))
+
+    def test_correct_offsets(self):
+        """Test that the document offsets into the flat word array are correct."""
+        self.assertListEqual([0, 4, 6, 10], list(self.corpus.document_offsets))
+        self.assertListEqual([0, 6, 6, 7], list(self.corpus[2]))
+
+    def test_appending_documents(self):
+        """Test that appended documents match a corpus created with them from the start."""
+        new_documents = [["the", "new", "fox"], ["dog"]]
+        document_indices = self.corpus.append_documents(new_documents)
+
+        self.assertEqual(document_indices, range(3, 5))
+        self.assertEqual(self.corpus, Corpus.from_iterable_of_word_lists(self.list_of_documents + new_documents))
+
+    def test_removing_oldest_documents(self):
+        """Test that removing the oldest documents keeps the rest and the vocabulary."""
+        self.corpus.remove_oldest_documents(2)
+
+        self.assertListEqual([[0, 6, 6, 7]], self.corpus.documents)
+        self.assertListEqual([[1, 1, 2, 1]], self.corpus.occurrence_to_index_count)
+        unique_word_ids, unique_word_counts = self.corpus.get_unique_words(0)
+        self.assertListEqual([0, 6, 7], list(unique_word_ids))
+        self.assertListEqual([1, 2, 1], list(unique_word_counts))
+        self.assertEqual(self.corpus.vocab.size, 8)
+
+    def test_slicing(self):
+        """Test that slicing gives a corpus of the chosen documents, sharing arrays for contiguous slices."""
+        for item in [slice(1, 3), slice(None, -1), slice(None, None, 2), slice(None, None, -1), slice(2, 1)]:
+            with self.subTest(item=item):
+                corpus = self.corpus[item]
+                self.assertIsInstance(corpus, Corpus)
+                self.assertIs(corpus.vocab, self.corpus.vocab)
+                self.assertListEqual(corpus.documents, self.corpus.documents[item])
+                self.assertListEqual(corpus.occurrence_to_index_count, self.corpus.occurrence_to_index_count[item])
+                for document_index, original_document_index in enumerate(range(3)[item]):
+                    for unique_words, original_unique_words in zip(
+                            corpus.get_unique_words(document_index),
+                            self.corpus.get_unique_words(original_document_index)):
+                        self.assertListEqual(unique_words.tolist(), original_unique_words.tolist())
+
+        corpus = self.corpus[1:]
+        self.assertTrue(np.shares_memory(corpus.word_ids, self.corpus.word_ids))
+        self.assertTrue(np.shares_memory(corpus.unique_word_ids, self.corpus.unique_word_ids))
+        self.assertEqual(corpus.get_mean_document_length(), 3)
 
     def test_creation_from_file(self):
         """Test that a Corpus instance is properly created from a file."""
@@ -57,6 +103,227 @@ class CreationTests(unittest.TestCase):
         corpus_from_documents = Corpus.from_iterable_of_word_lists(self.list_of_documents)
         self.assertEqual(corpus_from_documents, corpus_from_file, "Loaded corpus is not correct.")
 
+    def test_creation_from_file_in_small_chunks(self):
+        """Test that streaming a file a few characters at a time gives the same Corpus."""
+        file_path = os.path.join(self.tempdir.name, "file")
+        with open(file_path, "w") as wf:
+            for document in self.list_of_documents:
+                line = " ".join(document) + "\n"
+                wf.write(line)
+
+        corpus_from_file = Corpus.from_document_file(file_path, chunk_size=5)
+        self.assertEqual(self.corpus, corpus_from_file, "Loaded corpus is not correct.")
+
+    def test_creation_in_small_batches_of_words(self):
+        """Test that looking words up a few at a time gives the same word ids and offsets."""
+        word_ids, document_offsets = pdmm.corpus._get_word_id_arrays(self.list_of_documents,
+                                                                     Vocabulary().ids_from_words, batch_size=3)
+        np.testing.assert_array_equal(self.corpus.word_ids, word_ids)
+        np.testing.assert_array_equal(self.corpus.document_offsets, document_offsets)
+
+    def test_compact_dtypes(self):
+        """Test that the token arrays are stored in compact integer types."""
+        self.assertEqual(np.int32, self.corpus.word_ids.dtype)
+        self.assertEqual(np.uint16, self.corpus.occurrence_indices.dtype)
+
+    def test_occurrences_in_very_long_documents(self):
+        """Test that occurrences beyond the range of 16-bit integers are widened rather than wrapped."""
+        corpus = Corpus.from_iterable_of_word_lists([["the"], ["a"] * 70000 + ["the"]])
+        self.assertEqual(np.uint32, corpus.occurrence_indices.dtype)
+        self.assertListEqual(list(range(1, 70001)) + [1], corpus.get_occurrence_indices(1).tolist())
+
+
+class BinaryTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before every test."""
+        self.corpus = Corpus.from_document_file("tests/data/sample_data")
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tempdir.name, "corpus.bin")
+        self.corpus.save_binary(self.file_path)
+
+    def tearDown(self):
+        """Code to run after every test."""
+        self.tempdir.cleanup()
+
+    def test_saving_and_loading(self):
+        """Test that a binary corpus is loaded identically with and without memory mapping."""
+        for mmap in (True, False):
+            loaded_corpus = Corpus.load_binary(self.file_path, mmap=mmap)
+            self.assertEqual(self.corpus, loaded_corpus, "Loaded corpus is not correct.")
+
+    def test_saving_and_loading_hashed_vocabulary(self):
+        """Test that a corpus with a hashed vocabulary keeps hashing new words once loaded."""
+        corpus = Corpus.from_document_file("tests/data/sample_data", vocabulary=Vocabulary(number_of_buckets=256))
+        self.assertEqual(256, corpus.vocab.size)
+        corpus.save_binary(self.file_path)
+        loaded_corpus = Corpus.load_binary(self.file_path)
+        self.assertEqual(corpus, loaded_corpus, "Loaded corpus is not correct.")
+        self.assertEqual(corpus.vocab.get_existing_id_from_word("unseen"),
+                         loaded_corpus.vocab.get_existing_id_from_word("unseen"))
+
+    def test_memory_mapped_arrays(self):
+        """Test that the arrays are memory mapped read-only."""
+        loaded_corpus = Corpus.load_binary(self.file_path)
+        self.assertIsInstance(loaded_corpus.word_ids, np.memmap)
+        self.assertFalse(loaded_corpus.word_ids.flags.writeable)
+
+    def test_binary_file_detection(self):
+        """Test that binary corpus files are distinguished from text files."""
+        self.assertTrue(Corpus.is_binary_file(self.file_path))
+        self.assertFalse(Corpus.is_binary_file("tests/data/sample_data"))
+
+    def test_unsupported_version(self):
+        """Test that loading a different format version raises an error."""
+        with open(self.file_path, "r+b") as f:
+            f.seek(8)
+            f.write((99).to_bytes(4, "little"))
+
+        with self.assertRaises(ValueError, msg="An unknown version should raise an error."):
+            Corpus.load_binary(self.file_path)
+
+
+class MultipleFileTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before every test."""
+        self.tempdir = tempfile.TemporaryDirectory()
+        with open("tests/data/sample_data", "r") as rf:
+            lines = rf.readlines()
+        self.file_paths = []
+        for shard_index, shard_start in enumerate(range(0, len(lines), 150)):
+            file_path = os.path.join(self.tempdir.name, "shard{}".format(shard_index))
+            with open(file_path, "w") as wf:
+                wf.writelines(lines[shard_start:shard_start + 150])
+            self.file_paths.append(file_path)
+        self.corpus = Corpus.from_document_file("tests/data/sample_data")
+
+    def tearDown(self):
+        """Code to run after every test."""
+        self.tempdir.cleanup()
+
+    def test_same_as_serial_load(self):
+        """Test that reading files across processes gives the same corpus as reading them in turn."""
+        self.assertGreater(len(self.file_paths), 2)
+        for workers in (1, 2):
+            corpus = Corpus.from_document_files(self.file_paths, workers=workers)
+            self.assertEqual(self.corpus, corpus, "Corpus from {} workers is not correct.".format(workers))
+
+    def test_hashed_vocabulary(self):
+        """Test that words from every file are hashed as they would be when read in turn."""
+        corpus = Corpus.from_document_files(self.file_paths, workers=2, vocabulary=Vocabulary(number_of_buckets=512))
+        expected_corpus = Corpus.from_document_file("tests/data/sample_data",
+                                                    vocabulary=Vocabulary(number_of_buckets=512))
+        self.assertEqual(expected_corpus, corpus)
+
+    def test_pruning(self):
+        """Test that filters are applied to the merged corpus."""
+        corpus = Corpus.from_document_files(self.file_paths, workers=2, minimum_count=3)
+        self.assertEqual(self.corpus.prune_vocabulary(minimum_count=3), corpus)
+
+    def test_binary_files(self):
+        """Test that binary files are merged as their text would be, with or without hashing."""
+        for number_of_buckets in (None, 512):
+            with self.subTest(number_of_buckets=number_of_buckets):
+                binary_file_paths = self.save_binary_files(number_of_buckets)
+                corpus = Corpus.from_binary_files(binary_file_paths)
+                expected_corpus = Corpus.from_document_file(
+                    "tests/data/sample_data", vocabulary=Vocabulary(number_of_buckets=number_of_buckets))
+                self.assertEqual(expected_corpus, corpus)
+
+    def test_pruning_binary_files(self):
+        """Test that filters are applied to the corpus merged from binary files."""
+        corpus = Corpus.from_binary_files(self.save_binary_files(None), minimum_count=3)
+        self.assertEqual(self.corpus.prune_vocabulary(minimum_count=3), corpus)
+
+    def test_binary_files_with_different_vocabularies(self):
+        """Test that binary files hashed differently cannot be merged."""
+        binary_file_paths = self.save_binary_files(None)[:1] + self.save_binary_files(512)[1:]
+        with self.assertRaises(ValueError):
+            Corpus.from_binary_files(binary_file_paths)
+
+    def test_binary_file_read_as_text(self):
+        """Test that a binary file among document files raises an error rather than being read as text."""
+        with self.assertRaises(ValueError):
+            Corpus.from_document_files(self.file_paths[:1] + self.save_binary_files(None)[1:], workers=1)
+
+    def save_binary_files(self, number_of_buckets):
+        """Save each file as a binary corpus, returning their paths."""
+        binary_file_paths = []
+        for file_path in self.file_paths:
+            binary_file_path = "{}.{}.bin".format(file_path, number_of_buckets)
+            Corpus.from_document_file(file_path, vocabulary=Vocabulary(number_of_buckets=number_of_buckets)
+                                      ).save_binary(binary_file_path)
+            binary_file_paths.append(binary_file_path)
+        return binary_file_paths
+
+
+class PruningTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before every test."""
+        self.list_of_documents = [
+            ["the", "quick", "brown", "fox"],
+            ["the", "lazy", "dog"],
+            ["the", "quick", "dog", "dog"],
+            ["fox"],
+        ]
+        self.corpus = Corpus.from_iterable_of_word_lists(self.list_of_documents)
+
+    def _get_expected_corpus(self, removed_words):
+        """Build the corpus from the documents with some words removed beforehand."""
+        return Corpus.from_iterable_of_word_lists([[word for word in document if word not in removed_words]
+                                                   for document in self.list_of_documents])
+
+    def test_minimum_count(self):
+        """Test that words occurring fewer times than the minimum count are removed."""
+        pruned_corpus = self.corpus.prune_vocabulary(minimum_count=2)
+        self.assertEqual(self._get_expected_corpus({"brown", "lazy"}), pruned_corpus)
+        self.assertEqual(4, pruned_corpus.vocab.size)
+
+    def test_maximum_document_frequency(self):
+        """Test that words occurring in too many documents are removed."""
+        pruned_corpus = self.corpus.prune_vocabulary(maximum_document_frequency=0.5)
+        self.assertEqual(self._get_expected_corpus({"the"}), pruned_corpus)
+
+    def test_stopwords(self):
+        """Test that stopwords are removed, and that stopwords missing from the corpus are ignored."""
+        pruned_corpus = self.corpus.prune_vocabulary(stopwords=["the", "a", "dog"])
+        self.assertEqual(self._get_expected_corpus({"the", "dog"}), pruned_corpus)
+
+    def test_maximum_vocabulary_size(self):
+        """Test that the most frequent words are kept, with ties going to earlier words."""
+        pruned_corpus = self.corpus.prune_vocabulary(maximum_vocabulary_size=3)
+        self.assertEqual(self._get_expected_corpus({"brown", "lazy", "fox"}), pruned_corpus)
+
+    def test_empty_documents_are_kept(self):
+        """Test that documents left without words are kept."""
+        pruned_corpus = self.corpus.prune_vocabulary(stopwords=["fox"], minimum_count=3)
+        self.assertEqual(4, pruned_corpus.number_of_documents)
+        self.assertListEqual([[0], [0, 1], [0, 1, 1], []],
+                             [document.tolist() for document in pruned_corpus])
+
+    def test_pruning_while_building(self):
+        """Test that filters given when building a corpus are applied to it."""
+        self.assertEqual(self.corpus.prune_vocabulary(minimum_count=2, stopwords=["the"]),
+                         Corpus.from_iterable_of_word_lists(self.list_of_documents, minimum_count=2,
+                                                           stopwords=["the"]))
+
+    def test_no_filters(self):
+        """Test that the corpus is returned unchanged without any filters."""
+        self.assertIs(self.corpus, self.corpus.prune_vocabulary())
+
+    def test_bad_parameters(self):
+        """Test that invalid filters and hashed vocabularies raise errors."""
+        with self.assertRaises(ValueError):
+            self.corpus.prune_vocabulary(maximum_document_frequency=1.5)
+        with self.assertRaises(ValueError):
+            self.corpus.prune_vocabulary(maximum_vocabulary_size=-1)
+        hashed_corpus = Corpus.from_iterable_of_word_lists(self.list_of_documents,
+                                                           vocabulary=Vocabulary(number_of_buckets=8))
+        with self.assertRaises(ValueError):
+            hashed_corpus.prune_vocabulary(minimum_count=2)
+
 
 class AttributeTests(unittest.TestCase):
 
@@ -5,6 +5,9 @@ import os
 import tempfile
 import unittest
 
+import numpy as np
+
+from pdmm import Corpus, GibbsSamplingDMM, TopicModel
 from pdmm.__main__ import parse_args
 from pdmm.__main__ import main as pdmm_main
 
@@ -37,3 +40,175 @@ class CommandLineTests(unittest.TestCase):
 
         self.assertEqual(top_words, expected_top_words, "Top words should be equal.")
         self.assertEqual(topic_assignments, expected_topic_assignments, "Topic assignments should be equal.")
+
+    def test_binary_corpus(self):
+        """Test that a binary corpus gives the same output as the text corpus."""
+        binary_corpus_path = os.path.join(self.tempdir.name, "corpus.bin")
+        Corpus.from_document_file("tests/data/sample_data").save_binary(binary_corpus_path)
+
+        arg_string = "--corpus {} --output {} --iterations {}".format(binary_corpus_path, self.tempdir.name, 50)
+        parsed_args = parse_args(arg_string.split())
+
+        pdmm_main(parsed_args, seed=1)
+
+        expected_topic_assignments = read_contents_from_path("tests/data/topicAssignments")
+        topic_assignments = read_contents_from_path(os.path.join(self.tempdir.name, "topicAssignments"))
+        self.assertEqual(topic_assignments, expected_topic_assignments, "Topic assignments should be equal.")
+
+    def test_resumed_output(self):
+        """Test that a run resumed from a checkpoint gives the same output as an uninterrupted run."""
+        checkpoint_path = os.path.join(self.tempdir.name, "checkpoint.npz")
+
+        arg_string = "--corpus {} --iterations {} --checkpoint {} --checkpoint-every {}".format(
+            "tests/data/sample_data", 20, checkpoint_path, 10)
+        pdmm_main(parse_args(arg_string.split()), seed=1)
+
+        arg_string = "--corpus {} --output {} --iterations {} --checkpoint {} --resume".format(
+            "tests/data/sample_data", self.tempdir.name, 50, checkpoint_path)
+        pdmm_main(parse_args(arg_string.split()))
+
+        expected_topic_assignments = read_contents_from_path("tests/data/topicAssignments")
+        topic_assignments = read_contents_from_path(os.path.join(self.tempdir.name, "topicAssignments"))
+        self.assertEqual(topic_assignments, expected_topic_assignments, "Topic assignments should be equal.")
+
+    def test_distributed_checkpoint(self):
+        """Test that distributed runs save their checkpoint, and can be resumed from it."""
+        checkpoint_path = os.path.join(self.tempdir.name, "checkpoint.npz")
+        arg_string = "--corpus {} --iterations {} --engine numba --distributed-workers {} --checkpoint {}".format(
+            "tests/data/sample_data", 3, 2, checkpoint_path)
+        pdmm_main(parse_args(arg_string.split()), seed=1)
+        self.assertTrue(os.path.exists(checkpoint_path))
+
+        arg_string = "--corpus {} --iterations {} --engine numba --distributed-workers {} --checkpoint {} " \
+                     "--resume".format("tests/data/sample_data", 5, 2, checkpoint_path)
+        pdmm_main(parse_args(arg_string.split()))
+        model = GibbsSamplingDMM.load_checkpoint(checkpoint_path, Corpus.from_document_file("tests/data/sample_data"))
+        self.assertEqual(5, model.iteration)
+
+    def test_distributed_early_stopping(self):
+        """Test that the convergence options apply to distributed runs."""
+        checkpoint_path = os.path.join(self.tempdir.name, "checkpoint.npz")
+        arg_string = "--corpus {} --iterations {} --engine numba --distributed-workers {} --checkpoint {} " \
+                     "--eval-every {} --log-likelihood-tolerance 1e9".format("tests/data/sample_data", 50, 2,
+                                                                            checkpoint_path, 3)
+        pdmm_main(parse_args(arg_string.split()), seed=1)
+        model = GibbsSamplingDMM.load_checkpoint(checkpoint_path, Corpus.from_document_file("tests/data/sample_data"))
+        self.assertEqual(6, model.iteration)
+
+    def test_multiple_chains(self):
+        """Test that running several chains saves the output of one of them."""
+        arg_string = "--corpus {} --output {} --iterations {} --chains {} --workers {}".format(
+            "tests/data/sample_data", self.tempdir.name, 5, 2, 2)
+        pdmm_main(parse_args(arg_string.split()), seed=1)
+
+        topic_assignments = read_contents_from_path(os.path.join(self.tempdir.name, "topicAssignments"))
+        self.assertEqual(len(topic_assignments.splitlines()), 400, "There should be one assignment per document.")
+
+    def test_save_model(self):
+        """Test that the trained model is saved for scoring new documents."""
+        model_path = os.path.join(self.tempdir.name, "model.bin")
+        arg_string = "--corpus {} --iterations {} --save-model {}".format("tests/data/sample_data", 5, model_path)
+        pdmm_main(parse_args(arg_string.split()), seed=1)
+
+        topic_model = TopicModel.load(model_path)
+        self.assertEqual(topic_model.number_of_topics, 20)
+        self.assertEqual(len(topic_model.predict([["siri"], ["unseenword"]])), 2)
+
+    def test_number_of_top_words(self):
+        """Test that the number of top words is honoured under either spelling of the option."""
+        for option in ["--num-words", "--num_words"]:
+            arg_string = "--corpus {} --output {} --iterations {} {} 3".format("tests/data/sample_data",
+                                                                                self.tempdir.name, 5, option)
+            pdmm_main(parse_args(arg_string.split()), seed=1)
+
+            top_words = read_contents_from_path(os.path.join(self.tempdir.name, "topWords"))
+            for line in top_words.splitlines():
+                self.assertEqual(len(line.split(": ")[1].split()), 3)
+
+    def test_output_format(self):
+        """Test that the output format selects the files saved."""
+        arg_string = "--corpus {} --output {} --iterations {} --output-format npy".format(
+            "tests/data/sample_data", self.tempdir.name, 50)
+        pdmm_main(parse_args(arg_string.split()), seed=1)
+
+        expected_topic_assignments = read_contents_from_path("tests/data/topicAssignments")
+        topic_assignments = np.load(os.path.join(self.tempdir.name, "topicAssignments.npy"))
+        self.assertEqual("".join("{}\n".format(topic_index) for topic_index in topic_assignments),
+                         expected_topic_assignments)
+        self.assertFalse(os.path.exists(os.path.join(self.tempdir.name, "topWords")))
+
+    def test_vocabulary_pruning(self):
+        """Test that the vocabulary is pruned before the model is built."""
+        stopwords_path = os.path.join(self.tempdir.name, "stopwords")
+        with open(stopwords_path, "w") as wf:
+            wf.write("siri\niphone\n")
+        arg_string = "--corpus {} --output {} --iterations {} --min-count 2 --max-vocab-size 100 --stopwords {}".format(
+            "tests/data/sample_data", self.tempdir.name, 5, stopwords_path)
+        pdmm_main(parse_args(arg_string.split()), seed=1)
+
+        words = read_contents_from_path(os.path.join(self.tempdir.name, "topWords")).split()
+        self.assertNotIn("siri", words)
+        topic_assignments = read_contents_from_path(os.path.join(self.tempdir.name, "topicAssignments"))
+        self.assertEqual(Corpus.from_document_file("tests/data/sample_data").number_of_documents,
+                         len(topic_assignments.splitlines()))
+
+    def test_corpus_file_glob(self):
+        """Test that a glob pattern reads every matching file in order, as if they were one file."""
+        with open("tests/data/sample_data", "r") as rf:
+            lines = rf.readlines()
+        for shard_index, shard_start in enumerate(range(0, len(lines), 150)):
+            with open(os.path.join(self.tempdir.name, "shard{}.txt".format(shard_index)), "w") as wf:
+                wf.writelines(lines[shard_start:shard_start + 150])
+
+        arg_string = "--corpus {} --output {} --iterations {} --workers 2".format(
+            os.path.join(self.tempdir.name, "shard*.txt"), self.tempdir.name, 50)
+        pdmm_main(parse_args(arg_string.split()), seed=1)
+
+        expected_topic_assignments = read_contents_from_path("tests/data/topicAssignments")
+        topic_assignments = read_contents_from_path(os.path.join(self.tempdir.name, "topicAssignments"))
+        self.assertEqual(topic_assignments, expected_topic_assignments, "Topic assignments should be equal.")
+
+    def test_binary_corpus_file_glob(self):
+        """Test that a glob pattern matching binary corpus files merges them, and that mixed files are rejected."""
+        with open("tests/data/sample_data", "r") as rf:
+            lines = rf.readlines()
+        for shard_index, shard_start in enumerate(range(0, len(lines), 150)):
+            Corpus.from_iterable_of_word_lists(line.split() for line in lines[shard_start:shard_start + 150]
+                                               ).save_binary(os.path.join(self.tempdir.name,
+                                                                          "shard{}.bin".format(shard_index)))
+
+        arg_string = "--corpus {} --output {} --iterations {}".format(
+            os.path.join(self.tempdir.name, "shard*.bin"), self.tempdir.name, 50)
+        pdmm_main(parse_args(arg_string.split()), seed=1)
+
+        expected_topic_assignments = read_contents_from_path("tests/data/topicAssignments")
+        topic_assignments = read_contents_from_path(os.path.join(self.tempdir.name, "topicAssignments"))
+        self.assertEqual(topic_assignments, expected_topic_assignments, "Topic assignments should be equal.")
+
+        with open(os.path.join(self.tempdir.name, "shard9.bin"), "w") as wf:
+            wf.writelines(lines[:10])
+        with self.assertRaises(ValueError, msg="Mixed text and binary files should raise an error."):
+            pdmm_main(parse_args(arg_string.split()), seed=1)
+
+    def test_log_stats(self):
+        """Test that the statistics of each iteration and a summary are logged."""
+        arg_string = "--corpus {} --iterations {} --log-stats".format("tests/data/sample_data", 3)
+        parsed_args = parse_args(arg_string.split())
+
+        with self.assertLogs("pdmm.sampling", level="INFO") as logs:
+            pdmm_main(parsed_args, seed=1)
+
+        self.assertEqual(len(logs.output), 5)
+        self.assertIn("Model state holds", logs.output[0])
+        self.assertIn("Sweep 3:", logs.output[3])
+        self.assertIn("3 sweeps in", logs.output[4])
+
+    def test_alias_sampler_requires_numba_engine(self):
+        """Test that the alias sampler cannot be chosen with the Python engine."""
+        with self.assertRaises(SystemExit):
+            parse_args("--corpus {} --sampler alias".format("tests/data/sample_data").split())
+
+    def test_distributed_workers_require_numba_engine(self):
+        """Test that distributed sampling cannot be chosen with the Python engine."""
+        with self.assertRaises(SystemExit):
+            parse_args("--corpus {} --distributed-workers 2".format("tests/data/sample_data").split())
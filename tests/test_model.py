@@ -0,0 +1,182 @@
+"""
+Tests for the TopicModel class.
+"""
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from pdmm import Corpus, GibbsSamplingDMM, PackedVocabulary, TopicModel
+from pdmm.model import MODEL_MAGIC, MODEL_VERSION
+from pdmm.storage import UnsupportedFormatError, write_array_file
+
+
+class PredictionTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Code to run once before the tests."""
+        corpus = Corpus.from_document_file("tests/data/sample_data")
+        cls.model = GibbsSamplingDMM(corpus, number_of_topics=20)
+        cls.model.randomly_initialise_topic_assignment(seed=1)
+        cls.model.inference(50)
+        cls.topic_model = cls.model.to_topic_model()
+
+        with open("tests/data/sample_data", "r") as rf:
+            cls.list_of_documents = [line.split() for line in rf]
+
+    def test_predictions_match_training_assignments(self):
+        """Test that most training documents are predicted to be in their assigned topic."""
+        predicted_topics = self.model.predict(self.list_of_documents)
+        agreement = np.mean(predicted_topics == self.model.document_topic_assignments)
+        self.assertGreater(agreement, 0.9, "Predictions should mostly agree with the training assignments.")
+
+    def test_probabilities(self):
+        """Test that the probabilities are normalised and agree with the predictions."""
+        probabilities = self.model.predict_proba(self.list_of_documents)
+        self.assertEqual(probabilities.shape, (len(self.list_of_documents), self.model.number_of_topics))
+        self.assertTrue(np.allclose(probabilities.sum(axis=1), 1))
+        self.assertListEqual(list(probabilities.argmax(axis=1)), list(self.topic_model.predict(self.list_of_documents)))
+
+    def test_scores_match_counts(self):
+        """Test that the probabilities match those computed directly from the counts."""
+        document = ["siri", "iphone", "siri"]
+        counts = self.model.number_of_each_word_in_each_topic
+        vocab = self.model.corpus.vocab
+        word_ids = [vocab.get_existing_id_from_word(word) for word in document]
+
+        log_scores = np.log(self.model.number_of_documents_in_each_topic + self.model.alpha)
+        for word_id in word_ids:
+            log_scores += np.log((counts[:, word_id] + self.model.beta) /
+                                 (counts.sum(axis=1) + vocab.size * self.model.beta))
+        expected_probabilities = np.exp(log_scores - log_scores.max())
+        expected_probabilities /= expected_probabilities.sum()
+
+        observed_probabilities = self.topic_model.predict_proba([document])[0]
+        self.assertTrue(np.allclose(expected_probabilities, observed_probabilities))
+
+    def test_unknown_words(self):
+        """Test that unknown words are scored without growing the vocabulary."""
+        vocabulary_size = self.model.corpus.vocab.size
+        probabilities = self.topic_model.predict_proba([["unseenword"], []])
+        self.assertEqual(self.model.corpus.vocab.size, vocabulary_size, "The vocabulary should not grow.")
+        self.assertTrue(np.all(np.isfinite(probabilities)))
+
+    def test_topic_model_is_cached(self):
+        """Test that the frozen model is built once, in 32-bit floats, and rebuilt when the counts change."""
+        model = GibbsSamplingDMM(self.model.corpus, number_of_topics=5)
+        model.randomly_initialise_topic_assignment(seed=1)
+        topic_model = model.to_topic_model()
+        self.assertEqual(np.float32, topic_model.log_topic_word_probabilities.dtype)
+
+        model.predict(self.list_of_documents[:5])
+        model.predict_proba(self.list_of_documents[:5])
+        self.assertIs(model.to_topic_model(), topic_model)
+
+        model.inference(1)
+        self.assertIsNot(model.to_topic_model(), topic_model)
+        expected_log_topic_word_probabilities = TopicModel.from_counts(
+            model.corpus.vocab, model.number_of_documents_in_each_topic, model.number_of_each_word_in_each_topic,
+            model.alpha, model.beta).log_topic_word_probabilities
+        np.testing.assert_array_equal(model.to_topic_model().log_topic_word_probabilities,
+                                      expected_log_topic_word_probabilities)
+
+        for change_model in [lambda: model.set_topic_assignments(np.zeros(model.corpus.number_of_documents)),
+                             lambda: setattr(model, "alpha", 0.5)]:
+            topic_model = model.to_topic_model()
+            change_model()
+            self.assertIsNot(model.to_topic_model(), topic_model)
+
+    def test_speed_of_prediction(self):
+        """Test that tens of thousands of documents can be scored each second."""
+        list_of_documents = self.list_of_documents * 100
+        self.topic_model.predict(list_of_documents[:10])
+
+        t0 = time.time()
+        self.topic_model.predict(list_of_documents)
+        t1 = time.time()
+
+        documents_per_second = len(list_of_documents) / (t1 - t0)
+        self.assertGreater(documents_per_second, 20000, "Scoring was too slow.")
+
+
+class SaveLoadTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Code to run once before the tests."""
+        corpus = Corpus.from_document_file("tests/data/sample_data")
+        model = GibbsSamplingDMM(corpus, number_of_topics=20)
+        model.randomly_initialise_topic_assignment(seed=1)
+        model.inference(20)
+        cls.topic_model = model.to_topic_model()
+
+        with open("tests/data/sample_data", "r") as rf:
+            cls.list_of_documents = [line.split() for line in rf]
+
+    def setUp(self):
+        """Code to run before each test."""
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.model_path = os.path.join(self.tempdir.name, "model.bin")
+
+    def tearDown(self):
+        """Code to run after each test."""
+        self.tempdir.cleanup()
+
+    def test_loaded_model_predictions(self):
+        """Test that a loaded model predicts the same topics as the original."""
+        self.topic_model.save(self.model_path)
+        self.assertTrue(TopicModel.is_model_file(self.model_path))
+
+        for mmap in (True, False):
+            loaded_model = TopicModel.load(self.model_path, mmap=mmap)
+            self.assertEqual(loaded_model.vocab, self.topic_model.vocab)
+            self.assertEqual((loaded_model.alpha, loaded_model.beta), (self.topic_model.alpha, self.topic_model.beta))
+            self.assertEqual(loaded_model.log_topic_word_probabilities.dtype, np.float32)
+            self.assertTrue(np.allclose(loaded_model.predict_proba(self.list_of_documents),
+                                        self.topic_model.predict_proba(self.list_of_documents), atol=1e-4))
+
+    def test_memory_mapped(self):
+        """Test that the probabilities of a loaded model are memory mapped and read-only."""
+        self.topic_model.save(self.model_path)
+        loaded_model = TopicModel.load(self.model_path)
+        self.assertIsInstance(loaded_model.log_topic_word_probabilities, np.memmap)
+        self.assertFalse(loaded_model.log_topic_word_probabilities.flags.writeable)
+
+    def test_memory_mapped_vocabulary(self):
+        """Test that the vocabulary of a loaded model is looked up in the memory mapped file."""
+        self.topic_model.save(self.model_path)
+        loaded_model = TopicModel.load(self.model_path)
+        self.assertIsInstance(loaded_model.vocab, PackedVocabulary)
+        self.assertIsInstance(loaded_model.vocab.word_bytes, np.memmap)
+        self.assertIsInstance(loaded_model.vocab.word_table, np.memmap)
+
+        words = ["siri", "unseenword", "iphone"]
+        self.assertListEqual([self.topic_model.vocab.get_existing_id_from_word(word) for word in words],
+                             [loaded_model.vocab.get_existing_id_from_word(word) for word in words])
+
+    def test_file_without_word_table(self):
+        """Test that a model saved without a hash table of its words builds one when loaded."""
+        word_bytes, word_offsets = self.topic_model.vocab.to_packed_arrays()
+        arrays = {
+            "log_topic_probabilities": self.topic_model.log_topic_probabilities.astype(np.float32),
+            "log_topic_word_probabilities": self.topic_model.log_topic_word_probabilities.astype(np.float32),
+            "vocabulary_bytes": word_bytes,
+            "vocabulary_offsets": word_offsets,
+        }
+        write_array_file(self.model_path, MODEL_MAGIC, MODEL_VERSION, arrays,
+                         metadata={"alpha": self.topic_model.alpha, "beta": self.topic_model.beta})
+
+        loaded_model = TopicModel.load(self.model_path)
+        self.assertEqual(self.topic_model.vocab, loaded_model.vocab)
+        np.testing.assert_array_equal(self.topic_model.predict(self.list_of_documents),
+                                      loaded_model.predict(self.list_of_documents))
+
+    def test_corpus_file_is_rejected(self):
+        """Test that loading a file of another type raises an error."""
+        Corpus.from_document_file("tests/data/sample_data").save_binary(self.model_path)
+        self.assertFalse(TopicModel.is_model_file(self.model_path))
+        with self.assertRaises(UnsupportedFormatError):
+            TopicModel.load(self.model_path)
@@ -0,0 +1,147 @@
+"""
+Tests for the parallel module.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from pdmm import Corpus, GibbsSamplingDMM, run_chains
+from pdmm.parallel import ApproximateDistributedSampler, get_best_chain, run_approximate_distributed_inference
+
+
+class ChainTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Code to run once before the tests."""
+        cls.corpus = Corpus.from_document_file("tests/data/sample_data")
+        cls.chain_results = run_chains(cls.corpus, 3, 10, workers=2, seed=1, number_of_topics=20)
+
+    def test_chains_match_serial_runs(self):
+        """Test that each chain gives the same result as running its seed in this process."""
+        for chain_result in self.chain_results:
+            model = GibbsSamplingDMM(self.corpus, number_of_topics=20)
+            model.randomly_initialise_topic_assignment(seed=chain_result.seed)
+            model.inference(10)
+            self.assertListEqual(list(model.document_topic_assignments),
+                                 list(chain_result.document_topic_assignments))
+            self.assertAlmostEqual(model.log_likelihood(), chain_result.log_likelihood)
+
+    def test_chains_are_independent(self):
+        """Test that every chain has a different seed."""
+        seeds = [chain_result.seed for chain_result in self.chain_results]
+        self.assertEqual(len(set(seeds)), len(seeds), "Chains should have different seeds.")
+
+    def test_chains_stop_early(self):
+        """Test that the inference parameters are used in every chain."""
+        inference_parameters = {"eval_every": 2, "topic_change_tolerance": 1.0}
+        chain_results = run_chains(self.corpus, 2, 10, workers=2, seed=1, inference_parameters=inference_parameters,
+                                   number_of_topics=20)
+        for chain_result in chain_results:
+            model = GibbsSamplingDMM(self.corpus, number_of_topics=20)
+            model.randomly_initialise_topic_assignment(seed=chain_result.seed)
+            model.inference(2)
+            self.assertListEqual(list(model.document_topic_assignments),
+                                 list(chain_result.document_topic_assignments))
+
+    def test_best_chain(self):
+        """Test that the best chain has the highest log-likelihood."""
+        best_chain = get_best_chain(self.chain_results)
+        highest_log_likelihood = max(chain_result.log_likelihood for chain_result in self.chain_results)
+        self.assertEqual(best_chain.log_likelihood, highest_log_likelihood)
+
+
+class ApproximateDistributedTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before each test."""
+        self.corpus = Corpus.from_document_file("tests/data/sample_data")
+        self.model = GibbsSamplingDMM(self.corpus, number_of_topics=20, engine="numba")
+        self.model.randomly_initialise_topic_assignment(seed=1)
+
+    def test_single_worker_matches_serial(self):
+        """Test that a single worker gives exactly the chain of the serial sampler."""
+        serial_model = GibbsSamplingDMM(self.corpus, number_of_topics=20, engine="numba")
+        serial_model.randomly_initialise_topic_assignment(seed=1)
+        serial_model.inference(10)
+
+        run_approximate_distributed_inference(self.model, 10, workers=1)
+        self.assertListEqual(list(serial_model.document_topic_assignments),
+                             list(self.model.document_topic_assignments))
+        self.assertTrue(np.all(serial_model.number_of_each_word_in_each_topic ==
+                               self.model.number_of_each_word_in_each_topic), "Word counts should be equal.")
+
+    def test_merged_counts_are_consistent(self):
+        """Test that the merged counts match the assignments when several workers are used."""
+        initial_log_likelihood = self.model.log_likelihood()
+
+        with ApproximateDistributedSampler(self.model, workers=2) as sampler:
+            self.assertEqual(sampler.shard_offsets[0], 0)
+            self.assertEqual(sampler.shard_offsets[-1], self.corpus.number_of_documents)
+            sampler.inference(10)
+
+        self.assertEqual(self.model.iteration, 10)
+        self.assertGreater(self.model.log_likelihood(), initial_log_likelihood)
+
+        expected_model = GibbsSamplingDMM(self.corpus, number_of_topics=20)
+        expected_model.set_topic_assignments(self.model.document_topic_assignments)
+        self.assertTrue(np.all(expected_model.number_of_each_word_in_each_topic ==
+                               self.model.number_of_each_word_in_each_topic), "Word counts should be equal.")
+        self.assertTrue(np.all(expected_model.number_of_documents_in_each_topic ==
+                               self.model.number_of_documents_in_each_topic), "Document counts should be equal.")
+
+    def test_count_options_match_serial(self):
+        """Test that the dtype and layout of the counts are kept by the workers."""
+        serial_model = GibbsSamplingDMM(self.corpus, number_of_topics=20, engine="numba", count_dtype="uint16",
+                                        count_layout="word-major", weight_space="log")
+        serial_model.randomly_initialise_topic_assignment(seed=1)
+        serial_model.inference(5)
+
+        model = GibbsSamplingDMM(self.corpus, number_of_topics=20, engine="numba", count_dtype="uint16",
+                                 count_layout="word-major", weight_space="log")
+        model.randomly_initialise_topic_assignment(seed=1)
+        run_approximate_distributed_inference(model, 5, workers=1)
+        self.assertListEqual(list(serial_model.document_topic_assignments), list(model.document_topic_assignments))
+        self.assertEqual(np.uint16, model.number_of_each_word_in_each_topic.dtype)
+        self.assertTrue(model.number_of_each_word_in_each_topic.flags.f_contiguous)
+
+    def test_unsupported_options(self):
+        """Test that options the workers cannot honour raise an error."""
+        model = GibbsSamplingDMM(self.corpus, number_of_topics=20)
+        with self.assertRaises(ValueError, msg="The Python engine should raise an error."):
+            ApproximateDistributedSampler(model, workers=2)
+
+        self.model.enable_stats()
+        with self.assertRaises(ValueError, msg="Statistics should raise an error."):
+            ApproximateDistributedSampler(self.model, workers=2)
+
+    def test_checkpoints(self):
+        """Test that checkpoints are saved during and after distributed inference."""
+        with tempfile.TemporaryDirectory() as tempdir:
+            checkpoint_path = os.path.join(tempdir, "checkpoint.npz")
+            run_approximate_distributed_inference(self.model, 5, workers=2, checkpoint_path=checkpoint_path,
+                                                  checkpoint_every=2)
+            loaded_model = GibbsSamplingDMM.load_checkpoint(checkpoint_path, self.corpus)
+
+        self.assertEqual(5, loaded_model.iteration)
+        self.assertListEqual(list(self.model.document_topic_assignments),
+                             list(loaded_model.document_topic_assignments))
+
+    def test_early_stopping(self):
+        """Test that distributed inference stops early once the tolerance is met."""
+        run_approximate_distributed_inference(self.model, 10, workers=2, log_likelihood_tolerance=1e9)
+        self.assertEqual(2, self.model.iteration)
+
+
+class ImportTests(unittest.TestCase):
+
+    def test_import_without_shared_memory(self):
+        """Test that the package can be imported on Python versions without shared memory."""
+        code = "import sys; sys.modules['multiprocessing.shared_memory'] = None; import pdmm; print(pdmm.run_chains)"
+        completed_process = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE,
+                                           stderr=subprocess.PIPE, universal_newlines=True)
+        self.assertEqual(0, completed_process.returncode, completed_process.stderr)
@@ -34,3 +34,65 @@ class RandomTests(unittest.TestCase):
         """Test that sampling all at once produces the same results."""
         sampled_values = pdmm.utils.sample_many_from_cumulative_weights(self.cumulative_weights, self.random_numbers)
         self.assertListEqual(list(sampled_values), self.expected_values, "Sampled values were not as expected.")
+
+    def test_sampling_from_rows(self):
+        """Test that sampling from rows of weights matches sampling from each row alone."""
+        cumulative_weights = np.stack([self.cumulative_weights, self.cumulative_weights[::-1].cumsum()])
+        row_indices = np.arange(len(self.random_numbers)) % 2
+        sampled_values = pdmm.utils.sample_many_from_rows_of_cumulative_weights(cumulative_weights, row_indices,
+                                                                               self.random_numbers)
+
+        expected_values = [pdmm.utils.sample_from_cumulative_weights(cumulative_weights[row_index], random_number)
+                           for row_index, random_number in zip(row_indices, self.random_numbers)]
+        self.assertListEqual(list(sampled_values), expected_values, "Sampled values were not as expected.")
+
+    def test_alias_sampling(self):
+        """Test that sampling from an alias table follows the weights."""
+        weights = self.cumulative_weights - np.concatenate([[0], self.cumulative_weights[:-1]])
+        alias_probabilities = np.empty(len(weights))
+        alias_indices = np.empty(len(weights), dtype=np.int64)
+        pdmm.utils.build_alias_table(weights, alias_probabilities, alias_indices)
+
+        # Each index keeps its own slice of probability and takes the rest from the indices aliased to it.
+        probabilities = alias_probabilities.copy()
+        np.add.at(probabilities, alias_indices, 1 - alias_probabilities)
+        self.assertTrue(np.allclose(probabilities / len(weights), weights / weights.sum()))
+
+        sampled_value = pdmm.utils.sample_from_alias_table(alias_probabilities, alias_indices, 0.999999)
+        self.assertIn(sampled_value, range(len(weights)))
+
+
+class BatchedSamplingTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before each test."""
+        random_state = np.random.RandomState(0)
+        self.weights = random_state.random(10)
+        self.random_numbers = random_state.random(200000)
+
+    def test_batched_binary_search(self):
+        """Test that batched binary search matches a sorted search and follows the weights."""
+        cumulative_weights = self.weights.cumsum()
+        sampled_values = pdmm.utils.sample_many_from_cumulative_weights(cumulative_weights, self.random_numbers)
+
+        expected_values = np.searchsorted(cumulative_weights, self.random_numbers * cumulative_weights[-1])
+        self.assertEqual(sampled_values.shape, self.random_numbers.shape)
+        self.assertTrue(np.array_equal(sampled_values, expected_values), "Values should match a sorted search.")
+        self.assert_frequencies_follow_weights(sampled_values)
+
+    def test_batched_alias_sampling(self):
+        """Test that batched sampling from an alias table stays in range and follows the weights."""
+        alias_probabilities = np.empty(len(self.weights))
+        alias_indices = np.empty(len(self.weights), dtype=np.int64)
+        pdmm.utils.build_alias_table(self.weights, alias_probabilities, alias_indices)
+        sampled_values = pdmm.utils.sample_many_from_alias_table(alias_probabilities, alias_indices,
+                                                                 self.random_numbers)
+
+        self.assertEqual(sampled_values.shape, self.random_numbers.shape)
+        self.assertTrue(np.all((sampled_values >= 0) & (sampled_values < len(self.weights))))
+        self.assert_frequencies_follow_weights(sampled_values)
+
+    def assert_frequencies_follow_weights(self, sampled_values):
+        """Assert that the frequency of each sampled value is close to its normalised weight."""
+        frequencies = np.bincount(sampled_values, minlength=len(self.weights)) / len(sampled_values)
+        np.testing.assert_allclose(frequencies, self.weights / self.weights.sum(), atol=0.005)
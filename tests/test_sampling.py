@@ -1,14 +1,20 @@
 """
 Tests for the sampling module.
 """
+from collections import Counter
+import importlib.util
 import os
 import tempfile
+import threading
 import time
 import unittest
+from unittest import mock
 
+from numba import njit
 import numpy as np
 
-from pdmm import Corpus, GibbsSamplingDMM
+from pdmm import Corpus, GibbsSamplingDMM, Vocabulary
+from pdmm.kernels import compute_log_gamma_table, compute_topic_weights_for_document, sample_words_without_replacement
 
 from .utils import read_contents_from_path
 
@@ -28,6 +34,21 @@ class BasicTests(unittest.TestCase):
         expected_assignments = [7, 13, 17, 14, 19, 16, 13, 13, 17, 11]
         self.assertListEqual(list(observed_assignments), expected_assignments, "Lists differ at given indices.")
 
+    def test_log_likelihood_increases(self):
+        """Test that inference increases the log-likelihood from a random start."""
+        initial_log_likelihood = self.model.log_likelihood()
+        self.model.inference(10)
+        self.assertGreater(self.model.log_likelihood(), initial_log_likelihood)
+
+    def test_set_topic_assignments(self):
+        """Test that setting the assignments rebuilds the same counts."""
+        self.model.inference(5)
+        other_model = GibbsSamplingDMM(self.model.corpus, number_of_topics=20)
+        other_model.set_topic_assignments(self.model.document_topic_assignments)
+        self.assertTrue(np.all(other_model.number_of_each_word_in_each_topic ==
+                               self.model.number_of_each_word_in_each_topic), "Word counts should be equal.")
+        self.assertAlmostEqual(other_model.log_likelihood(), self.model.log_likelihood())
+
     def test_top_words(self):
         """Test that the top 10 words are correct."""
         self.model.inference(50)
@@ -38,6 +59,353 @@ class BasicTests(unittest.TestCase):
         self.assertListEqual(expected_top_words, observed_top_words, "Top words are not correct.")
 
 
+class EngineTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before each test."""
+        self.corpus = Corpus.from_document_file("tests/data/sample_data")
+
+    def test_engines_agree(self):
+        """Test that the compiled engine produces the same assignments as the Python engine."""
+        models = []
+        for engine in GibbsSamplingDMM.ENGINES:
+            model = GibbsSamplingDMM(self.corpus, number_of_topics=20, engine=engine)
+            model.randomly_initialise_topic_assignment(seed=1)
+            model.inference(20)
+            models.append(model)
+
+        python_model, numba_model = models
+        self.assertListEqual(list(python_model.document_topic_assignments),
+                             list(numba_model.document_topic_assignments), "Assignments should be equal.")
+        self.assertTrue(np.all(python_model.number_of_each_word_in_each_topic ==
+                               numba_model.number_of_each_word_in_each_topic), "Word counts should be equal.")
+
+    def test_engines_compute_identical_weights(self):
+        """Test that both engines compute exactly the same weights, even for long documents with repeated words."""
+        random_state = np.random.RandomState(3)
+        documents = [list(random_state.choice(list("abcdefgh"), size=random_state.randint(1, 3000)))
+                     for _ in range(30)]
+        corpus = Corpus.from_iterable_of_word_lists(documents)
+        for weight_space in GibbsSamplingDMM.WEIGHT_SPACES:
+            models = []
+            for engine in GibbsSamplingDMM.ENGINES:
+                model = GibbsSamplingDMM(corpus, number_of_topics=5, engine=engine, weight_space=weight_space)
+                model.randomly_initialise_topic_assignment(seed=2)
+                model.inference(3)
+                models.append(model)
+
+            python_model, numba_model = models
+            np.testing.assert_array_equal(python_model.topic_weights, numba_model.topic_weights)
+            np.testing.assert_array_equal(python_model.document_topic_assignments,
+                                          numba_model.document_topic_assignments)
+
+    def test_weights_match_product_over_tokens(self):
+        """Test that the weights from distinct words match the product over every token."""
+        corpus = Corpus.from_iterable_of_word_lists([["a", "b", "a", "c", "a"], ["b", "b", "c"], ["a", "c"]])
+        model = GibbsSamplingDMM(corpus, number_of_topics=2)
+        model.set_topic_assignments([1, 0, 1])
+        model.number_of_documents_in_each_topic[1] -= 1
+        model._unassign_document_from_topic(0, 1)
+        model._update_topic_weights_for_document(0)
+
+        vocabulary_size_times_beta = corpus.vocab.size * model.beta
+        expected_weights = model.number_of_documents_in_each_topic + model.alpha
+        for token_index, (word_id, occurrence_index) in enumerate(zip(corpus[0], corpus.get_occurrence_indices(0))):
+            expected_weights *= ((model.number_of_each_word_in_each_topic[:, word_id] + model.beta +
+                                  occurrence_index - 1) /
+                                 (token_index + model.number_of_total_words_in_each_topic + vocabulary_size_times_beta))
+
+        self.assertTrue(np.allclose(model.topic_weights, expected_weights, rtol=1e-12, atol=0))
+
+        unique_word_ids, unique_word_counts = corpus.get_unique_words(0)
+        weights_beyond_table = np.empty(2)
+        compute_topic_weights_for_document(unique_word_ids, unique_word_counts, len(corpus[0]),
+                                           model.number_of_documents_in_each_topic,
+                                           model.number_of_each_word_in_each_topic,
+                                           model.number_of_total_words_in_each_topic, weights_beyond_table,
+                                           model.alpha, model.beta, vocabulary_size_times_beta,
+                                           compute_log_gamma_table(model.beta, 1), False)
+        self.assertTrue(np.allclose(weights_beyond_table, expected_weights, rtol=1e-12, atol=0),
+                        "Counts beyond the table should give the same weights.")
+
+    def test_unknown_engine(self):
+        """Test that an unknown engine raises an error."""
+        with self.assertRaises(ValueError, msg="An unknown engine should raise an error."):
+            GibbsSamplingDMM(self.corpus, engine="fortran")
+
+
+class StatsTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before each test."""
+        self.corpus = Corpus.from_document_file("tests/data/sample_data")
+
+    def test_stats_do_not_change_sampling(self):
+        """Test that recording statistics gives the same assignments with every engine and sampler."""
+        for engine, sampler in [("python", "gibbs"), ("numba", "gibbs"), ("numba", "alias")]:
+            with self.subTest(engine=engine, sampler=sampler):
+                models = [GibbsSamplingDMM(self.corpus, engine=engine, sampler=sampler) for _ in range(2)]
+                for model in models:
+                    model.randomly_initialise_topic_assignment(seed=1)
+                models[1].enable_stats()
+
+                for model in models:
+                    model.inference(3)
+                np.testing.assert_array_equal(models[0].document_topic_assignments,
+                                              models[1].document_topic_assignments)
+
+    def test_phases_of_python_engine(self):
+        """Test that each phase of the python engine is timed once for every document."""
+        model = GibbsSamplingDMM(self.corpus)
+        model.randomly_initialise_topic_assignment(seed=1)
+        stats = model.enable_stats()
+        model.inference(2)
+
+        for phase in ("unassign", "weights", "sample", "assign"):
+            self.assertEqual(stats.phase_calls[phase], 2 * self.corpus.number_of_documents)
+            self.assertGreater(stats.phase_seconds[phase], 0)
+        self.assertEqual(stats.phase_calls["compiled_sweep"], 0)
+        self.assertLessEqual(sum(stats.phase_seconds.values()), stats.seconds)
+
+    def test_sweeps(self):
+        """Test that each sweep records the documents, tokens and topic changes."""
+        model = GibbsSamplingDMM(self.corpus, engine="numba")
+        model.randomly_initialise_topic_assignment(seed=1)
+        stats = model.enable_stats()
+
+        number_of_documents = self.corpus.number_of_documents
+        number_of_tokens = len(self.corpus.word_ids)
+        previous_document_topic_assignments = model.document_topic_assignments.copy()
+        model.inference(1)
+        model.online_inference([["new", "document"], ["another", "one"]], number_of_sweeps=2)
+
+        self.assertEqual(stats.number_of_sweeps, 3)
+        self.assertEqual(stats.sweeps[0].number_of_documents, number_of_documents)
+        self.assertEqual(stats.sweeps[0].number_of_tokens, number_of_tokens)
+        self.assertAlmostEqual(stats.sweeps[0].topic_change_rate, np.mean(
+            previous_document_topic_assignments != model.document_topic_assignments[:-2]))
+        self.assertEqual(stats.sweeps[1].number_of_documents, 2)
+        self.assertEqual(stats.sweeps[1].number_of_tokens, 4)
+        self.assertEqual(stats.phase_calls["compiled_sweep"], 3)
+        self.assertAlmostEqual(stats.documents_per_second, stats.number_of_documents / stats.seconds)
+
+    def test_disable_stats(self):
+        """Test that disabling statistics returns them and stops recording."""
+        model = GibbsSamplingDMM(self.corpus)
+        model.randomly_initialise_topic_assignment(seed=1)
+        stats = model.enable_stats()
+        model.inference(1)
+
+        self.assertIs(model.disable_stats(), stats)
+        self.assertIsNone(model.stats)
+        model.inference(1)
+        self.assertEqual(stats.number_of_sweeps, 1)
+        self.assertEqual(stats.to_dict()["number_of_sweeps"], 1)
+
+
+class CountStorageTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before each test."""
+        self.corpus = Corpus.from_document_file("tests/data/sample_data")
+
+    def test_dtypes_and_layouts_give_same_assignments(self):
+        """Test that the dtype and layout of the counts do not change sampling."""
+        expected_document_topic_assignments = None
+        for engine in GibbsSamplingDMM.ENGINES:
+            for count_dtype in GibbsSamplingDMM.COUNT_DTYPES:
+                for count_layout in GibbsSamplingDMM.COUNT_LAYOUTS:
+                    with self.subTest(engine=engine, count_dtype=count_dtype, count_layout=count_layout):
+                        model = GibbsSamplingDMM(self.corpus, engine=engine, count_dtype=count_dtype,
+                                                 count_layout=count_layout)
+                        model.randomly_initialise_topic_assignment(seed=1)
+                        model.inference(5)
+
+                        counts = model.number_of_each_word_in_each_topic
+                        self.assertEqual(counts.dtype, np.dtype(count_dtype))
+                        self.assertEqual(counts.flags.f_contiguous, count_layout == "word-major")
+                        if expected_document_topic_assignments is None:
+                            expected_document_topic_assignments = model.document_topic_assignments
+                        np.testing.assert_array_equal(model.document_topic_assignments,
+                                                      expected_document_topic_assignments)
+
+    def test_invalid_count_dtype(self):
+        """Test that counts too narrow for the corpus are rejected."""
+        corpus = Corpus.from_iterable_of_word_lists([["common"] * 40000, ["common"] * 40000])
+        with self.assertRaises(ValueError):
+            GibbsSamplingDMM(corpus, count_dtype="uint16")
+        with self.assertRaises(ValueError):
+            GibbsSamplingDMM(corpus, count_dtype="int8")
+        with self.assertRaises(ValueError):
+            GibbsSamplingDMM(corpus, count_layout="diagonal")
+
+    def test_counts_widen_for_new_documents(self):
+        """Test that narrow counts are widened when new documents would overflow them."""
+        corpus = Corpus.from_iterable_of_word_lists([["common"] * 40000, ["rare"]])
+        model = GibbsSamplingDMM(corpus, number_of_topics=1, count_dtype="uint16")
+        model.randomly_initialise_topic_assignment(seed=1)
+
+        with self.assertLogs("pdmm.sampling", level="WARNING"):
+            model.add_documents([["common"] * 40000])
+        self.assertEqual(model.count_dtype, "int64")
+        self.assertEqual(model.number_of_each_word_in_each_topic[0, 0], 80000)
+        self.assertTrue(model.number_of_each_word_in_each_topic.flags.f_contiguous)
+
+    def test_memory_footprint(self):
+        """Test that the footprint counts the bytes of the word counts at their dtype."""
+        for count_dtype, itemsize in [("uint16", 2), ("int32", 4), ("int64", 8)]:
+            model = GibbsSamplingDMM(self.corpus, number_of_topics=20, count_dtype=count_dtype)
+            footprint = model.get_memory_footprint()
+            self.assertEqual(footprint["number_of_each_word_in_each_topic"], 20 * self.corpus.vocab.size * itemsize)
+            self.assertEqual(footprint["total"], sum(value for name, value in footprint.items() if name != "total"))
+
+    def test_checkpoint_keeps_dtype_and_layout(self):
+        """Test that a checkpoint restores the dtype and layout of the counts."""
+        model = GibbsSamplingDMM(self.corpus, count_dtype="uint16", count_layout="topic-major")
+        model.randomly_initialise_topic_assignment(seed=1)
+        model.inference(2)
+
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            checkpoint_path = os.path.join(temporary_directory, "checkpoint.npz")
+            model.save_checkpoint(checkpoint_path)
+            loaded_model = GibbsSamplingDMM.load_checkpoint(checkpoint_path, self.corpus)
+
+        self.assertEqual(loaded_model.count_dtype, "uint16")
+        self.assertEqual(loaded_model.number_of_each_word_in_each_topic.dtype, np.uint16)
+        self.assertTrue(loaded_model.number_of_each_word_in_each_topic.flags.c_contiguous)
+        np.testing.assert_array_equal(loaded_model.number_of_each_word_in_each_topic,
+                                      model.number_of_each_word_in_each_topic)
+
+
+class AliasSamplerTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before each test."""
+        self.corpus = Corpus.from_document_file("tests/data/sample_data")
+
+    def test_counts_match_assignments(self):
+        """Test that the counts stay consistent with the assignments, and the log-likelihood improves."""
+        model = GibbsSamplingDMM(self.corpus, number_of_topics=20, engine="numba", sampler="alias")
+        model.randomly_initialise_topic_assignment(seed=1)
+        initial_log_likelihood = model.log_likelihood()
+        model.inference(10)
+
+        rebuilt_model = GibbsSamplingDMM(self.corpus, number_of_topics=20)
+        rebuilt_model.set_topic_assignments(model.document_topic_assignments)
+        self.assertTrue(np.array_equal(model.number_of_each_word_in_each_topic,
+                                       rebuilt_model.number_of_each_word_in_each_topic))
+        self.assertTrue(np.array_equal(model.number_of_documents_in_each_topic,
+                                       rebuilt_model.number_of_documents_in_each_topic))
+        self.assertGreater(model.log_likelihood(), initial_log_likelihood)
+
+    def test_matches_exact_conditional(self):
+        """Test that repeatedly resampling one document visits topics in proportion to its exact conditional."""
+        model = GibbsSamplingDMM(self.corpus, number_of_topics=5, alpha=1.0, beta=0.5, engine="numba",
+                                 sampler="alias")
+        model.randomly_initialise_topic_assignment(seed=1)
+        model.inference(5)
+
+        exact_model = GibbsSamplingDMM(self.corpus, number_of_topics=5, alpha=1.0, beta=0.5)
+        exact_model.set_topic_assignments(model.document_topic_assignments)
+        topic_index = exact_model.document_topic_assignments[1]
+        exact_model.number_of_documents_in_each_topic[topic_index] -= 1
+        exact_model._unassign_document_from_topic(1, topic_index)
+        exact_model._update_topic_weights_for_document_in_log_space(1)
+        exact_probabilities = exact_model.topic_weights / exact_model.topic_weights.sum()
+
+        visits = np.zeros(5)
+        for _ in range(5000):
+            model._sample_in_single_alias_iteration(np.array([1]))
+            visits[model.document_topic_assignments[1]] += 1
+
+        total_variation_distance = np.abs(visits / visits.sum() - exact_probabilities).sum() / 2
+        self.assertLess(total_variation_distance, 0.05)
+
+    def test_reproducible(self):
+        """Test that the same seed gives the same assignments."""
+        assignments = []
+        for _ in range(2):
+            model = GibbsSamplingDMM(self.corpus, number_of_topics=50, engine="numba", sampler="alias")
+            model.randomly_initialise_topic_assignment(seed=3)
+            model.inference(3)
+            assignments.append(list(model.document_topic_assignments))
+        self.assertListEqual(assignments[0], assignments[1])
+
+    def test_invalid_sampler(self):
+        """Test that an unknown sampler, or the alias sampler with the Python engine, raises an error."""
+        with self.assertRaises(ValueError, msg="An unknown sampler should raise an error."):
+            GibbsSamplingDMM(self.corpus, engine="numba", sampler="slice")
+        with self.assertRaises(ValueError, msg="The alias sampler should need the numba engine."):
+            GibbsSamplingDMM(self.corpus, engine="python", sampler="alias")
+
+
+class LogSpaceTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before each test."""
+        random_state = np.random.RandomState(3)
+        list_of_documents = [["word{}".format(word_index) for word_index in random_state.randint(0, 2000, 400)]
+                             for _ in range(30)]
+        self.corpus = Corpus.from_iterable_of_word_lists(list_of_documents)
+
+    def _get_weights_for_first_document(self, weight_space):
+        """Get the topic weights of the first document after random initialisation."""
+        model = GibbsSamplingDMM(self.corpus, number_of_topics=5, weight_space=weight_space)
+        model.randomly_initialise_topic_assignment(seed=1)
+        topic_index = model.document_topic_assignments[0]
+        model.number_of_documents_in_each_topic[topic_index] -= 1
+        model._unassign_document_from_topic(0, topic_index)
+        if weight_space == "log":
+            model._update_topic_weights_for_document_in_log_space(0)
+        else:
+            model._update_topic_weights_for_document(0)
+        return model.topic_weights
+
+    def test_linear_weights_underflow(self):
+        """Test that long documents make the linear weights underflow, but not the log weights."""
+        linear_weights = self._get_weights_for_first_document("linear")
+        log_weights = self._get_weights_for_first_document("log")
+        self.assertFalse(linear_weights.any(), "Linear weights were expected to underflow.")
+        self.assertEqual(log_weights.max(), 1.0, "Log weights should be scaled to a maximum of one.")
+
+    def test_engines_agree_in_log_space(self):
+        """Test that both engines produce the same assignments in log space."""
+        models = []
+        for engine in GibbsSamplingDMM.ENGINES:
+            model = GibbsSamplingDMM(self.corpus, number_of_topics=5, engine=engine, weight_space="log")
+            model.randomly_initialise_topic_assignment(seed=1)
+            model.inference(5)
+            models.append(model)
+
+        python_model, numba_model = models
+        self.assertListEqual(list(python_model.document_topic_assignments),
+                             list(numba_model.document_topic_assignments), "Assignments should be equal.")
+
+    def test_engines_agree_with_very_common_words(self):
+        """Test that a word repeated more than 65,535 times in a document is weighted alike by both engines."""
+        random_state = np.random.RandomState(4)
+        list_of_documents = [["a"] * 70000 + ["b"] * 3] + [
+            ["a", "b", "c", "d"][:random_state.randint(1, 5)] for _ in range(20)]
+        corpus = Corpus.from_iterable_of_word_lists(list_of_documents)
+        self.assertEqual(70000, corpus.get_occurrence_indices(0).max())
+
+        models = []
+        for engine in GibbsSamplingDMM.ENGINES:
+            model = GibbsSamplingDMM(corpus, number_of_topics=3, engine=engine, weight_space="log")
+            model.randomly_initialise_topic_assignment(seed=1)
+            model.inference(5)
+            models.append(model)
+
+        python_model, numba_model = models
+        self.assertListEqual(list(python_model.document_topic_assignments),
+                             list(numba_model.document_topic_assignments), "Assignments should be equal.")
+
+    def test_unknown_weight_space(self):
+        """Test that an unknown weight space raises an error."""
+        with self.assertRaises(ValueError, msg="An unknown weight space should raise an error."):
+            GibbsSamplingDMM(self.corpus, weight_space="cubic")
+
+
 class FileTests(unittest.TestCase):
 
     def setUp(self):
@@ -84,6 +452,356 @@ class FileTests(unittest.TestCase):
         observed_saved_string = read_contents_from_path(file_path)
         self.assertEqual(expected_saved_string, observed_saved_string, "topicAssignments file was not correctly saved.")
 
+    def test_saving_in_chunks(self):
+        """Test that writing in small chunks gives the same files."""
+        for save, file_name in [(self.model.save_top_topical_words_to_file, "topWords"),
+                                (self.model.save_topic_assignments_to_file, "topicAssignments")]:
+            file_path = os.path.join(self.tempdir.name, file_name)
+            save(file_path)
+            expected_saved_string = read_contents_from_path(file_path)
+
+            with mock.patch.object(GibbsSamplingDMM, "OUTPUT_CHUNK_SIZE", 3):
+                save(file_path)
+            self.assertEqual(read_contents_from_path(file_path), expected_saved_string)
+
+
+class OutputFormatTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before each test."""
+        corpus = Corpus.from_document_file("tests/data/sample_data")
+        self.model = GibbsSamplingDMM(corpus, number_of_topics=20)
+        self.model.randomly_initialise_topic_assignment(seed=1)
+        self.model.inference(5)
+
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Code to run at the end of each test."""
+        self.tempdir.cleanup()
+
+    def test_probabilities(self):
+        """Test that the topic probabilities of each document and word probabilities of each topic sum to one."""
+        document_topic_probabilities = self.model.get_document_topic_probabilities()
+        self.assertEqual(document_topic_probabilities.shape, (self.model.corpus.number_of_documents, 20))
+        np.testing.assert_allclose(document_topic_probabilities.sum(axis=1), 1, rtol=1e-5)
+        vocab = self.model.corpus.vocab
+        list_of_word_lists = [[vocab.get_word_from_id(word_id) for word_id in self.model.corpus[document_index]]
+                              for document_index in range(10)]
+        np.testing.assert_allclose(document_topic_probabilities[:10], self.model.predict_proba(list_of_word_lists),
+                                   rtol=1e-5, atol=1e-7)
+
+        topic_word_probabilities = self.model.get_topic_word_probabilities()
+        self.assertEqual(topic_word_probabilities.shape, (20, self.model.corpus.vocab.size))
+        np.testing.assert_allclose(topic_word_probabilities.sum(axis=1), 1, rtol=1e-4)
+
+    def test_save_npy(self):
+        """Test that each array is saved to its own file, which can be memory mapped."""
+        self.model.save_outputs(self.tempdir.name, output_format="npy", number_of_top_words=5)
+
+        topic_assignments = np.load(os.path.join(self.tempdir.name, "topicAssignments.npy"), mmap_mode="r")
+        np.testing.assert_array_equal(topic_assignments, self.model.document_topic_assignments)
+        top_word_ids = np.load(os.path.join(self.tempdir.name, "topWordIds.npy"))
+        np.testing.assert_array_equal(top_word_ids, self.model.get_top_words(5)[0])
+        self.assertEqual(np.load(os.path.join(self.tempdir.name, "documentTopicProbabilities.npy")).dtype, np.float32)
+        self.assertEqual(Vocabulary.load_from_file(os.path.join(self.tempdir.name, "vocabulary")),
+                         self.model.corpus.vocab)
+
+    def test_save_npz(self):
+        """Test that every array is saved to a single file."""
+        self.model.save_outputs(self.tempdir.name, output_format="npz")
+
+        with np.load(os.path.join(self.tempdir.name, "outputs.npz")) as outputs:
+            self.assertSetEqual(set(outputs.files), {"topicAssignments", "documentTopicProbabilities",
+                                                     "topicWordProbabilities", "topWordIds", "topWordProbabilities"})
+            np.testing.assert_array_equal(outputs["topicWordProbabilities"],
+                                          self.model.get_topic_word_probabilities())
+
+    def test_save_text(self):
+        """Test that the text format saves the same files as the individual methods."""
+        self.model.save_outputs(self.tempdir.name, number_of_top_words=7)
+        expected_file_path = os.path.join(self.tempdir.name, "expectedTopWords")
+        self.model.save_top_topical_words_to_file(expected_file_path, number_of_top_words=7)
+
+        self.assertEqual(read_contents_from_path(os.path.join(self.tempdir.name, "topWords")),
+                         read_contents_from_path(expected_file_path))
+
+    def test_invalid_output_format(self):
+        """Test that an unknown output format is rejected."""
+        with self.assertRaises(ValueError):
+            self.model.save_outputs(self.tempdir.name, output_format="csv")
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_save_parquet(self):
+        """Test that the Parquet tables hold the assignments and top words."""
+        import pyarrow.parquet as pq
+        self.model.save_outputs(self.tempdir.name, output_format="parquet", number_of_top_words=5)
+
+        assignments = pq.read_table(os.path.join(self.tempdir.name, "topicAssignments.parquet"))
+        self.assertListEqual(assignments.column("topic").to_pylist(), self.model.document_topic_assignments.tolist())
+        top_words = pq.read_table(os.path.join(self.tempdir.name, "topWords.parquet"))
+        self.assertListEqual(top_words.column("word").to_pylist()[:5], self.model.get_top_words_for_topic(0, 5))
+        topic_word_probabilities = pq.read_table(os.path.join(self.tempdir.name, "topicWordProbabilities.parquet"))
+        self.assertEqual(topic_word_probabilities.num_rows, self.model.corpus.vocab.size)
+
+    @unittest.skipIf(importlib.util.find_spec("pyarrow"), "pyarrow is installed")
+    def test_save_parquet_without_pyarrow(self):
+        """Test that saving Parquet without pyarrow explains what is missing."""
+        with self.assertRaises(ImportError):
+            self.model.save_outputs(self.tempdir.name, output_format="parquet")
+
+
+class TopWordsTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before each test."""
+        corpus = Corpus.from_document_file("tests/data/sample_data")
+        self.model = GibbsSamplingDMM(corpus, number_of_topics=20)
+        self.model.randomly_initialise_topic_assignment(seed=1)
+        self.model.inference(5)
+
+    def get_expected_top_word_ids(self, number_of_top_words):
+        """Get the top words of each topic by counting, breaking ties as Counter does."""
+        return [[word_id for word_id, _ in Counter(dict(enumerate(row.tolist()))).most_common(number_of_top_words)]
+                for row in self.model.number_of_each_word_in_each_topic]
+
+    def test_top_words_match_counter(self):
+        """Test that the top words of every topic match those found with a Counter, including ties."""
+        for number_of_top_words in [0, 1, 20, 500, self.model.corpus.vocab.size + 10]:
+            with self.subTest(number_of_top_words=number_of_top_words):
+                top_word_ids, _ = self.model.get_top_words(number_of_top_words)
+                self.assertListEqual(top_word_ids.tolist(), self.get_expected_top_word_ids(number_of_top_words))
+
+    def test_top_words_in_blocks(self):
+        """Test that processing the topics in small blocks gives the same top words."""
+        top_word_ids, _ = self.model.get_top_words(20)
+        with mock.patch("pdmm.sampling.TOP_WORDS_BLOCK_SIZE", 1):
+            np.testing.assert_array_equal(self.model.get_top_words(20)[0], top_word_ids)
+
+    def test_top_word_probabilities(self):
+        """Test that the probabilities are those of the words within their topics."""
+        top_word_ids, top_word_probabilities = self.model.get_top_words(5)
+        log_topic_word_probabilities = self.model.to_topic_model().log_topic_word_probabilities
+
+        for topic_index in range(self.model.number_of_topics):
+            np.testing.assert_allclose(top_word_probabilities[topic_index],
+                                       np.exp(log_topic_word_probabilities[top_word_ids[topic_index], topic_index]),
+                                       rtol=1e-6)
+        self.assertTrue(np.all(np.diff(top_word_probabilities, axis=1) <= 0))
+
+    def test_top_words_for_topic(self):
+        """Test that the top words of a single topic are those of every topic."""
+        top_word_ids, _ = self.model.get_top_words(10)
+        vocab = self.model.corpus.vocab
+        self.assertListEqual(self.model.get_top_words_for_topic(3, number_of_top_words=10),
+                             [vocab.get_word_from_id(word_id) for word_id in top_word_ids[3]])
+
+
+class RandomStateTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before each test."""
+        self.corpus = Corpus.from_document_file("tests/data/sample_data")
+
+    def _run_model(self, seed, results, random_number_generator="pcg64"):
+        """Run a model and store its assignments."""
+        model = GibbsSamplingDMM(self.corpus, number_of_topics=20, random_number_generator=random_number_generator)
+        model.randomly_initialise_topic_assignment(seed=seed)
+        model.inference(10)
+        results[seed] = list(model.document_topic_assignments)
+
+    def test_models_in_threads_are_reproducible(self):
+        """Test that models run concurrently in threads match models run in series."""
+        seeds = [1, 2, 3]
+        serial_results = {}
+        for seed in seeds:
+            self._run_model(seed, serial_results)
+
+        threaded_results = {}
+        threads = [threading.Thread(target=self._run_model, args=(seed, threaded_results)) for seed in seeds]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertDictEqual(serial_results, threaded_results, "Threaded models should match serial models.")
+
+    def test_global_random_state_is_untouched(self):
+        """Test that the model does not use or change the global random state."""
+        np.random.seed(7)
+        expected_random_number = np.random.random()
+
+        np.random.seed(7)
+        self._run_model(1, {}, random_number_generator="legacy")
+        self.assertEqual(np.random.random(), expected_random_number, "Global random state should be untouched.")
+
+    def test_unknown_random_number_generator(self):
+        """Test that an unknown random number generator raises an error."""
+        with self.assertRaises(ValueError, msg="An unknown random number generator should raise an error."):
+            GibbsSamplingDMM(self.corpus, random_number_generator="dice")
+
+
+class ConvergenceTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before each test."""
+        corpus = Corpus.from_document_file("tests/data/sample_data")
+        self.model = GibbsSamplingDMM(corpus, number_of_topics=20)
+        self.model.randomly_initialise_topic_assignment(seed=1)
+
+    def test_callback(self):
+        """Test that the callback is called at every evaluation with the progress."""
+        progresses = []
+        self.model.inference(20, callback=lambda model, progress: progresses.append(progress), eval_every=5)
+
+        self.assertListEqual([5, 10, 15, 20], [progress.iteration for progress in progresses])
+        self.assertAlmostEqual(progresses[-1].log_likelihood, self.model.log_likelihood())
+        for progress in progresses:
+            self.assertTrue(0 <= progress.topic_change_rate <= 1)
+
+    def test_callback_stops_inference(self):
+        """Test that a callback returning True stops inference."""
+        self.model.inference(20, callback=lambda model, progress: progress.iteration == 4)
+        self.assertEqual(self.model.iteration, 4)
+
+    def test_topic_change_tolerance(self):
+        """Test that inference stops once few enough documents change topic."""
+        progresses = []
+        self.model.inference(200, callback=lambda model, progress: progresses.append(progress),
+                             topic_change_tolerance=0.2)
+        self.assertLess(self.model.iteration, 200)
+        self.assertLess(progresses[-1].topic_change_rate, 0.2)
+        self.assertTrue(all(progress.topic_change_rate >= 0.2 for progress in progresses[:-1]))
+
+    def test_log_likelihood_tolerance(self):
+        """Test that inference stops once the log-likelihood stops changing."""
+        self.model.inference(200, eval_every=10, log_likelihood_tolerance=0.01)
+        self.assertLess(self.model.iteration, 200)
+
+    def test_results_unchanged_by_evaluation(self):
+        """Test that evaluating progress does not change the chain."""
+        other_model = GibbsSamplingDMM(self.model.corpus, number_of_topics=20)
+        other_model.randomly_initialise_topic_assignment(seed=1)
+
+        self.model.inference(10)
+        other_model.inference(10, callback=lambda model, progress: None, eval_every=3)
+        self.assertListEqual(list(self.model.document_topic_assignments),
+                             list(other_model.document_topic_assignments))
+
+
+class CheckpointTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before each test."""
+        self.corpus = Corpus.from_document_file("tests/data/sample_data")
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tempdir.name, "checkpoint.npz")
+
+    def tearDown(self):
+        """Code to run at the end of each test."""
+        self.tempdir.cleanup()
+
+    def test_resumed_run_is_identical(self):
+        """Test that resuming from a checkpoint continues exactly as an uninterrupted run."""
+        for random_number_generator in GibbsSamplingDMM.RANDOM_NUMBER_GENERATORS:
+            model = GibbsSamplingDMM(self.corpus, number_of_topics=20,
+                                     random_number_generator=random_number_generator)
+            model.randomly_initialise_topic_assignment(seed=1)
+            model.inference(30)
+
+            interrupted_model = GibbsSamplingDMM(self.corpus, number_of_topics=20,
+                                                 random_number_generator=random_number_generator)
+            interrupted_model.randomly_initialise_topic_assignment(seed=1)
+            interrupted_model.inference(10, checkpoint_path=self.file_path)
+
+            resumed_model = GibbsSamplingDMM.load_checkpoint(self.file_path, self.corpus)
+            self.assertEqual(resumed_model.iteration, 10)
+            resumed_model.inference(20)
+
+            self.assertListEqual(list(model.document_topic_assignments),
+                                 list(resumed_model.document_topic_assignments))
+            self.assertTrue(np.all(model.number_of_each_word_in_each_topic ==
+                                   resumed_model.number_of_each_word_in_each_topic), "Word counts should be equal.")
+
+    def test_mismatched_corpus(self):
+        """Test that loading a checkpoint with a different corpus raises an error."""
+        model = GibbsSamplingDMM(self.corpus, number_of_topics=20)
+        model.randomly_initialise_topic_assignment(seed=1)
+        model.save_checkpoint(self.file_path)
+
+        other_corpus = Corpus.from_iterable_of_word_lists([["the", "quick", "brown", "fox"]])
+        with self.assertRaises(ValueError, msg="A checkpoint for another corpus should raise an error."):
+            GibbsSamplingDMM.load_checkpoint(self.file_path, other_corpus)
+
+
+class OnlineTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before each test."""
+        with open("tests/data/sample_data", "r") as rf:
+            self.list_of_documents = [line.split() for line in rf]
+
+    def assert_counts_match_assignments(self, model):
+        """Assert that the counts of a model are those rebuilt from its assignments."""
+        rebuilt_model = GibbsSamplingDMM(model.corpus, number_of_topics=model.number_of_topics)
+        rebuilt_model.set_topic_assignments(model.document_topic_assignments)
+
+        self.assertTrue(np.array_equal(model.number_of_documents_in_each_topic,
+                                       rebuilt_model.number_of_documents_in_each_topic))
+        self.assertTrue(np.array_equal(model.number_of_each_word_in_each_topic,
+                                       rebuilt_model.number_of_each_word_in_each_topic))
+        self.assertTrue(np.array_equal(model.number_of_total_words_in_each_topic,
+                                       rebuilt_model.number_of_total_words_in_each_topic))
+
+    def test_online_inference_from_empty_corpus(self):
+        """Test that streaming batches into an empty model keeps the counts consistent in both engines."""
+        final_assignments = []
+        for engine in GibbsSamplingDMM.ENGINES:
+            model = GibbsSamplingDMM(Corpus.from_iterable_of_word_lists([]), number_of_topics=8, engine=engine)
+            model.randomly_initialise_topic_assignment(seed=1)
+
+            for start in range(0, len(self.list_of_documents), 50):
+                batch_assignments = model.online_inference(self.list_of_documents[start:start + 50],
+                                                           number_of_sweeps=3, number_of_old_documents=20)
+                self.assertEqual(len(batch_assignments), 50)
+
+            self.assertEqual(model.corpus.number_of_documents, len(self.list_of_documents))
+            self.assertEqual(model.number_of_each_word_in_each_topic.shape, (8, model.corpus.vocab.size))
+            self.assert_counts_match_assignments(model)
+            final_assignments.append(list(model.document_topic_assignments))
+
+        self.assertListEqual(final_assignments[0], final_assignments[1], "Engines should agree.")
+
+    def test_word_counts_grow_with_doubling_capacity(self):
+        """Test that the word count columns are grown into a buffer of doubling capacity."""
+        model = GibbsSamplingDMM(Corpus.from_iterable_of_word_lists([["a", "b"]]), number_of_topics=4)
+        model.randomly_initialise_topic_assignment(seed=1)
+
+        model.add_documents([["c"]])
+        buffer = model._word_count_buffer
+        self.assertEqual(buffer.shape, (4, 4))
+
+        model.add_documents([["d"]])
+        self.assertIs(model._word_count_buffer, buffer, "The buffer should not be reallocated.")
+        self.assertEqual(model.number_of_each_word_in_each_topic.shape, (4, 4))
+        self.assert_counts_match_assignments(model)
+
+    def test_forgetting_oldest_documents(self):
+        """Test that the oldest documents are forgotten beyond the maximum number of documents."""
+        model = GibbsSamplingDMM(Corpus.from_iterable_of_word_lists(self.list_of_documents[:300]),
+                                 number_of_topics=8)
+        model.randomly_initialise_topic_assignment(seed=1)
+        model.inference(5)
+
+        batch_assignments = model.online_inference(self.list_of_documents[300:], number_of_sweeps=2,
+                                                   number_of_old_documents=50, maximum_number_of_documents=250)
+
+        self.assertEqual(model.corpus.number_of_documents, 250)
+        self.assertEqual(len(batch_assignments), 100)
+        self.assertListEqual(model.corpus.documents[-1], [model.corpus.vocab.get_existing_id_from_word(word)
+                                                          for word in self.list_of_documents[-1]])
+        self.assert_counts_match_assignments(model)
+
 
 class TimingTests(unittest.TestCase):
     """Test the timing of the inference."""
@@ -148,7 +866,142 @@ class GenerationTestsWithReplacement(unittest.TestCase):
         ]
         self.assertListEqual(self.generated_documents, expected_documents)
 
-    def test_sampling_without_replacement(self):
-        """Test that sampling without replacement is not implemented."""
-        with self.assertRaises(NotImplementedError, msg="Method should throw error as it is not yet implemented."):
-            self.model.generate_synthetic_documents(10, seed=5, replacement=False)
+    def test_large_batch_of_documents(self):
+        """Test that a large batch of documents follows the topic weights and the words of each topic."""
+        word_ids, document_offsets, topic_indices = next(self.model.generate_synthetic_document_arrays(20000, seed=5))
+        self.assertEqual(len(topic_indices), 20000)
+        self.assertEqual(len(document_offsets), 20001)
+        self.assertEqual(len(word_ids), document_offsets[-1])
+        self.assertAlmostEqual(np.diff(document_offsets).mean(), self.model.corpus.get_mean_document_length(),
+                               delta=0.1)
+
+        topic_frequencies = np.bincount(topic_indices, minlength=self.model.number_of_topics) / len(topic_indices)
+        np.testing.assert_allclose(topic_frequencies, self.model.topic_weights / self.model.topic_weights.sum(),
+                                   atol=0.01)
+        self.assertTrue(np.all(self.model.number_of_each_word_in_each_topic[
+            np.repeat(topic_indices, np.diff(document_offsets)), word_ids] > 0), "Words should be in their topic.")
+
+    def test_chunked_generation(self):
+        """Test that generating in chunks continues the same random stream."""
+        chunks = list(self.model.generate_synthetic_document_arrays(10, chunk_size=4, seed=5))
+        self.assertListEqual([len(topic_indices) for _, _, topic_indices in chunks], [4, 4, 2])
+
+        word_ids, document_offsets, topic_indices = next(self.model.generate_synthetic_document_arrays(10, seed=5))
+        words = [self.model.corpus.vocab.get_word_from_id(word_id) for word_id in word_ids]
+        self.assertListEqual(words, sum(self.generated_documents, []))
+        self.assertListEqual(list(np.diff(document_offsets)), [len(document) for document in self.generated_documents])
+        self.assertListEqual(list(topic_indices), list(self.chosen_topics))
+
+    def test_chunks_share_cumulative_weights(self):
+        """Test that the cumulative weights are computed once rather than for every chunk."""
+        for replacement in (True, False):
+            with mock.patch.object(self.model, "_get_synthetic_document_weights",
+                                   wraps=self.model._get_synthetic_document_weights) as get_weights:
+                chunks = list(self.model.generate_synthetic_document_arrays(10, chunk_size=2, replacement=replacement,
+                                                                            seed=5))
+            self.assertEqual(len(chunks), 5)
+            get_weights.assert_called_once_with(replacement)
+
+    def test_generate_synthetic_corpus(self):
+        """Test that a synthetic corpus holds the generated documents and can be saved in binary form."""
+        corpus, chosen_topics = self.model.generate_synthetic_corpus(10, chunk_size=3, seed=5)
+        self.assertEqual(corpus.number_of_documents, 10)
+        self.assertEqual(corpus.vocab, self.model.corpus.vocab)
+        self.assertIsNot(corpus.vocab, self.model.corpus.vocab)
+
+        chunks = list(self.model.generate_synthetic_document_arrays(10, chunk_size=3, seed=5))
+        np.testing.assert_array_equal(corpus.word_ids, np.concatenate([word_ids for word_ids, _, _ in chunks]))
+        np.testing.assert_array_equal(chosen_topics, np.concatenate([topics for _, _, topics in chunks]))
+
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            file_path = os.path.join(temporary_directory, "corpus.bin")
+            corpus.save_binary(file_path)
+            self.assertEqual(Corpus.load_binary(file_path), corpus)
+
+    def test_save_synthetic_documents_to_file(self):
+        """Test that saved synthetic documents can be read back as a corpus."""
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            file_path = os.path.join(temporary_directory, "synthetic")
+            chosen_topics = self.model.save_synthetic_documents_to_file(file_path, 10, seed=5)
+            with open(file_path) as rf:
+                lines = rf.read().splitlines()
+
+        self.assertListEqual(lines, [" ".join(document) for document in self.generated_documents])
+        self.assertListEqual(list(chosen_topics), list(self.chosen_topics))
+
+
+class GenerationTestsWithoutReplacement(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run before each test."""
+        corpus = Corpus.from_document_file("tests/data/sample_data")
+        self.model = GibbsSamplingDMM(corpus, number_of_topics=20)
+        self.model.randomly_initialise_topic_assignment(seed=1)
+        self.model.inference(100)
+        self.generated_documents, self.chosen_topics = self.model.generate_synthetic_documents(
+            1000, replacement=False, seed=5)
+
+    def test_words_are_distinct(self):
+        """Test that no word occurs twice in a document."""
+        for document in self.generated_documents:
+            self.assertEqual(len(set(document)), len(document))
+
+    def test_words_are_in_topic(self):
+        """Test that every word has been seen in the topic of its document."""
+        vocab = self.model.corpus.vocab
+        for document, topic_index in zip(self.generated_documents, self.chosen_topics):
+            for word in document:
+                self.assertGreater(self.model.number_of_each_word_in_each_topic[topic_index,
+                                                                                vocab.get_id_from_word(word)], 0)
+
+    def test_reproducible(self):
+        """Test that the same seed gives the same documents."""
+        generated_documents, chosen_topics = self.model.generate_synthetic_documents(1000, replacement=False, seed=5)
+        self.assertListEqual(generated_documents, self.generated_documents)
+        self.assertListEqual(list(chosen_topics), list(self.chosen_topics))
+
+    def test_compiled_random_state_is_untouched(self):
+        """Test that generation draws from the random state of the model rather than reseeding numba's."""
+        seed_compiled_generator(7)
+        expected_random_number = draw_from_compiled_generator()
+
+        seed_compiled_generator(7)
+        self.model.generate_synthetic_documents(50, replacement=False, seed=1)
+        self.assertEqual(draw_from_compiled_generator(), expected_random_number)
+
+    def test_resume_when_random_numbers_run_out(self):
+        """Test that the kernel stops at the first document it cannot finish, leaving it to be resumed."""
+        cumulative_word_weights = np.array([[1.0, 2.0, 3.0, 4.0]])
+        topic_indices = np.zeros(3, dtype=np.int64)
+        document_offsets = np.array([0, 2, 6, 7])
+        word_ids = np.full(7, -1, dtype=np.int32)
+
+        self.assertEqual(sample_words_without_replacement(cumulative_word_weights, topic_indices, document_offsets,
+                                                          np.array([0.1, 0.9, 0.1]), word_ids, 0), 1)
+        self.assertListEqual(list(word_ids[:2]), [0, 3])
+        self.assertEqual(sample_words_without_replacement(cumulative_word_weights, topic_indices, document_offsets,
+                                                          np.linspace(0.05, 0.95, 10), word_ids, 1), 3)
+        self.assertListEqual(sorted(word_ids[2:6]), [0, 1, 2, 3])
+
+    def test_long_documents(self):
+        """Test that documents are cut to the number of words in their topic, using every one of them."""
+        corpus = Corpus.from_iterable_of_word_lists([["a", "b", "c", "d", "d", "d"], ["e", "f"]])
+        model = GibbsSamplingDMM(corpus, number_of_topics=1)
+        model.randomly_initialise_topic_assignment(seed=1)
+        model.corpus.get_mean_document_length = lambda: 100
+
+        generated_documents, _ = model.generate_synthetic_documents(20, replacement=False, seed=3)
+        for document in generated_documents:
+            self.assertListEqual(sorted(document), ["a", "b", "c", "d", "e", "f"])
+
+
+@njit
+def seed_compiled_generator(seed):
+    """Seed the random number generator of compiled functions."""
+    np.random.seed(seed)
+
+
+@njit
+def draw_from_compiled_generator():
+    """Draw a random number from the random number generator of compiled functions."""
+    return np.random.random()
@@ -5,7 +5,9 @@ import os
 import tempfile
 import unittest
 
-from pdmm import Vocabulary
+import numpy as np
+
+from pdmm import PackedVocabulary, Vocabulary
 
 
 class BasicTests(unittest.TestCase):
@@ -40,6 +42,58 @@ class BasicTests(unittest.TestCase):
         loaded_vocab = Vocabulary.load_from_file(file_path)
         self.assertEqual(vocab, loaded_vocab, "Loaded Vocabulary instance was incorrect.")
 
+    def test_ids_from_words(self):
+        """Test that words looked up in bulk get the same ids as words looked up one at a time."""
+        words = ["banana", "grapes", "apple", "grapes", "kiwi", "banana"]
+        vocab = Vocabulary.from_list_of_words(self.list_of_words)
+        other_vocab = Vocabulary.from_list_of_words(self.list_of_words)
+
+        word_ids = vocab.ids_from_words(words)
+        self.assertEqual(np.int32, word_ids.dtype)
+        self.assertListEqual([other_vocab.get_id_from_word(word) for word in words], word_ids.tolist())
+        self.assertEqual(other_vocab, vocab)
+        self.assertListEqual(words, vocab.words_from_ids(word_ids))
+
+
+class HashingTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run at the start of every test."""
+        self.words = ["word{}".format(index) for index in range(1000)]
+        self.vocab = Vocabulary(number_of_buckets=64)
+
+    def test_fixed_size(self):
+        """Test that the size of a hashed vocabulary does not grow with the number of words."""
+        word_ids = self.vocab.ids_from_words(self.words)
+        self.assertEqual(64, self.vocab.size)
+        self.assertTrue(np.all((word_ids >= 0) & (word_ids < 64)))
+        self.assertEqual(64, len(np.unique(word_ids)))
+
+    def test_ids_are_stable(self):
+        """Test that every lookup of a word gives the same id, whether or not it has been seen."""
+        word_ids = self.vocab.ids_from_words(self.words)
+        self.assertListEqual(word_ids.tolist(), [self.vocab.get_id_from_word(word) for word in self.words])
+        self.assertListEqual(word_ids.tolist(),
+                             [Vocabulary(number_of_buckets=64).get_existing_id_from_word(word) for word in self.words])
+
+    def test_buckets_are_named_by_first_word(self):
+        """Test that each bucket is named by the first word hashed into it."""
+        word_ids = self.vocab.ids_from_words(self.words)
+        for word_id in np.unique(word_ids).tolist():
+            self.assertEqual(self.words[word_ids.tolist().index(word_id)], self.vocab.get_word_from_id(word_id))
+
+    def test_packed_arrays(self):
+        """Test that a hashed vocabulary is recreated from its packed arrays."""
+        self.vocab.ids_from_words(self.words[:10])
+        unpacked_vocab = Vocabulary.from_packed_arrays(*self.vocab.to_packed_arrays(), number_of_buckets=64)
+        self.assertEqual(self.vocab, unpacked_vocab)
+        self.assertNotEqual(Vocabulary.from_list_of_words(unpacked_vocab.words_from_ids(range(64))), self.vocab)
+
+    def test_bad_number_of_buckets(self):
+        """Test that a vocabulary needs at least one bucket."""
+        with self.assertRaises(ValueError):
+            Vocabulary(number_of_buckets=0)
+
 
 class EqualityTests(unittest.TestCase):
 
@@ -65,3 +119,44 @@ class EqualityTests(unittest.TestCase):
         other_list_of_words[0] = "grapes"
         other_vocab = Vocabulary.from_list_of_words(other_list_of_words)
         self.assertNotEqual(self.vocab, other_vocab, "Vocabulary instances should not be equal.")
+
+
+class PackedTests(unittest.TestCase):
+
+    def setUp(self):
+        """Code to run at the start of every test."""
+        self.list_of_words = ["apple", "banana", "orange", "café", "naïve", "a", ""]
+        self.vocab = Vocabulary.from_list_of_words(self.list_of_words)
+        self.packed_vocab = PackedVocabulary.from_vocabulary(self.vocab)
+
+    def test_lookups_match_vocabulary(self):
+        """Test that packed words are looked up with the same ids as in the vocabulary."""
+        words = ["orange", "grapes", "café", "cafe", "", "apple", "naïve", "ap"]
+        expected_word_ids = [self.vocab.get_existing_id_from_word(word, default=-5) for word in words]
+        self.assertListEqual(expected_word_ids, self.packed_vocab.existing_ids_from_words(words, default=-5).tolist())
+        self.assertListEqual(expected_word_ids, self.vocab.existing_ids_from_words(words, default=-5).tolist())
+        self.assertListEqual(expected_word_ids, [self.packed_vocab.get_existing_id_from_word(word, default=-5)
+                                                 for word in words])
+
+    def test_words(self):
+        """Test that packed words are decoded by id."""
+        self.assertEqual(len(self.list_of_words), self.packed_vocab.size)
+        self.assertEqual("café", self.packed_vocab.get_word_from_id(3))
+        self.assertListEqual(self.list_of_words, self.packed_vocab.words_from_ids(range(self.packed_vocab.size)))
+
+    def test_equality(self):
+        """Test that a packed vocabulary equals the vocabulary it was packed from, in either order."""
+        self.assertEqual(self.vocab, self.packed_vocab)
+        self.assertEqual(self.packed_vocab, self.vocab)
+        self.assertNotEqual(self.packed_vocab, Vocabulary.from_list_of_words(self.list_of_words[:-1]))
+        with self.assertRaises(TypeError):
+            bool(self.packed_vocab == 5)
+
+    def test_hashed_vocabulary(self):
+        """Test that a packed hashed vocabulary hashes missing words into the same buckets."""
+        vocab = Vocabulary(number_of_buckets=16)
+        vocab.ids_from_words(self.list_of_words)
+        packed_vocab = PackedVocabulary.from_vocabulary(vocab)
+        self.assertIsNone(packed_vocab.word_table)
+        self.assertListEqual(vocab.existing_ids_from_words(["unseen", "apple"]).tolist(),
+                             packed_vocab.existing_ids_from_words(["unseen", "apple"]).tolist())